@@ -96,6 +96,108 @@ mongoengine.connect(
 )
 # ------------------------------------------------
 
+# ---------------- Emotion inference ----------------
+# Tắt để chạy worker API nhẹ không cần TensorFlow (predict-emotion trả về 'neutral')
+EMOTION_INFERENCE_ENABLED = os.environ.get("EMOTION_INFERENCE_ENABLED", "True") == "True"
+# Tải sẵn model ở luồng nền khi worker khởi động thay vì ở request đầu tiên
+EMOTION_WARMUP = os.environ.get("EMOTION_WARMUP", "False") == "True"
+EMOTION_MODEL_PATH = os.environ.get("EMOTION_MODEL_PATH", "model/emotion_model.keras")
+# keras | tflite-float16 | tflite-int8 (tạo file .tflite bằng: manage.py export_emotion_model)
+EMOTION_BACKEND = os.environ.get("EMOTION_BACKEND", "keras")
+EMOTION_TFLITE_DIR = os.environ.get("EMOTION_TFLITE_DIR", "")
+EMOTION_BATCH_SIZE = int(os.environ.get("EMOTION_BATCH_SIZE", "16"))
+EMOTION_BATCH_WAIT_MS = float(os.environ.get("EMOTION_BATCH_WAIT_MS", "5"))
+# Số khuôn mặt chờ suy luận tối đa mỗi worker; đầy thì predict-emotion trả 503
+EMOTION_QUEUE_SIZE = int(os.environ.get("EMOTION_QUEUE_SIZE", "256"))
+EMOTION_PREDICT_TIMEOUT = float(os.environ.get("EMOTION_PREDICT_TIMEOUT", "10"))
+# Số luồng TensorFlow cho mỗi worker (0 = để TensorFlow tự chọn)
+TF_INTRA_OP_THREADS = int(os.environ.get("TF_INTRA_OP_THREADS", "1"))
+TF_INTER_OP_THREADS = int(os.environ.get("TF_INTER_OP_THREADS", "1"))
+# Ảnh upload lớn hơn các ngưỡng này được giải mã ở 1/2 hoặc 1/4 độ phân giải
+FACE_DECODE_REDUCE_2_BYTES = int(os.environ.get("FACE_DECODE_REDUCE_2_BYTES", str(300 * 1024)))
+FACE_DECODE_REDUCE_4_BYTES = int(os.environ.get("FACE_DECODE_REDUCE_4_BYTES", str(1500 * 1024)))
+FACE_MIN_DECODE_SIDE = int(os.environ.get("FACE_MIN_DECODE_SIDE", "240"))
+# Cạnh dài nhất của bản thu nhỏ dùng để dò khuôn mặt
+FACE_DETECT_MAX_SIDE = int(os.environ.get("FACE_DETECT_MAX_SIDE", "320"))
+# ------------------------------------------------
+
+# ---------------- Catalog bài hát ----------------
+# Làm mới catalog ở nền: change stream nếu có replica set, nếu không thì poll theo watermark
+CATALOG_REFRESH_ENABLED = os.environ.get("CATALOG_REFRESH_ENABLED", "True") == "True"
+CATALOG_CHANGE_STREAM = os.environ.get("CATALOG_CHANGE_STREAM", "True") == "True"
+CATALOG_POLL_INTERVAL = float(os.environ.get("CATALOG_POLL_INTERVAL", "5"))
+# Quét _id để phát hiện bài bị xóa sau mỗi N lần poll
+CATALOG_DELETE_SCAN_EVERY = int(os.environ.get("CATALOG_DELETE_SCAN_EVERY", "12"))
+# Số bài gợi ý được tính sẵn cho mỗi cảm xúc ở mỗi phiên bản catalog
+RECOMMEND_PRECOMPUTE_DEPTH = int(os.environ.get("RECOMMEND_PRECOMPUTE_DEPTH", "100"))
+# Index tìm kiếm: dựng sẵn khi worker khởi động, nạp lại nghệ sĩ/album sau mỗi N giây
+SEARCH_INDEX_WARMUP = os.environ.get("SEARCH_INDEX_WARMUP", "False") == "True"
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.environ.get("SEARCH_INDEX_REFRESH_INTERVAL", "300"))
+# Gợi ý khi gõ: số kết quả mặc định, số tiền tố được cache, chu kỳ tính lại lượt nghe (giây)
+SUGGEST_LIMIT = int(os.environ.get("SUGGEST_LIMIT", "8"))
+SUGGEST_CACHE_SIZE = int(os.environ.get("SUGGEST_CACHE_SIZE", "1024"))
+SUGGEST_REFRESH_INTERVAL = float(os.environ.get("SUGGEST_REFRESH_INTERVAL", "600"))
+# Cache response của albums/list/artists: số response giữ lại, số giây trước khi đọc lại phiên bản catalog
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+CATALOG_VERSION_TTL = float(os.environ.get("CATALOG_VERSION_TTL", "1"))
+# LRU bài hát theo _id cho playlist/lịch sử/album lưu tham chiếu songId: số bài giữ lại, số giây trước khi đọc lại
+SONG_CACHE_SIZE = int(os.environ.get("SONG_CACHE_SIZE", "5000"))
+SONG_CACHE_TTL = float(os.environ.get("SONG_CACHE_TTL", "300"))
+# Phân trang theo cursor: kích thước trang mặc định (?limit=) và tối đa
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "200"))
+# ------------------------------------------------
+
+# ---------------- Ghi nền (write-behind) ----------------
+# Lịch sử nghe, lịch sử đăng nhập và thống kê cảm xúc được gom lại và ghi bằng bulk write
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "True") == "True"
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", "10000"))
+# Thư mục lưu thao tác chưa ghi được khi MongoDB không sẵn sàng, phát lại khi có kết nối
+WRITE_BEHIND_SPILL_DIR = os.environ.get("WRITE_BEHIND_SPILL_DIR", str(BASE_DIR / "spill"))
+# ------------------------------------------------
+
+# ---------------- Lịch sử đăng nhập ----------------
+# Mỗi lần đăng nhập là một document trong loginevents; sự kiện cũ hơn TTL bị MongoDB xóa tự động
+LOGIN_HISTORY_TTL_DAYS = int(os.environ.get("LOGIN_HISTORY_TTL_DAYS", "180"))
+# Mặc định loginevents là collection thường + index TTL và index {userId, timestamp, _id} cho cursor của
+# get_login_history. Time-series (MongoDB >= 5.0) nhỏ hơn trên đĩa nhưng không sắp xếp (timestamp, _id) bằng index,
+# nên mỗi trang lịch sử phải SORT trong bộ nhớ
+LOGIN_EVENTS_TIMESERIES = os.environ.get("LOGIN_EVENTS_TIMESERIES", "False") == "True"
+LOGIN_HISTORY_PAGE_SIZE = int(os.environ.get("LOGIN_HISTORY_PAGE_SIZE", "20"))
+# ------------------------------------------------
+
+# ---------------- Xác thực (JWT) ----------------
+# login_view cấp access token ngắn hạn + refresh token; view kiểm tra chữ ký mà không đọc MongoDB
+JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", SECRET_KEY)
+JWT_ACCESS_TTL = int(os.environ.get("JWT_ACCESS_TTL", "900"))  # giây
+JWT_REFRESH_TTL = int(os.environ.get("JWT_REFRESH_TTL", str(14 * 24 * 3600)))  # giây
+# Chỉ bật tạm thời khi còn client cũ: chấp nhận request chỉ có user_id trên URL (không có token),
+# khi đó view đọc UserProfile như trước và bất kỳ ai biết user_id đều đọc/ghi được dữ liệu của user đó
+AUTH_ALLOW_LEGACY_USER_ID = os.environ.get("AUTH_ALLOW_LEGACY_USER_ID", "False") == "True"
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": ["recommend.auth.TokenAuthentication"],
+}
+# ------------------------------------------------
+
+# ---------------- Băm mật khẩu (bcrypt) ----------------
+# Hash lưu với cost khác BCRYPT_ROUNDS được băm lại sau lần đăng nhập thành công kế tiếp
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# Số phép băm chạy song song và số phép được chờ trong mỗi worker; vượt quá thì trả 503
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", "5"))  # giây chờ chỗ trong hàng đợi
+# ------------------------------------------------
+
+# ---------------- ASGI (recommend/async_views.py) ----------------
+# Luồng chạy các view đồng bộ (predict_emotion, đăng nhập, các view ghi) trong mỗi worker uvicorn
+SYNC_VIEW_THREADS = int(os.environ.get("SYNC_VIEW_THREADS", "16"))
+# Số kết nối tối đa của client motor (view async) trong mỗi worker
+ASYNC_MONGO_POOL_SIZE = int(os.environ.get("ASYNC_MONGO_POOL_SIZE", "100"))
+# ------------------------------------------------
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -1,6 +1,23 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MusicRecommenderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommend'
+
+    def ready(self):
+        # Model và OpenCV được tải muộn; web worker có thể bật EMOTION_WARMUP để tải sẵn ở nền
+        if settings.EMOTION_WARMUP and settings.EMOTION_INFERENCE_ENABLED:
+            from . import inference
+            threading.Thread(target=inference.warmup, name='emotion-warmup', daemon=True).start()
+        if settings.SEARCH_INDEX_WARMUP:
+            threading.Thread(target=_build_search_index, name='search-warmup', daemon=True).start()
+
+
+def _build_search_index():
+    from .views import suggester
+    # Dựng index gợi ý kéo theo index tìm kiếm và catalog bài hát
+    suggester.index()
@@ -0,0 +1,770 @@
+import asyncio
+import functools
+import json
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.conf import settings
+from django.http import HttpResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+from . import auth, cache, media, pagination, playlists, songrefs, suggest, views
+from .features import normalize_genre
+
+logger = logging.getLogger(__name__)
+
+# View I/O-bound chạy thẳng trên event loop của worker ASGI (xem Procfile) và đọc MongoDB bằng motor.
+# Việc nặng CPU (suy luận cảm xúc, bcrypt) và các view DRF còn lại đi qua offload().
+
+# Luồng cho view đồng bộ; Django 3.1 mặc định dồn mọi view đồng bộ dưới ASGI vào một luồng duy nhất
+_sync_executor = ThreadPoolExecutor(settings.SYNC_VIEW_THREADS, thread_name_prefix='sync-view')
+# Client motor gắn với một event loop; mỗi worker uvicorn chỉ có một loop
+_clients = {}
+
+
+def mongo():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncIOMotorClient(
+            settings.MONGODB_URI, maxPoolSize=settings.ASYNC_MONGO_POOL_SIZE, io_loop=loop
+        )
+    return client[views.db.name]
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    # Cùng renderer với DRF để body (và ETag) giống hệt các view @api_view
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def api_view(methods):
+    """@api_view cho view async: kiểm tra method, xác thực access token, đọc body JSON, bỏ CSRF.
+
+    Không dùng được decorator đồng bộ của Django 3.1 (csrf_exempt, require_http_methods) vì chúng
+    bọc coroutine function thành hàm thường.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED,
+                    {'Allow': ', '.join(methods)}
+                )
+            try:
+                request.auth_user = auth.token_user(request)
+            except AuthenticationFailed as e:
+                return json_response(
+                    {'detail': str(e.detail)},
+                    status.HTTP_401_UNAUTHORIZED,
+                    {'WWW-Authenticate': auth.TokenAuthentication.keyword}
+                )
+            if request.method in ('POST', 'PUT', 'PATCH', 'DELETE'):
+                try:
+                    request.data = json.loads(request.body or b'{}')
+                except ValueError as e:
+                    return json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
+            return await view(request, *args, **kwargs)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def user_scoped(view):
+    """Như auth.user_scoped cho view async; user (legacy) được đọc bằng motor."""
+    @functools.wraps(view)
+    async def wrapper(request, user_id, *args, **kwargs):
+        if not user_id or user_id in ['None', 'null', 'undefined'] or not ObjectId.is_valid(user_id):
+            logger.warning(f"Invalid user_id: {user_id}")
+            return json_response({'error': 'Invalid user_id'}, status.HTTP_400_BAD_REQUEST)
+
+        if request.auth_user is not None:
+            if request.auth_user.id != user_id:
+                logger.warning(f"Token của user {request.auth_user.id} truy cập dữ liệu của user {user_id}")
+                return json_response({'error': 'Không có quyền truy cập'}, status.HTTP_403_FORBIDDEN)
+            return await view(request, user_id, *args, **kwargs)
+
+        if not settings.AUTH_ALLOW_LEGACY_USER_ID:
+            return json_response({'error': 'Vui lòng đăng nhập'}, status.HTTP_401_UNAUTHORIZED)
+        user = await mongo()[views.UserProfile._get_collection_name()].find_one(
+            {'_id': ObjectId(user_id)}, {'username': 1, 'token_version': 1}
+        )
+        if not user:
+            logger.warning(f"Người dùng không tồn tại: {user_id}")
+            return json_response({'error': 'Người dùng không tồn tại'}, status.HTTP_404_NOT_FOUND)
+        request.auth_user = auth.TokenUser(user_id, user.get('username'), user.get('token_version', 0))
+        return await view(request, user_id, *args, **kwargs)
+    return wrapper
+
+
+def offload(view):
+    """Chạy một view DRF đồng bộ trên _sync_executor, không chặn event loop hay luồng chung của Django."""
+    def call(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            # Render ngay trong luồng này; nếu không Django sẽ render trên luồng chung
+            response.render()
+        return response
+
+    run = sync_to_async(call, thread_sensitive=False, executor=_sync_executor)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def enqueue(method, *args, **kwargs):
+    # Hàng đợi ghi nền chỉ thêm vào deque. Khi hàng đợi đầy (phải ghi file spill) hoặc tắt write-behind
+    # (ghi thẳng MongoDB) thì việc ghi chặn luồng, nên chạy trong thread pool thay vì trên event loop
+    if settings.WRITE_BEHIND_ENABLED and method(*args, spill=False, **kwargs):
+        return
+    await sync_to_async(method, thread_sensitive=False, executor=_sync_executor)(*args, **kwargs)
+
+
+async def song_refs(entries):
+    # Bài hát cho mọi tham chiếu songId trong ``entries``: LRU của process, phần thiếu lấy bằng một truy vấn $in
+    return await views.song_cache.aget_many(mongo()[views.songs_collection.name], songrefs.song_ids(entries))
+
+
+async def hydrate_albums(albums):
+    songs = await song_refs(song for album in albums for song in album.get('songs', []))
+    for album in albums:
+        album['_id'] = str(album['_id'])
+        album['songs'] = songrefs.hydrate(album.get('songs', []), songs)
+
+
+# ---------------- Catalog ----------------
+
+@api_view(['GET'])
+@cache.async_cached_response('albums', views.catalog_version, views.songs_version)
+async def get_albums(request):
+    try:
+        # Album đã được làm phẳng và chuẩn hóa đường dẫn khi ghi (manage.py flatten_albums, create_album)
+        albums, next_cursor = await pagination.apaginate(
+            mongo()[views.albums_collection.name], {}, views.ALBUM_PROJECTION, request
+        )
+        await hydrate_albums(albums)
+        logger.info(f"Đã lấy {len(albums)} album")
+        return json_response({
+            'message': 'Lấy album thành công',
+            'count': len(albums),
+            'data': albums,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy album: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@cache.async_cached_response('list', views.catalog_version, views.songs_version)
+async def get_list(request):
+    try:
+        list_, next_cursor = await pagination.apaginate(
+            mongo()[views.list_collection.name], {}, views.ALBUM_PROJECTION, request
+        )
+        await hydrate_albums(list_)
+        logger.info(f"Đã lấy {len(list_)} danh sách phát")
+        return json_response({
+            'message': 'Lấy danh sách phát thành công',
+            'count': len(list_),
+            'data': list_,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy danh sách phát: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@cache.async_cached_response('artists', views.catalog_version)
+async def get_artists(request):
+    try:
+        artists, next_cursor = await pagination.apaginate(
+            mongo()[views.artists_collection.name], {}, {'artist': 1, 'cover': 1, 'cover2': 1, 'albums': 1}, request
+        )
+        processed_artists = [
+            {
+                '_id': str(artist['_id']),
+                'artist': artist.get('artist', 'Unknown Artist'),
+                'cover': artist.get('cover', media.DEFAULT_COVER),
+                'cover2': artist.get('cover2', media.DEFAULT_COVER),
+                'albums': [str(album_id) for album_id in artist.get('albums', [])]
+            } for artist in artists
+        ]
+        logger.info(f"Đã lấy {len(processed_artists)} nghệ sĩ")
+        return json_response({
+            'message': 'Lấy danh sách nghệ sĩ thành công',
+            'count': len(processed_artists),
+            'data': processed_artists,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy danh sách nghệ sĩ: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@cache.async_cached_response('artist_albums', views.catalog_version, views.songs_version)
+async def get_artist_albums(request, artist_id):
+    try:
+        albums, next_cursor = await pagination.apaginate(
+            mongo()[views.albums_collection.name], {'artistId': ObjectId(artist_id)}, views.ALBUM_PROJECTION, request
+        )
+        await hydrate_albums(albums)
+        logger.info(f"Đã lấy {len(albums)} album cho artist {artist_id}")
+        return json_response({
+            'message': 'Lấy album của nghệ sĩ thành công',
+            'count': len(albums),
+            'data': albums,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy album của nghệ sĩ: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _song_payload(song, *fields):
+    payload = {'_id': str(song['_id'])}
+    for field in fields:
+        payload[field] = song.get(field, '')
+    payload['file_path'] = song.get('file_path', '/public/default_song.mp3')
+    payload['cover'] = song.get('cover', '/public/default_cover.png')
+    return payload
+
+
+@api_view(['GET'])
+async def songs_by_artist(request):
+    artist = ''
+    try:
+        artist = request.GET.get('artist', '').strip()
+        artist_id = request.GET.get('artistId', '').strip()
+        if not artist and not artist_id:
+            logger.warning("Thiếu tham số artist trong yêu cầu")
+            return json_response({'error': 'Thiếu tên nghệ sĩ'}, status.HTTP_400_BAD_REQUEST)
+        if artist_id and not ObjectId.is_valid(artist_id):
+            return json_response({'error': 'artistId không hợp lệ'}, status.HTTP_400_BAD_REQUEST)
+
+        db = mongo()
+        songs_collection = db[views.songs_collection.name]
+        projection = {'title': 1, 'artist': 1, 'file_path': 1, 'cover': 1}
+        if artist_id:
+            artist_id = ObjectId(artist_id)
+        else:
+            artist_doc = await db[views.artists_collection.name].find_one({'artist': artist}, {'_id': 1})
+            artist_id = artist_doc['_id'] if artist_doc else None
+
+        songs, next_cursor = [], None
+        if artist_id:
+            # songs.artistIds được ghi khi tạo nghệ sĩ/album (views.link_songs) và bởi manage.py backfill_song_artist_ids
+            songs, next_cursor = await pagination.apaginate(songs_collection, {'artistIds': artist_id}, projection, request, 20)
+        processed_songs = [_song_payload(song, 'title', 'artist') for song in songs]
+        logger.info(f"Lấy bài hát cho nghệ sĩ '{artist or artist_id}': {len(processed_songs)} bài")
+        return json_response({
+            'message': 'Lấy bài hát theo nghệ sĩ thành công',
+            'data': processed_songs,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy bài hát theo nghệ sĩ '{artist}': {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+async def songs_by_genre(request):
+    try:
+        genre_param = request.GET.get('genre', '').strip()
+        if not genre_param:
+            logger.warning("Thiếu tham số genre trong yêu cầu")
+            return json_response({'error': 'Thiếu thể loại'}, status.HTTP_400_BAD_REQUEST)
+
+        genre_list = [g.strip() for g in genre_param.split(',') if g.strip()]
+        if not genre_list:
+            logger.warning("Không có thể loại hợp lệ")
+            return json_response({'error': 'Không có thể loại hợp lệ'}, status.HTTP_400_BAD_REQUEST)
+
+        # genreTags được ghi khi tạo album (views.link_songs) và bởi manage.py backfill_genre_tags (index {genreTags: 1, _id: 1})
+        songs, next_cursor = await pagination.apaginate(
+            mongo()[views.songs_collection.name],
+            {'genreTags': {'$in': [normalize_genre(genre) for genre in genre_list]}},
+            {'title': 1, 'artist': 1, 'genre': 1, 'file_path': 1, 'cover': 1},
+            request
+        )
+        processed_songs = [_song_payload(song, 'title', 'artist', 'genre') for song in songs]
+        logger.info(f"Lấy bài hát theo thể loại {genre_list}: {len(processed_songs)} bài")
+        return json_response({
+            'message': f'Lấy bài hát theo thể loại {genre_list} thành công',
+            'data': processed_songs,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy bài hát theo thể loại: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------- Lịch sử ----------------
+
+@api_view(['POST'])
+@user_scoped
+async def add_historysong(request, user_id):
+    try:
+        data = request.data
+        if not all(key in data for key in ['title', 'artist', 'file_path']):
+            logger.warning(f"Missing required fields: {data}")
+            return json_response({'error': 'Missing required fields'}, status.HTTP_400_BAD_REQUEST)
+
+        # Đường dẫn được chuẩn hóa khi ghi (media.py), view đọc trả nguyên giá trị đã lưu
+        file_path = media.media_path(data['file_path'])
+
+        new_song = {
+            'title': data['title'],
+            'artist': data.get('artist', 'Unknown Artist'),
+            'file_path': file_path,
+            'cover': media.cover_path(data.get('cover')),
+            'listenedAt': datetime.now()
+        }
+        await enqueue(
+            views.write_behind.update,
+            views.historysongs_collection.name,
+            {'userId': user_id},
+            views.history_song_update(request.auth_user.username, new_song),
+            upsert=True
+        )
+        await enqueue(suggest.count_play, views.write_behind, views.playcounts_collection.name, file_path)
+        logger.info(f"Thêm bài hát vào lịch sử thành công cho userId: {user_id}")
+        return json_response({'message': 'Thêm bài hát vào lịch sử thành công'})
+    except Exception as e:
+        logger.error(f"Lỗi khi thêm bài hát vào lịch sử: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@user_scoped
+async def add_historylist(request, user_id):
+    try:
+        data = request.data
+        if not all(key in data for key in ['title', 'artist', 'songs']):
+            logger.warning(f"Missing required fields: {data}")
+            return json_response({'error': 'Missing required fields'}, status.HTTP_400_BAD_REQUEST)
+
+        normalized_title = data['title'].strip().lower()
+        # Bài có trong songs chỉ lưu songId; khóa so trùng là songId, hoặc src với bài lưu nguyên bản sao
+        # Bài không có trong songs được lưu bản sao với đường dẫn đã chuẩn hóa
+        songs = [media.normalize_song(song) for song in data['songs']]
+        songs = songrefs.to_refs(songs, await views.song_cache.aids_by_path(mongo()[views.songs_collection.name], songs))
+        song_keys = [s.get('songId') or s.get('src') for s in songs]
+
+        new_list = {
+            'title': data['title'],
+            'artist': data['artist'],
+            'cover': media.cover_path(data.get('cover')),
+            'songs': songs,
+            'listenedAt': datetime.now()
+        }
+        # Danh sách đã có (cùng tiêu đề và cùng thứ tự src) được chuyển lên đầu thay vì thêm bản sao
+        await enqueue(
+            views.write_behind.update,
+            views.historylists_collection.name,
+            {'userId': user_id},
+            [{'$set': {
+                'username': request.auth_user.username,
+                'lists': views.recent_history('$lists', new_list, {'$and': [
+                    {'$eq': [{'$toLower': {'$trim': {'input': '$$this.title'}}}, {'$literal': normalized_title}]},
+                    {'$eq': [
+                        {'$map': {
+                            'input': {'$ifNull': ['$$this.songs', []]},
+                            'as': 'song',
+                            'in': {'$ifNull': ['$$song.songId', '$$song.src']}
+                        }},
+                        {'$literal': song_keys}
+                    ]}
+                ]})
+            }}],
+            upsert=True
+        )
+        logger.info(f"Thêm danh sách vào lịch sử thành công cho userId: {user_id}")
+        return json_response({'message': 'Thêm danh sách vào lịch sử thành công'})
+    except Exception as e:
+        logger.error(f"Lỗi khi thêm danh sách vào lịch sử: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@user_scoped
+async def get_historysongs(request, user_id):
+    try:
+        history = await mongo()[views.historysongs_collection.name].find_one({'userId': user_id})
+        songs = history.get('songs', []) if history else []
+
+        processed_songs = [
+            {
+                'title': song['title'],
+                'artist': song.get('artist', 'Unknown Artist'),
+                'file_path': song.get('file_path', ''),
+                'cover': song.get('cover') or media.DEFAULT_COVER,
+                'listenedAt': song.get('listenedAt', '').isoformat() if song.get('listenedAt') else ''
+            } for song in songs
+        ]
+        songs = sorted(processed_songs, key=lambda x: x.get('listenedAt', datetime.min), reverse=True)
+        logger.info(f"Lấy lịch sử bài hát thành công cho userId: {user_id}")
+        return json_response({'message': 'Lấy lịch sử bài hát thành công', 'data': {'songs': songs}})
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy lịch sử bài hát: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@user_scoped
+async def get_historylists(request, user_id):
+    try:
+        history = await mongo()[views.historylists_collection.name].find_one({'userId': user_id})
+        lists = history.get('lists', []) if history else []
+
+        refs = await song_refs(song for item in lists for song in item.get('songs', []))
+        processed_lists = []
+        for item in lists:
+            processed_lists.append({
+                'title': item['title'],
+                'artist': item.get('artist', 'Unknown Artist'),
+                'cover': item.get('cover') or media.DEFAULT_COVER,
+                'songs': songrefs.hydrate(item.get('songs', []), refs),
+                'listenedAt': item.get('listenedAt', '').isoformat() if item.get('listenedAt') else ''
+            })
+
+        lists = sorted(processed_lists, key=lambda x: x.get('listenedAt', datetime.min), reverse=True)
+        logger.info(f"Lấy lịch sử danh sách thành công cho userId: {user_id}")
+        return json_response({'message': 'Lấy lịch sử danh sách thành công', 'data': {'lists': lists}})
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy lịch sử danh sách: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@user_scoped
+async def get_login_history(request, user_id):
+    try:
+        # Mới nhất trước; cursor là (timestamp, _id) của bản ghi cuối trang nên cần _id trong projection
+        logins, next_cursor = await pagination.apaginate(
+            mongo()[views.loginevents_collection.name],
+            {'userId': user_id},
+            {'timestamp': 1, 'device': 1},
+            request,
+            settings.LOGIN_HISTORY_PAGE_SIZE,
+            sort_field='timestamp',
+            descending=True
+        )
+        processed_logins = [
+            {
+                'timestamp': login['timestamp'].isoformat(),
+                'device': login.get('device', 'Unknown Device')
+            } for login in logins
+        ]
+        logger.info(f"Lấy lịch sử đăng nhập cho user {user_id}: {len(processed_logins)} bản ghi")
+        return json_response({
+            'message': 'Lấy lịch sử đăng nhập thành công',
+            'data': processed_logins,
+            'nextCursor': next_cursor
+        })
+    except pagination.InvalidPage as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy lịch sử đăng nhập cho user {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ---------------- Người dùng, playlist ----------------
+
+@api_view(['GET'])
+@user_scoped
+async def get_user(request, user_id):
+    try:
+        user = await mongo()[views.UserProfile._get_collection_name()].find_one(
+            {'_id': ObjectId(user_id)}, {'username': 1, 'email': 1, 'phone': 1}
+        )
+        if not user:
+            logger.warning(f"Người dùng không tồn tại: {user_id}")
+            return json_response({'error': 'Người dùng không tồn tại'}, status.HTTP_404_NOT_FOUND)
+
+        return json_response({
+            'username': user['username'],
+            'email': user.get('email') or '',
+            'phone': user.get('phone') or ''
+        })
+    except Exception as e:
+        logger.error(f"Lỗi khi lấy thông tin người dùng: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi khi lấy thông tin người dùng: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@user_scoped
+async def get_my_playlist(request, user_id):
+    try:
+        logger.debug(f"Fetching playlist for userId: {user_id}")
+        collection = mongo()[views.myplaylist_collection.name]
+        playlist = await collection.find_one({'userId': user_id})
+        if not playlist:
+            logger.info(f"No playlist found for userId: {user_id}")
+            return json_response({'message': 'Không tìm thấy danh sách cá nhân', 'data': {'playlists': []}})
+
+        stored = playlist.get('playlists', [])
+        if not isinstance(stored, list):
+            logger.error(f"Invalid playlists format for userId {user_id}: {stored}")
+            await collection.update_one(
+                {'userId': user_id},
+                {'$set': {'playlists': []}},
+                upsert=True
+            )
+            return json_response({'message': 'Không tìm thấy danh sách cá nhân', 'data': {'playlists': []}})
+
+        current, changed = playlists.with_ids(stored)
+        for _ in range(3):
+            if not changed:
+                break
+            # Dữ liệu cũ chưa có id: gán một lần, chỉ khi mảng chưa bị request khác sửa kể từ lúc đọc
+            written = await collection.update_one(
+                {'_id': playlist['_id'], 'playlists': stored},
+                {'$set': {'playlists': current}}
+            )
+            if written.matched_count:
+                break
+            playlist = await collection.find_one({'_id': playlist['_id']}) or {'_id': playlist['_id']}
+            stored = playlist.get('playlists') or []
+            current, changed = playlists.with_ids(stored)
+
+        for i, p in enumerate(current):
+            if not isinstance(p, dict):
+                logger.error(f"Invalid playlist entry at index {i} for userId {user_id}: {p}")
+        songs = await song_refs(song for p in current if isinstance(p, dict) for song in p.get('songs', []))
+        result = {'playlists': playlists.public(current, songs)}
+
+        logger.debug(f"Processed playlists for userId {user_id}: {result}")
+        return json_response({'message': 'Lấy danh sách cá nhân thành công', 'data': result})
+    except Exception as e:
+        logger.error(f"Error fetching playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def playlist_target(user_id, data, entry=False):
+    """(playlistId, entryId) của request playlist.
+
+    Client mới gửi playlistId/entryId. Body cũ chỉ có playlistIndex/songIndex thì đổi vị trí sang id
+    bằng một lần đọc, sau đó thao tác vẫn chỉ nhắm vào id nên không ghi nhầm phần tử khi mảng bị đổi.
+    """
+    playlist_id, entry_id = data.get('playlistId'), data.get('entryId')
+    if playlist_id and (entry_id or not entry):
+        return playlist_id, entry_id
+    if data.get('playlistIndex') is None:
+        return playlist_id, entry_id
+    doc = await playlists.aensure_ids(mongo()[views.myplaylist_collection.name], user_id)
+    resolved_id, resolved_entry = playlists.resolve(doc, data.get('playlistIndex'), data.get('songIndex') if entry else None)
+    return resolved_id, entry_id or resolved_entry
+
+
+@api_view(['POST'])
+@user_scoped
+async def create_new_playlist(request, user_id):
+    try:
+        logger.debug(f"Creating new playlist for userId: {user_id}")
+        playlist_id = playlists.new_id()
+        result = await playlists.acreate(
+            mongo()[views.myplaylist_collection.name], user_id, playlist_id, request.data.get('title')
+        )
+        if not result.matched_count:
+            logger.warning(f"Maximum {playlists.MAX_PLAYLISTS} playlists reached for userId: {user_id}")
+            return json_response(
+                {'error': f'Bạn chỉ có thể tạo tối đa {playlists.MAX_PLAYLISTS} danh sách phát'},
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        if result.modified_count > 0:
+            logger.info(f"Created new playlist {playlist_id} for userId: {user_id}")
+            return json_response({'message': 'Đã tạo danh sách mới', 'playlistId': playlist_id})
+        logger.error(f"Failed to create playlist for userId: {user_id}")
+        return json_response({'error': 'Không thể tạo danh sách mới'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        logger.error(f"Error creating playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@user_scoped
+async def add_to_playlist(request, user_id):
+    try:
+        song = playlists.song(request.data)
+        if not song or (request.data.get('playlistId') is None and request.data.get('playlistIndex') is None):
+            logger.error(f"Missing required fields: {request.data}")
+            return json_response({'error': 'Thiếu thông tin bắt buộc'}, status.HTTP_400_BAD_REQUEST)
+
+        playlist_id, _ = await playlist_target(user_id, request.data)
+        ids_by_path = await views.song_cache.aids_by_path(mongo()[views.songs_collection.name], [song])
+        entry = playlists.new_entry(songrefs.to_refs([song], ids_by_path)[0])
+        result = await playlists.aapply(
+            mongo()[views.myplaylist_collection.name], playlists.add_songs(user_id, playlist_id, [entry])
+        ) if playlist_id else None
+        if not result or not result.matched_count:
+            logger.error(f"Playlist {request.data.get('playlistId', request.data.get('playlistIndex'))} not found for userId {user_id}")
+            return json_response({'error': 'Danh sách không tồn tại'}, status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Added song to playlist {playlist_id} for userId: {user_id}")
+        return json_response({'message': 'Đã thêm bài hát vào danh sách', 'playlistId': playlist_id, 'entryId': entry['entryId']})
+    except Exception as e:
+        logger.error(f"Error adding song to playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['DELETE'])
+@user_scoped
+async def delete_playlist(request, user_id):
+    try:
+        if request.data.get('playlistId') is None and request.data.get('playlistIndex') is None:
+            logger.error("Missing playlistId")
+            return json_response({'error': 'Thiếu playlistId'}, status.HTTP_400_BAD_REQUEST)
+
+        playlist_id, _ = await playlist_target(user_id, request.data)
+        result = await playlists.aapply(
+            mongo()[views.myplaylist_collection.name], playlists.delete(user_id, playlist_id)
+        ) if playlist_id else None
+        if not result or not result.modified_count:
+            logger.warning(f"No playlist {request.data.get('playlistId', request.data.get('playlistIndex'))} for userId: {user_id}")
+            return json_response({'error': 'Danh sách không tồn tại'}, status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Deleted playlist {playlist_id} for userId: {user_id}")
+        return json_response({'message': 'Đã xóa danh sách'})
+    except Exception as e:
+        logger.error(f"Error deleting playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['PUT'])
+@user_scoped
+async def edit_playlist(request, user_id):
+    try:
+        new_title = request.data.get('newTitle', '')
+        if (request.data.get('playlistId') is None and request.data.get('playlistIndex') is None) or not new_title:
+            logger.error(f"Missing playlistId or newTitle: {request.data}")
+            return json_response({'error': 'Thiếu playlistId hoặc newTitle'}, status.HTTP_400_BAD_REQUEST)
+
+        collection = mongo()[views.myplaylist_collection.name]
+        playlist_id, _ = await playlist_target(user_id, request.data)
+        result = await playlists.aapply(collection, playlists.rename(user_id, playlist_id, new_title)) if playlist_id else None
+        if result and result.modified_count > 0:
+            logger.info(f"Renamed playlist {playlist_id} to {new_title} for userId: {user_id}")
+            return json_response({'message': 'Đã sửa tên danh sách'})
+
+        if result and not result.matched_count and await collection.count_documents(
+            {'userId': user_id, 'playlists.id': playlist_id}, limit=1
+        ):
+            # Playlist vẫn còn nên điều kiện hỏng là tiêu đề trùng với playlist khác
+            logger.warning(f"Playlist title '{new_title}' already exists for userId: {user_id}")
+            return json_response({'error': 'Tiêu đề danh sách đã tồn tại'}, status.HTTP_400_BAD_REQUEST)
+        if not result or not result.matched_count:
+            logger.warning(f"No playlist {request.data.get('playlistId', request.data.get('playlistIndex'))} for userId: {user_id}")
+            return json_response({'error': 'Danh sách không tồn tại'}, status.HTTP_400_BAD_REQUEST)
+        logger.warning(f"No changes made for playlist {playlist_id} for userId: {user_id}")
+        return json_response({'error': 'Không thể sửa tên danh sách'}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error renaming playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['DELETE'])
+@user_scoped
+async def remove_song_from_playlist(request, user_id):
+    try:
+        if (request.data.get('playlistId') is None and request.data.get('playlistIndex') is None) or (
+            request.data.get('entryId') is None and request.data.get('songIndex') is None
+        ):
+            logger.error("Missing playlistId or entryId")
+            return json_response({'error': 'Thiếu playlistId hoặc entryId'}, status.HTTP_400_BAD_REQUEST)
+
+        playlist_id, entry_id = await playlist_target(user_id, request.data, entry=True)
+        if not playlist_id:
+            logger.warning(f"No playlist {request.data.get('playlistId', request.data.get('playlistIndex'))} for userId: {user_id}")
+            return json_response({'error': 'Danh sách không tồn tại'}, status.HTTP_400_BAD_REQUEST)
+
+        result = await playlists.aapply(
+            mongo()[views.myplaylist_collection.name], playlists.remove_entries(user_id, playlist_id, [entry_id])
+        ) if entry_id else None
+        if not result or not result.modified_count:
+            logger.warning(f"No song {request.data.get('entryId', request.data.get('songIndex'))} in playlist {playlist_id} for userId: {user_id}")
+            return json_response({'error': 'Bài hát không tồn tại'}, status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Removed song {entry_id} from playlist {playlist_id} for userId: {user_id}")
+        return json_response({'message': 'Đã xóa bài hát thành công'})
+    except Exception as e:
+        logger.error(f"Error removing song from playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@user_scoped
+async def playlist_ops(request, user_id):
+    """Áp một lô thao tác (add/remove/move/reorder/rename) theo thứ tự trong một lần ghi.
+
+    Body: {"ops": [{"op": "add", "playlistId": ..., "songs": [...]}, ...]}; trả về playlist sau khi áp.
+    """
+    try:
+        ops = request.data.get('ops')
+        # Bài của mọi thao tác add, đổi sang songId bằng một truy vấn
+        added = [
+            song for op in (ops if isinstance(ops, list) else [])
+            if isinstance(op, dict) and op.get('op') == 'add' and isinstance(op.get('songs'), list)
+            for song in op['songs']
+        ]
+        ids_by_path = await views.song_cache.aids_by_path(mongo()[views.songs_collection.name], added)
+        try:
+            mutation, entries = playlists.batch(user_id, ops, ids_by_path)
+        except ValueError as e:
+            logger.warning(f"Invalid playlist ops for userId {user_id}: {e}")
+            return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        collection = mongo()[views.myplaylist_collection.name]
+        doc = await collection.find_one_and_update(
+            mutation.filter, mutation.update, projection={'playlists': 1}, return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            # Điều kiện hỏng: thiếu playlist, thiếu bài được move, hoặc tiêu đề mới trùng playlist khác
+            if not await collection.count_documents({'userId': user_id, 'playlists.id': mutation.filter['playlists.id']}, limit=1):
+                reason, error = 'missing playlist', 'Danh sách không tồn tại'
+            elif 'playlists' in mutation.filter and await collection.count_documents(
+                {key: value for key, value in mutation.filter.items() if key != 'playlists'}, limit=1
+            ):
+                reason, error = 'duplicate title', 'Tiêu đề danh sách đã tồn tại'
+            else:
+                reason, error = 'missing entry', 'Bài hát không tồn tại'
+            logger.warning(f"Playlist ops rejected for userId {user_id}: {reason}")
+            return json_response({'error': error}, status.HTTP_400_BAD_REQUEST)
+
+        stored = doc.get('playlists', [])
+        songs = await views.song_cache.aget_many(mongo()[views.songs_collection.name], playlists.song_ids(stored))
+        logger.info(f"Applied {len(ops)} playlist ops ({len(entries)} songs added) for userId: {user_id}")
+        return json_response({'message': 'Đã cập nhật danh sách', 'data': {'playlists': playlists.public(stored, songs)}})
+    except Exception as e:
+        logger.error(f"Error applying playlist ops for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
+        return json_response({'error': f'Lỗi server: {str(e)}'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,150 @@
+import functools
+import logging
+import time
+
+import jwt
+from bson import ObjectId
+from django.conf import settings
+from rest_framework import status
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = 'HS256'
+
+
+class TokenUser:
+    """Người dùng lấy từ claim của access token, không đọc MongoDB."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, token_version=0, token=None):
+        self.id = id
+        self.username = username
+        self.token_version = token_version
+        self.token = token
+
+    def __str__(self):
+        return self.username
+
+
+def _encode(user, token_type, ttl):
+    now = int(time.time())
+    claims = {
+        'sub': str(user.id),
+        'username': user.username,
+        'ver': user.token_version or 0,
+        'type': token_type,
+        'iat': now,
+        'exp': now + ttl
+    }
+    return jwt.encode(claims, settings.JWT_SECRET_KEY, algorithm=ALGORITHM)
+
+
+def issue_tokens(user):
+    """Cặp access/refresh token cho một UserProfile (hoặc TokenUser)."""
+    return {
+        'accessToken': _encode(user, 'access', settings.JWT_ACCESS_TTL),
+        'refreshToken': _encode(user, 'refresh', settings.JWT_REFRESH_TTL),
+        'expiresIn': settings.JWT_ACCESS_TTL
+    }
+
+
+def decode_token(token, token_type):
+    try:
+        claims = jwt.decode(
+            token,
+            settings.JWT_SECRET_KEY,
+            algorithms=[ALGORITHM],
+            options={'require': ['sub', 'exp', 'type']}
+        )
+    except jwt.ExpiredSignatureError:
+        raise AuthenticationFailed('Token đã hết hạn')
+    except jwt.InvalidTokenError:
+        raise AuthenticationFailed('Token không hợp lệ')
+    if claims['type'] != token_type:
+        raise AuthenticationFailed('Token không hợp lệ')
+    return claims
+
+
+def token_user(request):
+    """TokenUser từ header ``Authorization: Bearer``; None nếu không có header, AuthenticationFailed nếu sai."""
+    header = get_authorization_header(request).split()
+    if not header or header[0].lower() != TokenAuthentication.keyword.lower().encode():
+        return None
+    if len(header) != 2:
+        raise AuthenticationFailed('Header Authorization không hợp lệ')
+    try:
+        token = header[1].decode()
+    except UnicodeDecodeError:
+        raise AuthenticationFailed('Token không hợp lệ')
+    claims = decode_token(token, 'access')
+    return TokenUser(claims['sub'], claims.get('username'), claims.get('ver', 0), token)
+
+
+class TokenAuthentication(BaseAuthentication):
+    """Xác thực header ``Authorization: Bearer <access token>`` chỉ bằng chữ ký.
+
+    Không đọc MongoDB: token bị thu hồi (token_version tăng) vẫn dùng được tới khi hết
+    hạn, tối đa JWT_ACCESS_TTL giây; refresh token thì luôn được kiểm tra lại phiên bản.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        user = token_user(request)
+        return (user, user.token) if user else None
+
+    def authenticate_header(self, request):
+        # Trả 401 (thay vì 403) kèm WWW-Authenticate để client biết cần refresh
+        return self.keyword
+
+
+def refresh_tokens(refresh_token, user_model):
+    """Đổi refresh token lấy cặp token mới; đây là chỗ duy nhất đọc token_version từ MongoDB."""
+    claims = decode_token(refresh_token, 'refresh')
+    user = user_model.objects(id=claims['sub']).only('username', 'token_version').first()
+    if not user or (user.token_version or 0) != claims.get('ver', 0):
+        raise AuthenticationFailed('Token đã bị thu hồi')
+    return issue_tokens(user)
+
+
+def revoke(user_model, user_id):
+    # Mọi refresh token đã cấp cho user này hết hiệu lực (đổi mật khẩu, đăng xuất mọi thiết bị);
+    # trả về user với token_version mới (None nếu không tồn tại) để cấp lại token cho phiên hiện tại
+    return user_model.objects(id=user_id).modify(new=True, inc__token_version=1)
+
+
+def user_scoped(user_model):
+    """Decorator cho view có ``user_id`` trên URL, đặt dưới @api_view.
+
+    Có access token: chỉ so ``sub`` với ``user_id``, không đọc MongoDB. Không có token
+    và AUTH_ALLOW_LEGACY_USER_ID bật: kiểm tra user tồn tại như trước (một lần đọc).
+    Trong view, ``request.user`` luôn là TokenUser với id và username.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, user_id, *args, **kwargs):
+            if not user_id or user_id in ['None', 'null', 'undefined'] or not ObjectId.is_valid(user_id):
+                logger.warning(f"Invalid user_id: {user_id}")
+                return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if isinstance(request.user, TokenUser):
+                if request.user.id != user_id:
+                    logger.warning(f"Token của user {request.user.id} truy cập dữ liệu của user {user_id}")
+                    return Response({'error': 'Không có quyền truy cập'}, status=status.HTTP_403_FORBIDDEN)
+                return view(request, user_id, *args, **kwargs)
+
+            if not settings.AUTH_ALLOW_LEGACY_USER_ID:
+                return Response({'error': 'Vui lòng đăng nhập'}, status=status.HTTP_401_UNAUTHORIZED)
+            user = user_model.objects(id=user_id).only('username', 'token_version').first()
+            if not user:
+                logger.warning(f"Người dùng không tồn tại: {user_id}")
+                return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
+            request.user = TokenUser(user_id, user.username, user.token_version or 0)
+            return view(request, user_id, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,106 @@
+import logging
+import os
+
+import numpy as np
+from django.conf import settings
+
+from . import inference
+
+logger = logging.getLogger(__name__)
+
+TFLITE_VARIANTS = ('float16', 'int8')
+
+
+def tflite_model_path(variant):
+    # model/emotion_model.keras -> model/emotion_model_float16.tflite
+    base, _ = os.path.splitext(settings.EMOTION_MODEL_PATH)
+    return os.path.join(settings.EMOTION_TFLITE_DIR or os.path.dirname(base), f"{os.path.basename(base)}_{variant}.tflite")
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path=None):
+        import tensorflow as tf
+        inference.configure_tf_threads(tf)
+        self.model_path = model_path or settings.EMOTION_MODEL_PATH
+        self.model = tf.keras.models.load_model(self.model_path)
+        logger.debug(f"Mô hình được tải thành công! ({self.model_path})")
+        logger.debug(f"Input shape of model: {self.model.input_shape}")
+        logger.debug(f"Output shape of model: {self.model.output_shape}")
+
+    def predict_batch(self, inputs):
+        return np.asarray(self.model.predict_on_batch(inputs))
+
+
+class TFLiteBackend:
+    """Chạy model TFLite (float16 hoặc int8). Interpreter không an toàn đa luồng,
+    nên chỉ được gọi từ luồng worker của InferenceEngine.
+
+    Tensor được cấp phát một lần với ``max_batch_size`` (EMOTION_BATCH_SIZE): batch nhỏ hơn được
+    đệm thêm hàng 0 và cắt kết quả, vì resize_tensor_input + allocate_tensors ở mỗi kích thước
+    batch mới tốn hơn phần tính thêm cho các hàng đệm.
+    """
+
+    def __init__(self, variant, model_path=None, max_batch_size=None):
+        import tensorflow as tf
+        if variant not in TFLITE_VARIANTS:
+            raise ValueError(f"Biến thể TFLite không hợp lệ: {variant}")
+        self.name = f'tflite-{variant}'
+        self.model_path = model_path or tflite_model_path(variant)
+        self.interpreter = tf.lite.Interpreter(
+            model_path=self.model_path,
+            num_threads=settings.TF_INTRA_OP_THREADS or None
+        )
+        self._batch_size = None
+        self._allocate(max(1, max_batch_size or settings.EMOTION_BATCH_SIZE))
+        logger.debug(f"Đã tải model {self.name} từ {self.model_path}, input: {self._input['shape']}, dtype: {self._input['dtype']}")
+
+    def _allocate(self, batch_size):
+        input_details = self.interpreter.get_input_details()[0]
+        shape = [batch_size, *input_details['shape_signature'][1:]]
+        self.interpreter.resize_tensor_input(input_details['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict_batch(self, inputs):
+        outputs = []
+        # Batch lớn hơn kích thước đã cấp phát (chỉ có ở lệnh benchmark) được chia nhỏ
+        for start in range(0, len(inputs), self._batch_size):
+            chunk = inputs[start:start + self._batch_size]
+            padded = chunk
+            if len(chunk) < self._batch_size:
+                padding = np.zeros((self._batch_size - len(chunk), *chunk.shape[1:]), dtype=chunk.dtype)
+                padded = np.concatenate([chunk, padding])
+            self.interpreter.set_tensor(self._input['index'], _quantize(padded, self._input))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])[:len(chunk)]
+            outputs.append(_dequantize(output, self._output))
+        return np.concatenate(outputs)
+
+
+def _quantize(values, details):
+    dtype = details['dtype']
+    scale, zero_point = details['quantization']
+    if dtype in (np.int8, np.uint8) and scale:
+        info = np.iinfo(dtype)
+        return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(dtype)
+    return values.astype(dtype)
+
+
+def _dequantize(values, details):
+    scale, zero_point = details['quantization']
+    if values.dtype in (np.int8, np.uint8) and scale:
+        return (values.astype(np.float32) - zero_point) * scale
+    return values.astype(np.float32)
+
+
+def load_backend(name=None):
+    name = name or settings.EMOTION_BACKEND
+    if name == 'keras':
+        return KerasBackend()
+    if name.startswith('tflite-'):
+        return TFLiteBackend(name.removeprefix('tflite-'))
+    raise ValueError(f"EMOTION_BACKEND không hợp lệ: {name}")
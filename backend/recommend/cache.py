@@ -0,0 +1,141 @@
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from pymongo import ReturnDocument
+from rest_framework import status
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogVersion:
+    """Bộ đếm phiên bản catalog (albums, list, artists) lưu trong MongoDB.
+
+    View ghi gọi bump(); các process đọc lại giá trị sau tối đa ``ttl`` giây,
+    nên phần lớn request không cần hỏi MongoDB.
+    """
+
+    def __init__(self, collection, key='catalog', ttl=1.0):
+        self.collection = collection
+        self.key = key
+        self.ttl = ttl
+        self._version = None
+        self._checked_at = 0.0
+
+    def peek(self):
+        # Giá trị đã đọc nếu còn trong ``ttl``, None nếu phải hỏi lại MongoDB
+        if self._version is None or time.monotonic() - self._checked_at > self.ttl:
+            return None
+        return self._version
+
+    def get(self):
+        if self.peek() is None:
+            doc = self.collection.find_one({'_id': self.key}, {'version': 1})
+            self._version = doc['version'] if doc else 0
+            self._checked_at = time.monotonic()
+        return self._version
+
+    def bump(self):
+        doc = self.collection.find_one_and_update(
+            {'_id': self.key},
+            {'$inc': {'version': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._version = doc['version']
+        self._checked_at = time.monotonic()
+        return self._version
+
+
+class ResponseCache:
+    # LRU các response đã serialize: key -> (body, etag)
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
+
+
+def bump(version):
+    try:
+        return version.bump()
+    except Exception as e:
+        # Cache cũ được dùng tiếp tới lần bump sau, không làm hỏng request ghi
+        logger.error(f"Lỗi khi tăng phiên bản catalog: {e}")
+
+
+def _not_modified(request, etag):
+    tags = [tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')]
+    return etag in tags or '*' in tags
+
+
+def _finish(request, body, etag):
+    response = HttpResponseNotModified() if _not_modified(request, etag) else HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Trình duyệt luôn hỏi lại máy chủ, máy chủ trả 304 nếu ETag còn đúng
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _cache_key(name, current, request, kwargs):
+    return (name, current, tuple(sorted(kwargs.items())), tuple((k, tuple(v)) for k, v in sorted(request.GET.lists())))
+
+
+def _etag(body):
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def async_cached_response(name, *versions):
+    """Cache JSON của view đọc catalog (async_views) theo (phiên bản của mọi ``versions``, tham số), kèm ETag và 304.
+
+    ``versions``: các đối tượng có peek()/get() (CatalogVersion, catalog.SongsVersion); view trả nội dung
+    lấy từ songs (album hydrate theo songId) cần cả phiên bản songs để không trả bài cũ sau khi bài đổi.
+    Đặt dưới @api_view. Chỉ response 200 được cache; lỗi đi thẳng ra ngoài như cũ.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                current = []
+                for version in versions:
+                    value = version.peek()
+                    if value is None:
+                        value = await sync_to_async(version.get, thread_sensitive=False)()
+                    current.append(value)
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc phiên bản catalog, bỏ qua cache: {e}")
+                return await view(request, *args, **kwargs)
+
+            key = _cache_key(name, tuple(current), request, kwargs)
+            entry = response_cache.get(key)
+            if entry is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                entry = (response.content, _etag(response.content))
+                response_cache.set(key, entry)
+            return _finish(request, *entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,294 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+
+from .features import FeatureRecommender
+
+logger = logging.getLogger(__name__)
+
+SONG_FIELDS = ('title', 'artist', 'genre', 'emotion', 'bpm', 'file_path', 'cover', 'updatedAt')
+PLAYLIST_FIELDS = ('title', 'artist', 'genre', 'file_path', 'cover')
+
+
+def normalize_file_path(file_path):
+    if file_path and not file_path.startswith('/'):
+        return f"/{file_path}"
+    return file_path or ''
+
+
+class RankingIndex:
+    """Snapshot gợi ý của một phiên bản catalog.
+
+    Các trường playlist được lưu thành mảng NumPy; với mỗi cảm xúc, top ``depth`` bài
+    (chấm điểm bằng FeatureRecommender) được tính sẵn, nên recommend() chỉ cắt top_k chỉ số đầu.
+    """
+
+    def __init__(self, songs, emotions, version=0, depth=100):
+        self.version = version
+        self.size = len(songs)
+        self.depth = depth
+        self.recommender = FeatureRecommender(songs, emotions)
+        self._positions = {song['_id']: i for i, song in enumerate(songs)}
+        self._columns = {}
+        for field in PLAYLIST_FIELDS:
+            column = np.empty(len(songs), dtype=object)
+            column[:] = [song[field] for song in songs]
+            self._columns[field] = column
+        self._rankings = {emotion: self.recommender.recommend(emotion, depth) for emotion in emotions}
+
+    def recommend(self, emotion, top_k, seed_song_id=None):
+        emotion = emotion.lower()
+        seed = self._positions.get(seed_song_id) if seed_song_id is not None else None
+        if seed is not None or top_k > self.depth or emotion not in self._rankings:
+            # Không có sẵn: chấm điểm trực tiếp (nhân ma trận-vector + argpartition)
+            indices = self.recommender.recommend(emotion, top_k, seed=seed)
+        else:
+            indices = self._rankings[emotion][:top_k]
+        columns = [self._columns[field][indices] for field in PLAYLIST_FIELDS]
+        return [dict(zip(PLAYLIST_FIELDS, row)) for row in zip(*columns)]
+
+
+def prepare_song(doc):
+    song = {field: doc.get(field) for field in SONG_FIELDS}
+    song['_id'] = doc['_id']
+    song['emotion'] = str(song['emotion'] or '').lower()
+    song['file_path'] = normalize_file_path(song['file_path'])
+    song['cover'] = song['cover'] or ''
+    try:
+        song['bpm'] = float(song['bpm'])
+    except (TypeError, ValueError):
+        song['bpm'] = None
+    return song
+
+
+class SongsVersion:
+    """Phiên bản của collection songs, cùng giao diện peek()/get() với cache.CatalogVersion.
+
+    Bài hát được ghi ngoài app nên không có bump(): phiên bản là số bài kèm updatedAt mới nhất,
+    đổi khi thêm, xóa hoặc sửa bài (có cập nhật updatedAt), và được đọc lại sau tối đa ``ttl`` giây.
+    """
+
+    def __init__(self, collection, ttl=1.0):
+        self.collection = collection
+        self.ttl = ttl
+        self._version = None
+        self._checked_at = 0.0
+
+    def peek(self):
+        if self._version is None or time.monotonic() - self._checked_at > self.ttl:
+            return None
+        return self._version
+
+    def get(self):
+        if self.peek() is None:
+            latest = self.collection.find_one({}, {'updatedAt': 1}, sort=[('updatedAt', DESCENDING)])
+            updated_at = latest.get('updatedAt') if latest else None
+            self._version = f"{self.collection.estimated_document_count()}:{updated_at or ''}"
+            self._checked_at = time.monotonic()
+        return self._version
+
+
+class SongCatalog:
+    """Catalog bài hát của process.
+
+    Giữ toàn bộ bài hát theo _id; mỗi thay đổi tạo một RankingIndex mới với version
+    tăng dần và thay thế bản cũ bằng một phép gán, nên request đang đọc không bị chặn.
+    """
+
+    def __init__(self, collection, emotions):
+        self.collection = collection
+        self.emotions = [e.lower() for e in emotions]
+        self._songs = {}
+        self._index = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._refresher_pid = None
+        self._listeners = []
+
+    @property
+    def projection(self):
+        return {field: 1 for field in SONG_FIELDS}
+
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._resync()
+        if settings.CATALOG_REFRESH_ENABLED:
+            self._ensure_refresher()
+        return self._index
+
+    def songs(self):
+        return list(self._songs.values())
+
+    def get(self, song_id):
+        return self._songs.get(song_id)
+
+    def add_listener(self, listener):
+        # listener(upserts, deletes) được gọi sau mỗi lần catalog đổi, với các bài đã chuẩn hóa và _id bị xóa
+        self._listeners.append(listener)
+
+    def reload(self):
+        with self._lock:
+            self._resync()
+        return self._index
+
+    def apply_changes(self, upserts=(), deletes=()):
+        """Áp dụng các bài hát được thêm/sửa (document Mongo) và _id bị xóa, trả về True nếu catalog đổi."""
+        with self._lock:
+            songs = dict(self._songs)
+            changed = False
+            for doc in upserts:
+                song = prepare_song(doc)
+                if songs.get(song['_id']) != song:
+                    songs[song['_id']] = song
+                    changed = True
+            for song_id in deletes:
+                changed = songs.pop(song_id, None) is not None or changed
+            if changed:
+                self._publish(songs)
+            return changed
+
+    def _resync(self):
+        try:
+            songs = {doc['_id']: prepare_song(doc) for doc in self.collection.find({}, self.projection)}
+        except Exception as e:
+            logger.error(f"Lỗi tải songs_data: {e}")
+            if self._index is not None:
+                return  # giữ bản cũ
+            songs = {}
+        self._publish(songs)
+
+    def _publish(self, songs):
+        ranked = [s for s in songs.values() if s['emotion'] in self.emotions]
+        self._version += 1
+        index = RankingIndex(ranked, self.emotions, self._version, settings.RECOMMEND_PRECOMPUTE_DEPTH)
+        previous = self._songs
+        self._songs = songs
+        self._index = index
+        logger.debug(f"Catalog version {self._version}: {len(ranked)} bài hát với {len(self.emotions)} cảm xúc.")
+
+        if self._listeners:
+            upserts = [song for song_id, song in songs.items() if previous.get(song_id) != song]
+            deletes = [song_id for song_id in previous if song_id not in songs]
+            for listener in self._listeners:
+                try:
+                    listener(upserts, deletes)
+                except Exception as e:
+                    logger.error(f"Lỗi khi cập nhật listener của catalog: {e}")
+
+    def _ensure_refresher(self):
+        # Luồng nền không sống sót qua fork của gunicorn, nên khởi động theo pid
+        pid = os.getpid()
+        if self._refresher_pid == pid and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher_pid != pid or not self._refresher.is_alive():
+                self._refresher = CatalogRefresher(self)
+                self._refresher_pid = pid
+                self._refresher.start()
+
+
+class CatalogRefresher(threading.Thread):
+    """Đồng bộ catalog với collection songs ở nền.
+
+    Dùng change stream nếu deployment hỗ trợ (replica set / Atlas); nếu không thì
+    poll theo watermark updatedAt/_id, và định kỳ quét danh sách _id để phát hiện bài bị xóa.
+    """
+
+    def __init__(self, catalog):
+        super().__init__(name='catalog-refresher', daemon=True)
+        self.catalog = catalog
+        self._last_id = None
+        self._last_updated = None
+        self._polls = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        use_change_stream = settings.CATALOG_CHANGE_STREAM
+        while not self._stopped.is_set():
+            try:
+                if use_change_stream:
+                    use_change_stream = self._watch()
+                else:
+                    self._poll()
+                    self._stopped.wait(settings.CATALOG_POLL_INTERVAL)
+            except Exception as e:
+                logger.error(f"Lỗi khi làm mới catalog: {e}")
+                self._stopped.wait(settings.CATALOG_POLL_INTERVAL)
+
+    def _watch(self):
+        collection = self.catalog.collection
+        try:
+            stream = collection.watch(full_document='updateLookup', max_await_time_ms=1000)
+        except OperationFailure as e:
+            logger.info(f"Change stream không được hỗ trợ ({e}), chuyển sang polling")
+            self._init_watermarks()
+            return False
+
+        with stream:
+            # Đồng bộ lại những thay đổi xảy ra trước khi stream được mở
+            self.catalog.reload()
+            logger.debug("Đang theo dõi thay đổi của songs qua change stream")
+            while stream.alive and not self._stopped.is_set():
+                change = stream.try_next()
+                upserts, deletes = [], []
+                while change is not None:
+                    operation = change['operationType']
+                    if operation in ('insert', 'update', 'replace'):
+                        if change.get('fullDocument') is not None:
+                            upserts.append(change['fullDocument'])
+                        else:
+                            deletes.append(change['documentKey']['_id'])
+                    elif operation == 'delete':
+                        deletes.append(change['documentKey']['_id'])
+                    else:
+                        # drop/rename/invalidate: mở lại stream và đồng bộ toàn bộ
+                        return True
+                    change = stream.try_next() if len(upserts) + len(deletes) < 1000 else None
+                if upserts or deletes:
+                    self.catalog.apply_changes(upserts, deletes)
+        return True
+
+    def _init_watermarks(self):
+        self.catalog.index()
+        for song in self.catalog.songs():
+            self._advance(song)
+
+    def _advance(self, doc):
+        if self._last_id is None or doc['_id'] > self._last_id:
+            self._last_id = doc['_id']
+        updated_at = doc.get('updatedAt')
+        if updated_at and (self._last_updated is None or updated_at > self._last_updated):
+            self._last_updated = updated_at
+
+    def _poll(self):
+        collection = self.catalog.collection
+        conditions = []
+        if self._last_id is not None:
+            conditions.append({'_id': {'$gt': self._last_id}})
+        if self._last_updated is not None:
+            # $gte để không bỏ sót bản ghi cùng mốc thời gian; bản không đổi bị apply_changes bỏ qua
+            conditions.append({'updatedAt': {'$gte': self._last_updated}})
+        upserts = list(collection.find({'$or': conditions} if conditions else {}, self.catalog.projection))
+
+        deletes = []
+        self._polls += 1
+        if self._polls % settings.CATALOG_DELETE_SCAN_EVERY == 0:
+            live_ids = {doc['_id'] for doc in collection.find({}, {'_id': 1})}
+            deletes = [song['_id'] for song in self.catalog.songs() if song['_id'] not in live_ids]
+
+        if (upserts or deletes) and self.catalog.apply_changes(upserts, deletes):
+            logger.debug(f"Catalog polling: {len(upserts)} thêm/sửa, {len(deletes)} xóa")
+        for doc in upserts:
+            self._advance(doc)
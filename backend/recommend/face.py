@@ -0,0 +1,75 @@
+import logging
+import threading
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IMG_SIZE = 48
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+
+# CascadeClassifier không an toàn khi nhiều luồng cùng gọi detectMultiScale,
+# nên mỗi luồng giữ một bản riêng, chỉ parse XML một lần cho cả vòng đời luồng.
+_local = threading.local()
+
+
+def get_face_detector():
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        detector = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
+        if detector.empty():
+            raise RuntimeError(f"Không tải được {CASCADE_FILE}")
+        _local.detector = detector
+        logger.debug(f"Đã tải face detector cho luồng {threading.current_thread().name}")
+    return detector
+
+
+def decode_image(data):
+    """Giải mã ảnh upload sang ảnh xám, ảnh lớn (ảnh điện thoại) được giải mã ở độ phân giải giảm."""
+    buffer = np.frombuffer(data, np.uint8)
+    size = len(data)
+    if size >= settings.FACE_DECODE_REDUCE_4_BYTES:
+        flag = cv2.IMREAD_REDUCED_GRAYSCALE_4
+    elif size >= settings.FACE_DECODE_REDUCE_2_BYTES:
+        flag = cv2.IMREAD_REDUCED_GRAYSCALE_2
+    else:
+        flag = cv2.IMREAD_GRAYSCALE
+
+    image = cv2.imdecode(buffer, flag)
+    if image is not None and flag != cv2.IMREAD_GRAYSCALE and min(image.shape) < settings.FACE_MIN_DECODE_SIDE:
+        # File nặng nhưng kích thước ảnh nhỏ (ví dụ PNG ít nén): giải mã lại ở độ phân giải gốc
+        image = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    return image
+
+
+def detect_largest_face(image):
+    """Phát hiện khuôn mặt trên bản thu nhỏ, trả về (x, y, w, h) của khuôn mặt lớn nhất theo tọa độ ảnh gốc."""
+    height, width = image.shape[:2]
+    scale = min(1.0, settings.FACE_DETECT_MAX_SIDE / max(height, width))
+    small = image if scale == 1.0 else cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    faces = get_face_detector().detectMultiScale(small, scaleFactor=1.1, minNeighbors=4)
+    logger.debug(f"Số khuôn mặt phát hiện: {len(faces)} (ảnh dò {small.shape}, gốc {image.shape})")
+    if len(faces) == 0:
+        return None
+
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    x, y = int(x / scale), int(y / scale)
+    w, h = int(round(w / scale)), int(round(h / scale))
+    return x, y, min(w, width - x), min(h, height - y)
+
+
+def extract_face(image):
+    """Cắt khuôn mặt lớn nhất về IMG_SIZE x IMG_SIZE, chuẩn hóa về [0, 1], shape (48, 48, 1).
+
+    Trả về None nếu không có khuôn mặt nào.
+    """
+    box = detect_largest_face(image)
+    if box is None:
+        return None
+    x, y, w, h = box
+    face = cv2.resize(image[y:y + h, x:x + w], (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)
+    face = face.astype(np.float32) / 255.0
+    return np.expand_dims(face, axis=-1)
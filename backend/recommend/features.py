@@ -0,0 +1,186 @@
+import re
+import zlib
+
+import numpy as np
+
+# Trọng số của từng nhóm đặc trưng trong vector bài hát
+BPM_WEIGHT = 1.0
+GENRE_WEIGHT = 1.0
+ARTIST_WEIGHT = 0.5
+EMOTION_WEIGHT = 1.0
+# Nghệ sĩ được băm vào số chiều cố định để ma trận không phình theo số nghệ sĩ
+ARTIST_BUCKETS = 64
+
+_SPLIT = re.compile(r'\s*[,;/&|]\s*')
+_TAG_SPLIT = re.compile(r'\s*[,;/|]\s*')
+_WORD = re.compile(r'\w+')
+_FEATURING = re.compile(r'\s+(?:ft\.?|feat\.?|featuring|x)\s+', re.IGNORECASE)
+
+
+def split_values(value):
+    if isinstance(value, (list, tuple)):
+        parts = [str(v) for v in value]
+    else:
+        parts = _SPLIT.split(str(value or ''))
+    return [p.strip().lower() for p in parts if p and p.strip()]
+
+
+def artist_names(value):
+    """Tên nghệ sĩ viết thường trong trường artist: cả chuỗi rồi từng người ("Đen ft. MIN" -> "đen ft. min", "đen", "min")."""
+    full = ' '.join(str(value or '').lower().split())
+    names = [full] if full else []
+    for part in split_values(value):
+        names.extend(name for name in _FEATURING.split(part) if name)
+    return list(dict.fromkeys(' '.join(name.split()) for name in names))
+
+
+def normalize_genre(value):
+    return ' '.join(str(value or '').lower().split())
+
+
+def genre_tags(genre):
+    """Tag thể loại viết thường của một bài hát, lưu vào songs.genreTags.
+
+    Gồm từng giá trị đầy đủ ("pop ballad", "r&b") và mọi cụm từ liên tiếp trong đó
+    ("pop", "ballad"), để truy vấn $in chính xác khớp giống regex theo từ trước đây.
+    """
+    values = genre if isinstance(genre, (list, tuple)) else _TAG_SPLIT.split(str(genre or ''))
+    tags = set()
+    for value in values:
+        value = normalize_genre(value)
+        if not value:
+            continue
+        tags.add(value)
+        words = _WORD.findall(value)
+        for start in range(len(words)):
+            for end in range(start + 1, len(words) + 1):
+                tags.add(' '.join(words[start:end]))
+    return sorted(tags)
+
+
+def artist_bucket(name):
+    # crc32 ổn định giữa các process (hash() của Python bị ngẫu nhiên hóa)
+    return zlib.crc32(name.encode('utf-8')) % ARTIST_BUCKETS
+
+
+def top_k_indices(scores, top_k):
+    """Chỉ số của top_k điểm cao nhất, giảm dần, dùng argpartition thay vì sắp xếp toàn bộ."""
+    n = len(scores)
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if top_k < n:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class FeatureEncoder:
+    """Mã hóa bài hát thành vector float32 (bpm chuẩn hóa, genre one-hot, nghệ sĩ băm, cảm xúc one-hot).
+
+    Thống kê (khoảng bpm, danh sách genre) được cố định khi tạo encoder, nên có thể
+    mã hóa catalog theo từng batch mà vẫn cho cùng một không gian đặc trưng.
+    """
+
+    def __init__(self, genres, bpm_range, emotions):
+        self.genre_index = {genre: i for i, genre in enumerate(sorted(genres))}
+        self.bpm_range = bpm_range
+        self.emotions = list(emotions)
+        self.dimensions = 1 + len(self.genre_index) + ARTIST_BUCKETS + len(self.emotions)
+
+    @classmethod
+    def fit(cls, songs, emotions):
+        stats = EncoderStats()
+        stats.update(songs)
+        return stats.encoder(emotions)
+
+    def encode(self, songs):
+        n = len(songs)
+        genre_offset = 1
+        artist_offset = genre_offset + len(self.genre_index)
+        emotion_offset = artist_offset + ARTIST_BUCKETS
+        matrix = np.zeros((n, self.dimensions), dtype=np.float32)
+
+        if self.bpm_range is not None:
+            low, high = self.bpm_range
+            bpm = np.array([song.get('bpm') for song in songs], dtype=np.float64)
+            bpm = (bpm - low) / (high - low) if high > low else np.full(n, 0.5)
+            matrix[:, 0] = BPM_WEIGHT * np.nan_to_num(bpm, nan=0.5)
+
+        for i, song in enumerate(songs):
+            genres = [self.genre_index[g] for g in split_values(song.get('genre')) if g in self.genre_index]
+            if genres:
+                matrix[i, [genre_offset + g for g in genres]] = GENRE_WEIGHT / np.sqrt(len(genres))
+            artists = split_values(song.get('artist'))
+            if artists:
+                matrix[i, [artist_offset + artist_bucket(a) for a in artists]] = ARTIST_WEIGHT / np.sqrt(len(artists))
+            if song.get('emotion') in self.emotions:
+                matrix[i, emotion_offset + self.emotions.index(song['emotion'])] = EMOTION_WEIGHT
+
+        return normalize_rows(matrix)
+
+
+class EncoderStats:
+    # Gom thống kê cho FeatureEncoder qua nhiều batch (bộ nhớ O(số genre))
+    def __init__(self):
+        self.genres = set()
+        self.bpm_low = None
+        self.bpm_high = None
+
+    def update(self, songs):
+        for song in songs:
+            self.genres.update(split_values(song.get('genre')))
+            bpm = song.get('bpm')
+            if bpm is None or bpm != bpm:
+                continue
+            self.bpm_low = bpm if self.bpm_low is None else min(self.bpm_low, bpm)
+            self.bpm_high = bpm if self.bpm_high is None else max(self.bpm_high, bpm)
+
+    def encoder(self, emotions):
+        bpm_range = (self.bpm_low, self.bpm_high) if self.bpm_low is not None else None
+        return FeatureEncoder(self.genres, bpm_range, emotions)
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class FeatureRecommender:
+    """Ma trận đặc trưng của cả catalog và một vector profile cho mỗi cảm xúc.
+
+    Profile là trọng tâm các bài thuộc cảm xúc đó; gợi ý là một phép nhân ma trận-vector
+    rồi chọn top_k bằng argpartition, chi phí O(N·d) mỗi lần gọi.
+    """
+
+    def __init__(self, songs, emotions):
+        self.emotions = list(emotions)
+        self.encoder = FeatureEncoder.fit(songs, self.emotions)
+        self.matrix = self.encoder.encode(songs)
+
+        emotion_of = np.array([song['emotion'] for song in songs], dtype=object)
+        self.rows = {e: np.flatnonzero(emotion_of == e) for e in self.emotions}
+        self.profiles = {e: self._profile(rows) for e, rows in self.rows.items()}
+        self.all_rows = np.arange(len(songs))
+        self.default_profile = self._profile(self.all_rows)
+
+    def _profile(self, rows):
+        if not len(rows):
+            return None
+        return normalize_rows(self.matrix[rows].mean(axis=0))
+
+    def recommend(self, emotion, top_k, seed=None):
+        """Chỉ số (theo thứ tự songs) của top_k bài hợp với cảm xúc, tùy chọn kéo về phía bài seed."""
+        rows = self.rows.get(emotion)
+        profile = self.profiles.get(emotion)
+        if rows is None or not len(rows):
+            rows, profile = self.all_rows, self.default_profile
+        if profile is None:
+            return np.empty(0, dtype=np.intp)
+        if seed is not None:
+            profile = profile + self.matrix[seed]
+            rows = rows[rows != seed]
+
+        scores = self.matrix @ profile
+        return rows[top_k_indices(scores[rows], top_k)]
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+LOGIN_EVENTS = 'loginevents'
+
+# Index cần có cho các truy vấn trong views.py, tạo bởi manage.py ensure_indexes
+INDEXES = {
+    # Mỗi người dùng có đúng một document lịch sử/playlist (views upsert theo userId)
+    'historysongs': [IndexModel([('userId', ASCENDING)], unique=True)],
+    'historylists': [IndexModel([('userId', ASCENDING)], unique=True)],
+    # loginevents: index do ensure_login_events tạo, tùy loại collection
+    'myplaylist': [IndexModel([('userId', ASCENDING)], unique=True)],
+    'songs': [
+        IndexModel([('emotion', ASCENDING)]),
+        IndexModel([('genreTags', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('artistIds', ASCENDING), ('_id', ASCENDING)]),
+        # Đổi bài hát client gửi (theo đường dẫn) thành tham chiếu songId, xem songrefs.py
+        IndexModel([('file_path', ASCENDING)]),
+        # Phiên bản songs (catalog.SongsVersion) và polling của CatalogRefresher
+        IndexModel([('updatedAt', ASCENDING)]),
+    ],
+    'albums': [IndexModel([('artistId', ASCENDING), ('_id', ASCENDING)])],
+    # Dữ liệu cũ có thể trùng tên nghệ sĩ nên không đặt unique
+    'artists': [IndexModel([('artist', ASCENDING)])],
+}
+
+_USER_ID = '000000000000000000000000'
+_OBJECT_ID = ObjectId(_USER_ID)
+
+# (tên, collection, filter, sort) đúng như views gửi lên; không cái nào được phép COLLSCAN.
+QUERY_SHAPES = [
+    ('historysongs theo userId', 'historysongs', {'userId': _USER_ID}, None),
+    ('historylists theo userId', 'historylists', {'userId': _USER_ID}, None),
+    ('get_login_history', LOGIN_EVENTS, {'userId': _USER_ID}, [('timestamp', DESCENDING), ('_id', DESCENDING)]),
+    ('get_login_history (cursor)', LOGIN_EVENTS, {'$and': [
+        {'userId': _USER_ID},
+        {'timestamp': {'$lte': datetime(2000, 1, 1)}},
+        {'$or': [{'timestamp': {'$lt': datetime(2000, 1, 1)}}, {'_id': {'$lt': _OBJECT_ID}}]}
+    ]}, [('timestamp', DESCENDING), ('_id', DESCENDING)]),
+    ('myplaylist theo userId', 'myplaylist', {'userId': _USER_ID}, None),
+    ('songs_by_genre', 'songs', {'genreTags': {'$in': ['pop', 'rap']}}, [('_id', ASCENDING)]),
+    ('songs_by_genre (cursor)', 'songs', {'genreTags': {'$in': ['pop', 'rap']}, '_id': {'$gt': _OBJECT_ID}}, [('_id', ASCENDING)]),
+    ('songs_by_artist', 'songs', {'artistIds': _OBJECT_ID}, [('_id', ASCENDING)]),
+    ('songs theo đường dẫn', 'songs', {'file_path': {'$in': ['/audio/a.mp3', 'audio/a.mp3']}}, None),
+    ('get_artist_albums', 'albums', {'artistId': _OBJECT_ID}, [('_id', ASCENDING)]),
+    ('artists theo tên', 'artists', {'artist': 'Unknown Artist'}, None),
+    ('artists theo _id', 'artists', {'_id': _OBJECT_ID}, None),
+    ('phiên bản songs', 'songs', {}, [('updatedAt', DESCENDING)]),
+    ('playlist tính sẵn', 'recommendations', {'_id': {'$in': ['emotion:happy', f'user:{_USER_ID}:happy']}, 'catalogVersion': '0:'}, None),
+    ('đăng nhập theo username', 'recommend_userprofile', {'username': 'user'}, None),
+    ('kiểm tra email trùng', 'recommend_userprofile', {'email': 'user@example.com', '_id': {'$ne': _OBJECT_ID}}, None),
+]
+
+
+def ensure_login_events(db, ttl_days, timeseries=False):
+    """Tạo collection loginevents nếu chưa có, kèm chính sách hết hạn sau ``ttl_days`` ngày.
+
+    Mặc định là collection thường với index TTL trên timestamp và index {userId, timestamp, _id}
+    phục vụ cursor (timestamp, _id) của get_login_history mà không cần SORT. ``timeseries=True``
+    tạo collection time-series (MongoDB >= 5.0, metaField là userId) nếu server hỗ trợ; collection
+    đã có thì giữ nguyên loại. Trả về mô tả để in ra log.
+    """
+    expire = ttl_days * 24 * 3600
+    if LOGIN_EVENTS not in db.list_collection_names():
+        if timeseries:
+            try:
+                db.create_collection(
+                    LOGIN_EVENTS,
+                    timeseries={'timeField': 'timestamp', 'metaField': 'userId', 'granularity': 'hours'},
+                    expireAfterSeconds=expire
+                )
+            except CollectionInvalid:
+                pass  # process khác vừa tạo
+            except OperationFailure:
+                pass  # server không hỗ trợ time-series
+        else:
+            try:
+                db.create_collection(LOGIN_EVENTS)
+            except CollectionInvalid:
+                pass
+
+    options = db[LOGIN_EVENTS].options()
+    if 'timeseries' in options:
+        if options.get('expireAfterSeconds') != expire:
+            db.command('collMod', LOGIN_EVENTS, expireAfterSeconds=expire)
+        # Index phụ của time-series chỉ gồm metaField/timeField; sắp xếp theo _id diễn ra trong bucket của một người dùng
+        db[LOGIN_EVENTS].create_index([('userId', ASCENDING), ('timestamp', DESCENDING)])
+        return f'time-series, hết hạn sau {ttl_days} ngày'
+
+    db[LOGIN_EVENTS].create_index([('userId', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+
+    ttl_index = next(
+        (index for index in db[LOGIN_EVENTS].list_indexes() if dict(index['key']) == {'timestamp': 1}),
+        None
+    )
+    if ttl_index is None:
+        db[LOGIN_EVENTS].create_index([('timestamp', ASCENDING)], expireAfterSeconds=expire)
+    elif ttl_index.get('expireAfterSeconds') != expire:
+        db.command('collMod', LOGIN_EVENTS, index={'keyPattern': {'timestamp': 1}, 'expireAfterSeconds': expire})
+    return f'collection thường + index TTL, hết hạn sau {ttl_days} ngày'
+
+
+def plan_stages(plan):
+    """Tên mọi stage trong một winningPlan (kể cả các nhánh con của OR/SORT_MERGE)."""
+    stages = [plan.get('stage')]
+    if 'inputStage' in plan:
+        stages.extend(plan_stages(plan['inputStage']))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    # MongoDB >= 7 với slot-based engine lồng plan trong queryPlan
+    if 'queryPlan' in plan:
+        stages.extend(plan_stages(plan['queryPlan']))
+    return [stage for stage in stages if stage]
+
+
+def query_planner(explain):
+    # Collection time-series trả explain dạng aggregate: queryPlanner nằm trong stage $cursor đầu tiên
+    if 'queryPlanner' in explain:
+        return explain['queryPlanner']
+    for stage in explain.get('stages', []):
+        if '$cursor' in stage:
+            return stage['$cursor']['queryPlanner']
+    raise ValueError(f"explain() không có queryPlanner: {sorted(explain)}")
+
+
+def winning_stages(db, collection, query, sort=None):
+    cursor = db[collection].find(query).limit(1)
+    if sort:
+        cursor = cursor.sort(sort)
+    return plan_stages(query_planner(cursor.explain())['winningPlan'])
@@ -0,0 +1,159 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def configure_tf_threads(tf):
+    # Giới hạn số luồng TensorFlow cho mỗi worker để các worker gunicorn không tranh nhau CPU.
+    # Phải gọi trước khi TensorFlow chạy op đầu tiên (trước khi load model).
+    intra = settings.TF_INTRA_OP_THREADS
+    inter = settings.TF_INTER_OP_THREADS
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+        logger.debug(f"TensorFlow threads: intra_op={intra}, inter_op={inter}")
+    except RuntimeError as e:
+        # TensorFlow đã khởi tạo runtime, không đổi được số luồng nữa
+        logger.warning(f"Không thể cấu hình số luồng TensorFlow: {e}")
+
+
+class InferenceBusy(Exception):
+    """Hàng đợi suy luận đầy hoặc batch không xong trong thời hạn: view trả 503 thay vì 500."""
+
+
+class InferenceEngine:
+    """Gom các khuôn mặt 48x48 từ nhiều request đồng thời thành batch nhỏ rồi chạy backend một lần.
+
+    Mỗi process có một luồng worker riêng; request chỉ chờ tối đa ``max_wait_ms``
+    để batch được lấp đầy trước khi model chạy.
+    """
+
+    def __init__(self, backend, max_batch_size=16, max_wait_ms=5.0, max_queue_size=256):
+        self.backend = backend
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Luồng worker không sống sót qua fork của gunicorn, nên khởi động lại theo pid
+        pid = os.getpid()
+        if self._pid == pid and self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._worker is not None and self._worker.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = pid
+            self._worker = threading.Thread(target=self._run, name='emotion-inference', daemon=True)
+            self._worker.start()
+            logger.debug(f"Khởi động inference worker (pid={pid}, batch={self.max_batch_size}, wait={self.max_wait * 1000:.1f}ms)")
+
+    def predict(self, face, timeout=None):
+        """Dự đoán cho một khuôn mặt shape (48, 48, 1), trả về vector xác suất 1 chiều.
+
+        Ném InferenceBusy nếu chưa có kết quả sau ``timeout`` giây, tính cả thời gian chờ chỗ trong hàng đợi.
+        """
+        self._ensure_worker()
+        future = Future()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put((np.asarray(face, dtype=np.float32), future), timeout=timeout)
+        except queue.Full:
+            raise InferenceBusy()
+        try:
+            return future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # Request đã bỏ cuộc: hủy để worker không dành chỗ trong batch cho nó
+            future.cancel()
+            raise InferenceBusy()
+
+    def _run(self):
+        q = self._queue
+        while True:
+            item = q.get()
+            if item[1].done():
+                continue  # đã bị hủy khi còn trong hàng đợi
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if not item[1].done():
+                    batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        batch = [(face, future) for face, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        futures = [future for _, future in batch]
+        try:
+            # Lỗi ở đây (ảnh sai shape, backend hỏng) phải tới được mọi request trong batch thay vì để chúng chờ tới timeout
+            predictions = self.backend.predict_batch(np.stack([face for face, _ in batch]))
+        except Exception as e:
+            logger.error(f"Lỗi khi chạy batch inference ({len(futures)} ảnh): {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        logger.debug(f"Đã dự đoán batch {len(futures)} ảnh")
+        for i, future in enumerate(futures):
+            future.set_result(predictions[i])
+
+
+_engine = None
+_engine_failed = False
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Trả về InferenceEngine của process, backend (TensorFlow) chỉ được tải ở lần gọi đầu tiên.
+
+    Trả về None nếu suy luận bị tắt (EMOTION_INFERENCE_ENABLED=False) hoặc model không tải được.
+    """
+    global _engine, _engine_failed
+    if _engine is not None or _engine_failed or not settings.EMOTION_INFERENCE_ENABLED:
+        return _engine
+    with _engine_lock:
+        if _engine is None and not _engine_failed:
+            from . import backends
+            try:
+                backend = backends.load_backend()
+                logger.debug(f"Backend suy luận: {backend.name}")
+            except Exception as e:
+                logger.error(f"Lỗi tải mô hình: {e}")
+                _engine_failed = True
+                return None
+            _engine = InferenceEngine(
+                backend,
+                max_batch_size=settings.EMOTION_BATCH_SIZE,
+                max_wait_ms=settings.EMOTION_BATCH_WAIT_MS,
+                max_queue_size=settings.EMOTION_QUEUE_SIZE
+            )
+    return _engine
+
+
+def warmup():
+    # Tải trước model, OpenCV và face detector để request đầu tiên không phải chờ
+    start = time.monotonic()
+    from . import face
+    face.get_face_detector()
+    engine = get_engine()
+    logger.info(f"Warm-up suy luận xong sau {time.monotonic() - start:.2f}s (engine: {'ok' if engine else 'không có'})")
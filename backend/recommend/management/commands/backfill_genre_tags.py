@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from pymongo import ASCENDING, UpdateOne
+
+from recommend.features import genre_tags
+from recommend.mongo_utils import batches
+
+
+class Command(BaseCommand):
+    help = "Ghi songs.genreTags (tag thể loại viết thường) cho songs_by_genre và tạo multikey index {genreTags: 1, _id: 1}"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Tính lại cho mọi bài hát (mặc định chỉ bài chưa có genreTags)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from recommend.views import songs_collection
+
+        query = {} if options['all'] else {'genreTags': {'$exists': False}}
+        cursor = songs_collection.find(query, {'genre': 1, 'genreTags': 1}).batch_size(options['batch_size'])
+        scanned = updated = 0
+        for docs in batches(cursor, options['batch_size']):
+            requests = []
+            for doc in docs:
+                tags = genre_tags(doc.get('genre'))
+                if doc.get('genreTags') != tags:
+                    requests.append(UpdateOne({'_id': doc['_id']}, {'$set': {'genreTags': tags}}))
+            if requests:
+                updated += songs_collection.bulk_write(requests, ordered=False).modified_count
+            scanned += len(docs)
+            self.stdout.write(f"Đã xử lý {scanned} bài hát, cập nhật {updated}")
+
+        name = songs_collection.create_index([('genreTags', ASCENDING), ('_id', ASCENDING)])
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: cập nhật {updated}/{scanned} bài hát, index {name}"))
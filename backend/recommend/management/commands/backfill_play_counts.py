@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Tính collection playcounts (lượt nghe theo file_path cho gợi ý tìm kiếm) từ lịch sử nghe trong historysongs"
+
+    def handle(self, *args, **options):
+        from recommend.views import historysongs_collection, playcounts_collection
+
+        # Một lượt $unwind trên server, ghi thẳng vào playcounts; chạy một lần khi triển khai,
+        # sau đó add_historysong tăng lượt nghe từng bài (suggest.count_play)
+        historysongs_collection.aggregate([
+            {'$project': {'songs.file_path': 1}},
+            {'$unwind': '$songs'},
+            {'$group': {'_id': {'$ltrim': {'input': '$songs.file_path', 'chars': '/'}}, 'count': {'$sum': 1}}},
+            {'$match': {'_id': {'$nin': [None, '']}}},
+            {'$merge': {'into': playcounts_collection.name, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+        ], allowDiskUse=True)
+        total = playcounts_collection.estimated_document_count()
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: playcounts có {total} bài hát"))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from pymongo import ASCENDING, UpdateOne
+
+from recommend.features import artist_names
+from recommend.mongo_utils import batches
+
+
+class Command(BaseCommand):
+    help = "Liên kết songs với artists._id qua mảng songs.artistIds (khớp theo tên) và tạo index {artistIds: 1, _id: 1}"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Liên kết lại mọi bài hát (mặc định chỉ bài chưa có artistIds)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from recommend.views import artists_collection, songs_collection
+
+        artist_ids = {}
+        for artist in artists_collection.find({}, {'artist': 1}):
+            for name in artist_names(artist.get('artist'))[:1]:
+                artist_ids.setdefault(name, artist['_id'])
+        self.stdout.write(f"Đã tải {len(artist_ids)} nghệ sĩ")
+
+        query = {} if options['all'] else {'artistIds': {'$exists': False}}
+        cursor = songs_collection.find(query, {'artist': 1, 'artistIds': 1}).batch_size(options['batch_size'])
+        scanned = updated = unmatched = 0
+        for docs in batches(cursor, options['batch_size']):
+            requests = []
+            for doc in docs:
+                ids = list(dict.fromkeys(
+                    artist_ids[name] for name in artist_names(doc.get('artist')) if name in artist_ids
+                ))
+                if not ids:
+                    unmatched += 1
+                    if 'artistIds' not in doc:
+                        continue  # để lần chạy sau thử lại khi nghệ sĩ được tạo
+                if doc.get('artistIds') != ids:
+                    requests.append(UpdateOne({'_id': doc['_id']}, {'$set': {'artistIds': ids}}))
+            if requests:
+                updated += songs_collection.bulk_write(requests, ordered=False).modified_count
+            scanned += len(docs)
+            self.stdout.write(f"Đã xử lý {scanned} bài hát, cập nhật {updated}")
+
+        name = songs_collection.create_index([('artistIds', ASCENDING), ('_id', ASCENDING)])
+        if unmatched:
+            self.stdout.write(self.style.WARNING(
+                f"{unmatched} bài hát không khớp nghệ sĩ nào; songs_by_artist không trả về các bài này"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: cập nhật {updated}/{scanned} bài hát, index {name}"))
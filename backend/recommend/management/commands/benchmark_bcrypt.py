@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recommend.passwords import PasswordHasher
+
+
+class Command(BaseCommand):
+    help = "Đo số lần đăng nhập/giây (bcrypt checkpw qua pool băm mật khẩu) ở từng cost để chọn BCRYPT_ROUNDS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+        parser.add_argument('--workers', type=int, default=settings.PASSWORD_HASH_WORKERS, help="Kích thước pool băm mật khẩu")
+        parser.add_argument('--concurrency', type=int, default=16, help="Số request đăng nhập gửi cùng lúc")
+        parser.add_argument('--logins', type=int, default=64, help="Số lần đăng nhập ở mỗi cost")
+
+    def handle(self, *args, **options):
+        workers, concurrency = options['workers'], options['concurrency']
+        self.stdout.write(f"pool {workers} luồng, {concurrency} request song song, {options['logins']} lần đăng nhập mỗi cost")
+        for rounds in options['rounds']:
+            hasher = PasswordHasher(rounds, workers, max_queue=concurrency, timeout=None)
+            hashed = hasher.hash('benchmark-password')
+            latencies = []
+            lock = threading.Lock()
+
+            def login(_):
+                start = time.perf_counter()
+                hasher.check('benchmark-password', hashed)
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as clients:
+                list(clients.map(login, range(options['logins'])))
+            elapsed = time.perf_counter() - start
+            p50, p99 = np.percentile(latencies, [50, 99])
+            self.stdout.write(
+                f"cost {rounds:>2}: {options['logins'] / elapsed:8.1f} lần/giây  p50={p50:.0f}ms p99={p99:.0f}ms"
+                f"{'  (BCRYPT_ROUNDS hiện tại)' if rounds == settings.BCRYPT_ROUNDS else ''}"
+            )
@@ -0,0 +1,73 @@
+import random
+import re
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+
+def typing_prefixes(titles, min_length=1):
+    # Mô phỏng người dùng gõ từng ký tự: "la", "lan", "lang", ...
+    for title in titles:
+        for end in range(min_length, len(title) + 1):
+            yield title[:end]
+
+
+class Command(BaseCommand):
+    help = "So sánh latency của /api/suggest với /api/search (và tùy chọn truy vấn $regex cũ) khi gõ từng ký tự"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=50, help="Số tên bài hát ngẫu nhiên dùng để sinh tiền tố")
+        parser.add_argument('--queries', nargs='+', help="Dùng các chuỗi này thay vì tên bài hát ngẫu nhiên")
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--regex', action='store_true', help="Đo thêm cặp truy vấn $regex trên songs/artists (cách tìm kiếm cũ)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        from recommend import views
+
+        titles = options['queries']
+        if not titles:
+            songs = [song for song in views.song_catalog.songs() if song.get('title')]
+            random.Random(options['seed']).shuffle(songs)
+            titles = [song['title'] for song in songs[:options['titles']]]
+        prefixes = list(typing_prefixes(titles))
+        self.stdout.write(f"{len(prefixes)} tiền tố từ {len(titles)} tên x {options['runs']} lần")
+
+        # Dựng index trước để không tính thời gian tải vào latency
+        views.suggester.index()
+        factory = APIRequestFactory()
+
+        def call(view, path):
+            return lambda prefix: view(factory.get(path, {'query': prefix}))
+
+        targets = [('search', call(views.search, '/api/search')), ('suggest', call(views.suggest_view, '/api/suggest'))]
+        if options['regex']:
+            targets.append(('regex (cũ)', lambda prefix: self.regex_search(views, prefix)))
+
+        results = {}
+        for name, target in targets:
+            target(prefixes[0])  # warm-up
+            latencies = []
+            for _ in range(options['runs']):
+                for prefix in prefixes:
+                    start = time.perf_counter()
+                    target(prefix)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            results[name] = np.percentile(latencies, [50, 99])
+            p50, p99 = results[name]
+            self.stdout.write(f"{name:<12} p50={p50:.3f}ms p99={p99:.3f}ms")
+
+        speedup = results['search'][0] / max(results['suggest'][0], 1e-9)
+        self.stdout.write(self.style.SUCCESS(f"suggest nhanh hơn search {speedup:.1f} lần (p50)"))
+
+    def regex_search(self, views, prefix):
+        pattern = re.escape(prefix)
+        list(views.songs_collection.find({
+            '$or': [
+                {'title': {'$regex': pattern, '$options': 'i'}},
+                {'artist': {'$regex': pattern, '$options': 'i'}}
+            ]
+        }).limit(20))
+        list(views.artists_collection.find({'artist': {'$regex': pattern, '$options': 'i'}}).limit(10))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from recommend.indexes import INDEXES, LOGIN_EVENTS, QUERY_SHAPES, ensure_login_events, winning_stages
+
+
+class Command(BaseCommand):
+    help = "Tạo index cho các collection dùng trong views (idempotent) và kiểm tra bằng explain() rằng không truy vấn nào COLLSCAN"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-only', action='store_true', help="Không tạo index, chỉ kiểm tra query plan")
+        parser.add_argument('--skip-explain', action='store_true', help="Chỉ tạo index, không kiểm tra query plan")
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        from mongoengine import get_db
+        from recommend.views import UserProfile
+
+        db = get_db('default')
+        if not options['check_only']:
+            # Tạo trước create_indexes, vì create_indexes sẽ tạo loginevents thành collection thường
+            policy = ensure_login_events(db, settings.LOGIN_HISTORY_TTL_DAYS, settings.LOGIN_EVENTS_TIMESERIES)
+            self.stdout.write(f"{LOGIN_EVENTS}: {policy}")
+            for collection, models in INDEXES.items():
+                try:
+                    names = db[collection].create_indexes(models)
+                except OperationFailure as e:
+                    # Trùng userId với index unique, hoặc index cùng khóa nhưng khác tùy chọn đã tồn tại
+                    raise CommandError(f"Không tạo được index cho {collection}: {e}")
+                self.stdout.write(f"{collection}: {', '.join(names)}")
+            # Index unique username/email khai báo trong UserProfile.meta của mongoengine
+            UserProfile.ensure_indexes()
+            self.stdout.write("recommend_userprofile: index của UserProfile")
+
+        if options['skip_explain']:
+            return
+
+        failures = []
+        for name, collection, query, sort in QUERY_SHAPES:
+            stages = winning_stages(db, collection, query, sort)
+            ok = 'COLLSCAN' not in stages
+            if not ok:
+                failures.append(name)
+            line = f"{'OK ' if ok else 'LỖI'} {name:<28} {collection}: {' <- '.join(stages)}"
+            self.stdout.write(line if ok else self.style.ERROR(line))
+
+        if failures:
+            raise CommandError(f"{len(failures)} truy vấn sẽ quét toàn bộ collection (COLLSCAN): {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f"Tất cả {len(QUERY_SHAPES)} truy vấn đều dùng index"))
@@ -0,0 +1,122 @@
+import os
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recommend import backends
+from recommend.face import IMG_SIZE
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_face_images(directory, limit=None):
+    # Thư mục ảnh khuôn mặt đã cắt sẵn (kiểu FER2013), đọc đệ quy, đưa về (N, 48, 48, 1) float32
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    images = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        image = cv2.resize(image, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)
+        images.append(image.astype(np.float32)[..., None] / 255.0)
+    if not images:
+        raise CommandError(f"Không có ảnh hợp lệ trong {directory}")
+    return np.stack(images)
+
+
+class Command(BaseCommand):
+    help = "Chuyển model/emotion_model.keras sang TFLite (float16, int8) và benchmark trên CPU so với Keras"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variants', nargs='+', choices=backends.TFLITE_VARIANTS, default=list(backends.TFLITE_VARIANTS))
+        parser.add_argument('--calibration-dir', help="Ảnh khuôn mặt dùng làm representative dataset cho int8")
+        parser.add_argument('--calibration-size', type=int, default=200)
+        parser.add_argument('--benchmark-dir', help="Tập ảnh held-out để đo latency và độ khớp top-1 với Keras")
+        parser.add_argument('--runs', type=int, default=1, help="Số lần lặp qua tập benchmark")
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.EMOTION_BATCH_SIZE,
+            help="Đo thêm latency mỗi batch với kích thước này (0 = chỉ đo batch 1)"
+        )
+        parser.add_argument('--skip-export', action='store_true', help="Chỉ benchmark các file .tflite đã có")
+
+    def handle(self, *args, **options):
+        keras_backend = backends.KerasBackend()
+
+        if not options['skip_export']:
+            for variant in options['variants']:
+                self.export(keras_backend.model, variant, options)
+
+        if options['benchmark_dir']:
+            images = load_face_images(options['benchmark_dir'])
+            self.stdout.write(f"Benchmark trên {len(images)} ảnh x {options['runs']} lần, batch 1, CPU")
+            reference, stats = self.benchmark(keras_backend, images, options['runs'])
+            self.report(keras_backend.name, stats, None)
+            for variant in options['variants']:
+                # Tensor TFLite cấp phát đúng 1 hàng: không tính thêm hàng đệm mà Keras không phải chạy
+                backend = backends.TFLiteBackend(variant, max_batch_size=1)
+                predictions, stats = self.benchmark(backend, images, options['runs'])
+                agreement = float(np.mean(predictions.argmax(axis=1) == reference.argmax(axis=1)))
+                self.report(backend.name, stats, agreement)
+
+            batch_size = options['batch_size']
+            if batch_size > 1:
+                if len(images) < batch_size:
+                    raise CommandError(f"Cần ít nhất {batch_size} ảnh để đo batch {batch_size}")
+                self.stdout.write(f"Benchmark batch {batch_size} (latency mỗi batch), CPU")
+                _, stats = self.benchmark(keras_backend, images, options['runs'], batch_size)
+                self.report(keras_backend.name, stats, None)
+                for variant in options['variants']:
+                    backend = backends.TFLiteBackend(variant, max_batch_size=batch_size)
+                    _, stats = self.benchmark(backend, images, options['runs'], batch_size)
+                    self.report(backend.name, stats, None)
+
+    def export(self, model, variant, options):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif options['calibration_dir']:
+            calibration = load_face_images(options['calibration_dir'], options['calibration_size'])
+            converter.representative_dataset = lambda: ([image[None]] for image in calibration)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        else:
+            self.stdout.write(self.style.WARNING(
+                "Không có --calibration-dir: int8 chỉ lượng tử hóa trọng số (dynamic range)"
+            ))
+
+        path = backends.tflite_model_path(variant)
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        self.stdout.write(self.style.SUCCESS(f"Đã xuất {variant}: {path} ({size_mb:.2f} MB)"))
+
+    def benchmark(self, backend, images, runs, batch_size=1):
+        # Chỉ các batch đủ ``batch_size`` ảnh, để mọi lần gọi cùng kích thước
+        batches = [images[i:i + batch_size] for i in range(0, len(images) - batch_size + 1, batch_size)]
+        backend.predict_batch(batches[0])  # warm-up
+        latencies = []
+        predictions = []
+        for run in range(runs):
+            for batch in batches:
+                start = time.perf_counter()
+                prediction = backend.predict_batch(batch)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if run == 0:
+                    predictions.extend(prediction)
+        return np.stack(predictions), np.percentile(latencies, [50, 99])
+
+    def report(self, name, stats, agreement):
+        p50, p99 = stats
+        line = f"{name:<16} p50={p50:.3f}ms p99={p99:.3f}ms"
+        if agreement is not None:
+            line += f" top1_agreement={agreement * 100:.2f}%"
+        self.stdout.write(line)
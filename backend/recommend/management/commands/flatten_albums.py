@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+
+from recommend import media
+
+
+class Command(BaseCommand):
+    help = "Làm phẳng albums và list thành một document cho mỗi album, chuẩn hóa đường dẫn ảnh/nhạc (cả của artists)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ in ra số document sẽ thay đổi")
+        parser.add_argument('--no-backup', action='store_true', help="Không chép document dạng cũ sang <collection>_legacy")
+
+    def handle(self, *args, **options):
+        from recommend import cache
+        from recommend.views import albums_collection, artists_collection, catalog_version, list_collection
+
+        self.dry_run = options['dry_run']
+        self.backup = not options['no_backup']
+        self.artists_collection = artists_collection
+        self.flatten(albums_collection, link_artists=True)
+        self.flatten(list_collection, link_artists=False)
+        self.normalize_artists()
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("--dry-run: không ghi gì vào MongoDB"))
+        else:
+            # Response album/nghệ sĩ đã cache ở các web worker hết hiệu lực
+            cache.bump(catalog_version)
+
+    def flatten(self, collection, link_artists):
+        now = datetime.now()
+        flattened = normalized = created = 0
+        for doc in collection.find():
+            if 'title' in doc:
+                # Đã phẳng: chỉ chuẩn hóa lại đường dẫn
+                album = media.normalize_album(doc)
+                if any(doc.get(field) != value for field, value in album.items()):
+                    normalized += 1
+                    if not self.dry_run:
+                        collection.update_one({'_id': doc['_id']}, {'$set': {**album, 'updatedAt': now}})
+                continue
+
+            entries = list(media.album_entries(doc))
+            if not entries:
+                self.stdout.write(self.style.WARNING(f"{collection.name} {doc['_id']}: không tìm thấy album nào, bỏ qua"))
+                continue
+            # Album đầu tiên giữ _id cũ để các tham chiếu sẵn có (artists.albums) vẫn đúng
+            new_docs = [
+                {
+                    '_id': doc['_id'] if i == 0 else ObjectId(),
+                    **media.normalize_album(entry),
+                    'createdAt': doc.get('createdAt', now),
+                    'updatedAt': now
+                } for i, entry in enumerate(entries)
+            ]
+            if link_artists:
+                self.link_artists(new_docs)
+            flattened += 1
+            created += len(new_docs) - 1
+            if self.dry_run:
+                continue
+            if self.backup:
+                collection.database[f'{collection.name}_legacy'].replace_one({'_id': doc['_id']}, doc, upsert=True)
+            collection.replace_one({'_id': doc['_id']}, new_docs[0])
+            if len(new_docs) > 1:
+                collection.insert_many(new_docs[1:])
+            if link_artists:
+                for new_doc in new_docs:
+                    if 'artistId' in new_doc:
+                        self.artists_collection.update_one(
+                            {'_id': new_doc['artistId']},
+                            {'$addToSet': {'albums': new_doc['_id']}, '$set': {'updatedAt': now}}
+                        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{collection.name}: làm phẳng {flattened} document (thêm {created} album), chuẩn hóa {normalized} album"
+        ))
+
+    def link_artists(self, docs):
+        for doc in docs:
+            artist = self.artists_collection.find_one({'artist': doc['artist']}, {'_id': 1})
+            if artist:
+                doc['artistId'] = artist['_id']
+                doc['songs'] = [{**song, 'artistId': artist['_id']} for song in doc['songs']]
+
+    def normalize_artists(self):
+        updated = 0
+        for artist in self.artists_collection.find({}, {'cover': 1, 'cover2': 1}):
+            covers = {field: media.cover_path(artist.get(field)) for field in ('cover', 'cover2')}
+            if any(artist.get(field) != value for field, value in covers.items()):
+                updated += 1
+                if not self.dry_run:
+                    self.artists_collection.update_one({'_id': artist['_id']}, {'$set': covers})
+        self.stdout.write(self.style.SUCCESS(f"artists: chuẩn hóa ảnh của {updated} nghệ sĩ"))
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def read_response(reader):
+    # Đủ cho response của Django: luôn có Content-Length (CommonMiddleware)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors['connect'] += 1
+        return
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            if status >= 400:
+                errors['http'] += 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        errors['reset'] += 1
+    finally:
+        writer.close()
+
+
+async def run_level(url, connections, duration):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = f'GET {path or "/"} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n'.encode()
+    latencies, errors = [], {'connect': 0, 'http': 0, 'reset': 0}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        client(parts.hostname, parts.port or 80, request, deadline, latencies, errors) for _ in range(connections)
+    ))
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = "Mở nhiều kết nối keep-alive đồng thời tới một hay nhiều server (vd. gunicorn gthread/WSGI và uvicorn/ASGI) và so sánh"
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', help="tên=url, vd. sync=http://127.0.0.1:8001/api/albums?limit=20")
+        parser.add_argument('--connections', type=int, nargs='+', default=[100, 500, 1000, 2000])
+        parser.add_argument('--duration', type=float, default=10, help="Số giây cho mỗi mức kết nối")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f"Sai định dạng '{target}', cần tên=http://host:port/đường-dẫn")
+            targets.append((name, url))
+
+        self.stdout.write(f"{'server':<10} {'kết nối':>8} {'req/s':>9} {'p50':>9} {'p99':>9}  lỗi (connect/http/reset)")
+        for connections in options['connections']:
+            for name, url in targets:
+                latencies, errors = asyncio.run(run_level(url, connections, options['duration']))
+                p50, p99 = np.percentile(latencies, [50, 99]) if latencies else (float('nan'), float('nan'))
+                line = (
+                    f"{name:<10} {connections:>8} {len(latencies) / options['duration']:>9.1f} "
+                    f"{p50:>7.1f}ms {p99:>7.1f}ms  {errors['connect']}/{errors['http']}/{errors['reset']}"
+                )
+                self.stdout.write(line if not any(errors.values()) else self.style.WARNING(line))
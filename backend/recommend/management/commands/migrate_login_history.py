@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recommend.indexes import LOGIN_EVENTS, ensure_login_events
+
+
+class Command(BaseCommand):
+    help = "Chuyển mảng logins trong loginhistory thành một document cho mỗi lần đăng nhập trong loginevents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ in ra số sự kiện sẽ chuyển")
+        parser.add_argument('--no-backup', action='store_true', help="Không chép document cũ sang loginhistory_legacy")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        from mongoengine import get_db
+
+        db = get_db('default')
+        source = db['loginhistory']
+        dry_run = options['dry_run']
+        if not dry_run:
+            # Phải tạo trước lần insert đầu tiên, nếu không loginevents sẽ là collection thường
+            policy = ensure_login_events(db, settings.LOGIN_HISTORY_TTL_DAYS, settings.LOGIN_EVENTS_TIMESERIES)
+            self.stdout.write(f"{LOGIN_EVENTS}: {policy}")
+
+        users = events = 0
+        # Mỗi document được xóa khỏi loginhistory ngay sau khi chuyển xong, nên chạy lại lệnh là an toàn
+        for doc in source.find():
+            logins = [
+                {
+                    'userId': doc['userId'],
+                    'username': doc.get('username'),
+                    'timestamp': login['timestamp'],
+                    'device': login.get('device', 'Unknown Device')
+                } for login in doc.get('logins', []) if login.get('timestamp')
+            ]
+            users += 1
+            events += len(logins)
+            if dry_run:
+                continue
+            for start in range(0, len(logins), options['batch_size']):
+                db[LOGIN_EVENTS].insert_many(logins[start:start + options['batch_size']], ordered=False)
+            if not options['no_backup']:
+                db['loginhistory_legacy'].replace_one({'_id': doc['_id']}, doc, upsert=True)
+            source.delete_one({'_id': doc['_id']})
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"--dry-run: sẽ chuyển {events} lần đăng nhập của {users} người dùng"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Đã chuyển {events} lần đăng nhập của {users} người dùng sang {LOGIN_EVENTS}"))
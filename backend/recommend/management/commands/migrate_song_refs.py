@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from recommend import media, songrefs
+from recommend.mongo_utils import batches
+
+# collection -> (đường dẫn tới mảng bài hát, khóa riêng của phần tử được giữ lại)
+TARGETS = {
+    'myplaylist': ('playlists', ('entryId',)),
+    'historylists': ('lists', ()),
+    'albums': (None, ('artistId',)),
+    'list': (None, ()),
+}
+
+
+class Command(BaseCommand):
+    help = "Thay bản sao bài hát trong myplaylist, historylists, albums và list bằng tham chiếu songId (khớp theo file_path/src)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ in ra số document/bài hát sẽ thay đổi")
+        parser.add_argument('--no-backup', action='store_true', help="Không chép document cũ sang <collection>_pre_songrefs")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--collections', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+
+    def handle(self, *args, **options):
+        from recommend import cache
+        from recommend.views import catalog_version, db, songs_collection
+
+        self.dry_run = options['dry_run']
+        self.backup = not options['no_backup']
+        self.batch_size = options['batch_size']
+
+        # Một lượt quét songs; đường dẫn được chuẩn hóa như media_path nên khớp cả dạng "public\\..."
+        self.ids_by_path = {}
+        for doc in songs_collection.find({}, {'file_path': 1}):
+            path = media.media_path(doc.get('file_path') or '')
+            if path:
+                self.ids_by_path.setdefault(path, doc['_id'])
+        self.stdout.write(f"Đã tải {len(self.ids_by_path)} đường dẫn bài hát")
+
+        for name in options['collections']:
+            self.migrate(db[name], *TARGETS[name])
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("--dry-run: không ghi gì vào MongoDB"))
+        elif {'albums', 'list'} & set(options['collections']):
+            # Response album đã cache ở các web worker hết hiệu lực
+            cache.bump(catalog_version)
+
+    def convert(self, songs, keep):
+        # (mảng mới, số bài vừa đổi sang songId, số bài vẫn là bản sao vì không khớp bài nào)
+        refs = songrefs.to_refs(songs, self.ids_by_path, keep)
+        converted = sum(1 for old, new in zip(songs, refs) if new is not old)
+        unmatched = sum(1 for new in refs if isinstance(new, dict) and 'songId' not in new)
+        return refs, converted, unmatched
+
+    def migrate(self, collection, field, keep):
+        scanned = updated = converted = unmatched = 0
+        projection = {field: 1} if field else {'songs': 1}
+        for docs in batches(collection.find({}, projection).batch_size(self.batch_size), self.batch_size):
+            requests, backups = [], []
+            for doc in docs:
+                if field:
+                    # Mảng danh sách (playlists/lists), mỗi phần tử có mảng songs riêng
+                    old = doc.get(field)
+                    if not isinstance(old, list):
+                        continue
+                    new, count, missing = [], 0, 0
+                    for item in old:
+                        if isinstance(item, dict) and isinstance(item.get('songs'), list):
+                            songs, n, m = self.convert(item['songs'], keep)
+                            item, count, missing = {**item, 'songs': songs}, count + n, missing + m
+                        new.append(item)
+                    path = field
+                else:
+                    old = doc.get('songs')
+                    if not isinstance(old, list):
+                        continue
+                    new, count, missing = self.convert(old, keep)
+                    path = 'songs'
+
+                unmatched += missing
+                if not count:
+                    continue
+                updated += 1
+                converted += count
+                # Chỉ ghi nếu mảng chưa bị request khác sửa kể từ lúc đọc; document bị bỏ qua được đổi ở lần chạy sau
+                requests.append(UpdateOne({'_id': doc['_id'], path: old}, {'$set': {path: new}}))
+                backups.append(doc)
+            scanned += len(docs)
+            if self.dry_run or not requests:
+                continue
+            if self.backup:
+                # Collection riêng: <collection>_legacy đã là bản sao trước flatten_albums
+                backup = collection.database[f'{collection.name}_pre_songrefs']
+                # Giữ bản sao đầu tiên nếu lệnh được chạy lại
+                backup.bulk_write([
+                    UpdateOne({'_id': doc['_id']}, {'$setOnInsert': {k: v for k, v in doc.items() if k != '_id'}}, upsert=True)
+                    for doc in backups
+                ], ordered=False)
+            collection.bulk_write(requests, ordered=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{collection.name}: {scanned} document, đổi {converted} bài hát sang songId trong {updated} document"
+        ))
+        if unmatched:
+            self.stdout.write(self.style.WARNING(
+                f"{collection.name}: {unmatched} bài hát không khớp file_path nào trong songs, vẫn lưu bản sao"
+            ))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from recommend import media
+from recommend.mongo_utils import batches
+
+
+def normalize_entry(entry):
+    # Một bài trong historysongs hoặc một danh sách trong historylists (cùng các bài bản sao bên trong)
+    if not isinstance(entry, dict):
+        return entry
+    entry = media.normalize_song(entry)
+    if 'cover' in entry:
+        entry['cover'] = media.cover_path(entry['cover'])
+    if isinstance(entry.get('songs'), list):
+        entry['songs'] = [media.normalize_song(song) if isinstance(song, dict) else song for song in entry['songs']]
+    return entry
+
+
+class Command(BaseCommand):
+    help = "Chuẩn hóa đường dẫn ảnh/nhạc đã lưu trong historysongs và historylists (\"public\\\\a.png\" -> \"/a.png\")"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ in ra số document sẽ thay đổi")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        from recommend.views import historylists_collection, historysongs_collection
+
+        for collection, field in ((historysongs_collection, 'songs'), (historylists_collection, 'lists')):
+            scanned = updated = 0
+            cursor = collection.find({}, {field: 1}).batch_size(options['batch_size'])
+            for docs in batches(cursor, options['batch_size']):
+                requests = []
+                for doc in docs:
+                    old = doc.get(field)
+                    if not isinstance(old, list):
+                        continue
+                    new = [normalize_entry(entry) for entry in old]
+                    if new != old:
+                        # Chỉ ghi nếu lịch sử chưa đổi kể từ lúc đọc; document bị bỏ qua được chuẩn hóa ở lần chạy sau
+                        requests.append(UpdateOne({'_id': doc['_id'], field: old}, {'$set': {field: new}}))
+                scanned += len(docs)
+                updated += len(requests)
+                if requests and not options['dry_run']:
+                    collection.bulk_write(requests, ordered=False)
+            self.stdout.write(self.style.SUCCESS(f"{collection.name}: {scanned} document, chuẩn hóa {updated} document"))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("--dry-run: không ghi gì vào MongoDB"))
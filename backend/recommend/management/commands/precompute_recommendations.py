@@ -0,0 +1,209 @@
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from pymongo import ReplaceOne
+
+from recommend import media, songrefs
+from recommend.catalog import PLAYLIST_FIELDS, SONG_FIELDS, SongsVersion, prepare_song
+from recommend.features import EncoderStats, normalize_rows, top_k_indices
+from recommend.mongo_utils import batches
+
+
+class TopK:
+    # Giữ top k (điểm, bài hát) khi duyệt catalog theo batch, bộ nhớ O(k)
+    def __init__(self, k):
+        self.k = k
+        self.scores = np.empty(0, dtype=np.float32)
+        self.songs = []
+
+    def push(self, scores, songs):
+        if not len(songs):
+            return
+        scores = np.concatenate([self.scores, scores])
+        songs = self.songs + songs
+        keep = top_k_indices(scores, self.k)
+        self.scores = scores[keep]
+        self.songs = [songs[i] for i in keep]
+
+
+class EncodedBatches:
+    """Các batch bài hát đã mã hóa, ghi ra file trong ``directory``.
+
+    Mỗi lượt xếp hạng (theo cảm xúc, theo từng nhóm người dùng) đọc lại lần lượt từng batch,
+    nên bộ nhớ chỉ giữ một batch thay vì cả ma trận của catalog.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.count = 0
+
+    def _path(self, index):
+        return os.path.join(self.directory, f'batch-{index}.pickle')
+
+    def append(self, songs, matrix, emotion_of):
+        # Chỉ giữ các trường của playlist; ma trận và cảm xúc là mảng numpy
+        songs = [{field: song[field] for field in PLAYLIST_FIELDS} for song in songs]
+        with open(self._path(self.count), 'wb') as f:
+            pickle.dump((songs, matrix, emotion_of), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def __iter__(self):
+        for index in range(self.count):
+            with open(self._path(index), 'rb') as f:
+                yield pickle.load(f)
+
+
+class Command(BaseCommand):
+    help = "Tính sẵn playlist gợi ý cho từng cảm xúc (và tùy chọn cho từng người dùng) vào collection recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=1000, help="Số bài hát đọc mỗi batch")
+        parser.add_argument('--users', action='store_true', help="Tính thêm playlist riêng theo lịch sử nghe của từng người dùng")
+        parser.add_argument('--user-batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        from recommend.views import final_emotions, historysongs_collection, recommendations_collection, songs_collection
+
+        self.songs_collection = songs_collection
+        self.batch_size = options['batch_size']
+        self.top_k = options['top_k']
+        self.emotions = [e.lower() for e in final_emotions]
+        version = int(time.time() * 1000)
+        start = time.monotonic()
+        # Phiên bản songs trước khi đọc: bài đổi trong lúc chạy làm playlist bị coi là cũ, không phục vụ nhầm
+        catalog_version = SongsVersion(songs_collection).get()
+
+        # Lượt 1: thống kê cho encoder (khoảng bpm, danh sách genre)
+        stats = EncoderStats()
+        total = 0
+        for songs in self.song_batches():
+            stats.update(songs)
+            total += len(songs)
+        self.encoder = stats.encoder(self.emotions)
+
+        with tempfile.TemporaryDirectory(prefix='precompute-') as directory:
+            # Lượt 2: mã hóa từng batch ra file tạm và cộng dồn trọng tâm của mỗi cảm xúc
+            encoded = EncodedBatches(directory)
+            sums = np.zeros((len(self.emotions), self.encoder.dimensions), dtype=np.float64)
+            counts = np.zeros(len(self.emotions), dtype=np.int64)
+            for songs in self.song_batches():
+                matrix = self.encoder.encode(songs)
+                emotion_of = np.array([song['emotion'] for song in songs], dtype=object)
+                for e, emotion in enumerate(self.emotions):
+                    rows = emotion_of == emotion
+                    sums[e] += matrix[rows].sum(axis=0)
+                    counts[e] += rows.sum()
+                encoded.append(songs, matrix, emotion_of)
+            # Cảm xúc không có bài nào: dùng trọng tâm toàn catalog và xếp hạng trên toàn bộ bài hát
+            fallback = normalize_rows(sums.sum(axis=0) / max(counts.sum(), 1))
+            profiles = np.stack([
+                normalize_rows(sums[e] / counts[e]) if counts[e] else fallback
+                for e in range(len(self.emotions))
+            ]).astype(np.float32)
+
+            # Chấm điểm và giữ top-k cho mỗi cảm xúc
+            playlists = self.rank(encoded, profiles, counts, [f'emotion:{emotion}' for emotion in self.emotions])
+            docs = [
+                {'_id': key, 'emotion': emotion, 'userId': None, 'songs': playlists[key]}
+                for key, emotion in zip(playlists, self.emotions)
+            ]
+            written = self.write(recommendations_collection, docs, version, catalog_version)
+            self.stdout.write(f"Đã tính {written} playlist theo cảm xúc từ {total} bài hát")
+
+            if options['users']:
+                written = 0
+                for users in batches(historysongs_collection.find({}, {'userId': 1, 'songs': 1}), options['user_batch_size']):
+                    written += self.precompute_users(
+                        users, encoded, profiles, counts, recommendations_collection, version, catalog_version
+                    )
+                self.stdout.write(f"Đã tính {written} playlist theo người dùng")
+
+        # Không có --users thì playlist riêng của người dùng được giữ lại; bản nào tính từ songs cũ
+        # không khớp catalogVersion nên get_precomputed_playlist bỏ qua
+        stale = {'version': {'$ne': version}}
+        if not options['users']:
+            stale['userId'] = None
+        removed = recommendations_collection.delete_many(stale).deleted_count
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất version {version} sau {time.monotonic() - start:.1f}s, xóa {removed} playlist cũ"
+        ))
+
+    def song_batches(self):
+        projection = {field: 1 for field in SONG_FIELDS}
+        cursor = self.songs_collection.find({}, projection).batch_size(self.batch_size)
+        for docs in batches(cursor, self.batch_size):
+            songs = [prepare_song(doc) for doc in docs]
+            songs = [song for song in songs if song['emotion'] in self.emotions]
+            if songs:
+                yield songs
+
+    def rank(self, encoded, profiles, counts, keys):
+        # profiles: (len(keys), d), cột thứ i ứng với cảm xúc i % số cảm xúc
+        accumulators = [TopK(self.top_k) for _ in keys]
+        for songs, matrix, emotion_of in encoded:
+            scores = matrix @ profiles.T
+            masks = [emotion_of == emotion if counts[e] else np.ones(len(songs), dtype=bool)
+                     for e, emotion in enumerate(self.emotions)]
+            for column, accumulator in enumerate(accumulators):
+                mask = masks[column % len(self.emotions)]
+                accumulator.push(scores[mask, column], [song for song, keep in zip(songs, mask) if keep])
+        return {
+            key: [{field: song[field] for field in PLAYLIST_FIELDS} for song in accumulator.songs]
+            for key, accumulator in zip(keys, accumulators)
+        }
+
+    def history_songs(self, users):
+        """Đường dẫn -> bài hát trong songs cho mọi bài trong lịch sử của nhóm người dùng, một truy vấn.
+
+        historysongs chỉ lưu bản sao title/artist/file_path; genre, cảm xúc và bpm lấy từ catalog
+        để vector người dùng cùng đặc trưng với vector bài hát.
+        """
+        paths = list({
+            path for user in users for path in map(songrefs.song_path, user.get('songs') or []) if path
+        })
+        if not paths:
+            return {}
+        projection = {field: 1 for field in SONG_FIELDS}
+        return {
+            media.media_path(doc['file_path']): prepare_song(doc)
+            for doc in self.songs_collection.find(songrefs.path_query(paths), projection)
+        }
+
+    def precompute_users(self, users, encoded, profiles, counts, collection, version, catalog_version):
+        # Vector người dùng: trung bình đặc trưng các bài (trong catalog) đã nghe, cộng vào profile từng cảm xúc
+        catalog_songs = self.history_songs(users)
+        keys, user_profiles, owners = [], [], []
+        for user in users:
+            history = [catalog_songs.get(songrefs.song_path(song)) for song in user.get('songs') or []]
+            history = [song for song in history if song is not None]
+            if not history or not user.get('userId'):
+                continue
+            user_vector = normalize_rows(self.encoder.encode(history).mean(axis=0))
+            for e, emotion in enumerate(self.emotions):
+                keys.append(f"user:{user['userId']}:{emotion}")
+                user_profiles.append(normalize_rows(profiles[e] + user_vector))
+                owners.append((user['userId'], emotion))
+        if not keys:
+            return 0
+        playlists = self.rank(encoded, np.stack(user_profiles), counts, keys)
+        docs = [
+            {'_id': key, 'emotion': emotion, 'userId': user_id, 'songs': playlists[key]}
+            for key, (user_id, emotion) in zip(keys, owners)
+        ]
+        return self.write(collection, docs, version, catalog_version)
+
+    def write(self, collection, docs, version, catalog_version):
+        now = datetime.now()
+        requests = [
+            ReplaceOne({'_id': doc['_id']}, {**doc, 'version': version, 'catalogVersion': catalog_version, 'updatedAt': now}, upsert=True)
+            for doc in docs
+        ]
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+        return len(requests)
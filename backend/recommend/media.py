@@ -0,0 +1,56 @@
+DEFAULT_COVER = '/public/default_cover.png'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Trường của một album sau khi làm phẳng (albums và list dùng chung)
+ALBUM_FIELDS = ('title', 'artist', 'cover', 'songs')
+# Trường của bài hát trong album mà client dùng (không gồm artistId nội bộ)
+ALBUM_SONG_FIELDS = ('title', 'artist', 'genre', 'file_path', 'src', 'cover')
+
+
+def media_path(path):
+    """Chuẩn hóa đường dẫn media lưu kiểu Windows: "public\\covers\\a.png" -> "/covers/a.png"."""
+    if not isinstance(path, str) or not path:
+        return path
+    path = path.replace('\\', '/')
+    if path.startswith('public/'):
+        path = path.removeprefix('public/')
+    if not path.startswith('/') and '://' not in path:
+        path = '/' + path
+    return path
+
+
+def cover_path(cover):
+    cover = media_path(cover)
+    if not isinstance(cover, str) or not cover.lower().endswith(IMAGE_EXTENSIONS):
+        return DEFAULT_COVER
+    return cover
+
+
+def normalize_song(song):
+    song = dict(song)
+    for field in ('cover', 'src', 'file_path'):
+        if field in song:
+            song[field] = media_path(song[field])
+    if not song.get('file_path') and song.get('src'):
+        song['file_path'] = song['src']
+    return song
+
+
+def normalize_album(entry):
+    """Album/list dạng phẳng với đường dẫn đã chuẩn hóa, lưu một lần khi ghi."""
+    return {
+        'title': entry.get('title', 'Unknown Title'),
+        'artist': entry.get('artist', 'Unknown Artist'),
+        'cover': cover_path(entry.get('cover')),
+        'songs': [normalize_song(song) for song in entry.get('songs', [])]
+    }
+
+
+def album_entries(doc):
+    # Album dạng phẳng có trường title; dạng cũ lưu tiêu đề album làm key của một dict con
+    if 'title' in doc:
+        yield doc
+        return
+    for key, value in doc.items():
+        if isinstance(value, dict) and 'artist' in value and 'songs' in value:
+            yield {**value, 'title': key}
@@ -0,0 +1,10 @@
+def batches(cursor, size):
+    # Gom document của cursor thành từng list ``size`` phần tử (lệnh quản trị đọc/ghi theo batch)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,92 @@
+import base64
+import binascii
+from datetime import datetime
+
+from bson import ObjectId
+from django.conf import settings
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    # Cursor mờ (opaque) cho client: khóa sắp xếp cuối trang (_id, hoặc thời điểm kèm _id), mã hóa base64 url-safe
+    value = '|'.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+    return base64.urlsafe_b64encode(value.encode()).rstrip(b'=').decode()
+
+
+def _object_id(value):
+    if not ObjectId.is_valid(value):
+        raise InvalidPage('cursor không hợp lệ')
+    return ObjectId(value)
+
+
+def decode_cursor(cursor, kind=ObjectId):
+    """ObjectId với kind=ObjectId; (datetime, ObjectId) với kind=datetime."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise InvalidPage('cursor không hợp lệ')
+    if kind is datetime:
+        timestamp, _, last_id = value.partition('|')
+        try:
+            return datetime.fromisoformat(timestamp), _object_id(last_id)
+        except ValueError:
+            raise InvalidPage('cursor không hợp lệ')
+    return _object_id(value)
+
+
+def page_params(request, default_size=None, kind=ObjectId):
+    """(kích thước trang, khóa sau cùng của trang trước) từ ?limit= và ?cursor=."""
+    try:
+        size = int(request.GET.get('limit', default_size or settings.PAGE_SIZE))
+    except ValueError:
+        raise InvalidPage('limit không hợp lệ')
+    size = min(max(size, 1), settings.MAX_PAGE_SIZE)
+    cursor = request.GET.get('cursor')
+    return size, decode_cursor(cursor, kind) if cursor else None
+
+
+def _page_query(query, request, default_size, sort_field, descending):
+    kind = ObjectId if sort_field == '_id' else datetime
+    size, after = page_params(request, default_size, kind)
+    direction = -1 if descending else 1
+    if sort_field == '_id':
+        if after is not None:
+            query = {**query, '_id': {'$lt' if descending else '$gt': after}}
+        return size, query, [('_id', direction)]
+
+    # Nhiều document có thể cùng mốc thời gian: sắp xếp và so sánh theo cặp (sort_field, _id) để ở ranh giới
+    # trang không bỏ sót hay lặp lại. Điều kiện khoảng trên sort_field giữ giới hạn quét của index, $or phân xử chỗ bằng nhau.
+    if after is not None:
+        value, last_id = after
+        op = '$lt' if descending else '$gt'
+        query = {
+            '$and': [
+                query,
+                {sort_field: {'$lte' if descending else '$gte': value}},
+                {'$or': [{sort_field: {op: value}}, {'_id': {op: last_id}}]}
+            ]
+        }
+    return size, query, [(sort_field, direction), ('_id', direction)]
+
+
+def _page(docs, size, sort_field):
+    if len(docs) <= size:
+        return docs, None
+    last = docs[size - 1]
+    keys = (last['_id'],) if sort_field == '_id' else (last[sort_field], last['_id'])
+    return docs[:size], encode_cursor(*keys)
+
+
+async def apaginate(collection, query, projection, request, default_size=None, sort_field='_id', descending=False):
+    """Một trang kết quả theo keyset trên ``sort_field`` từ collection của motor, trả về (documents, nextCursor hoặc None).
+
+    Đọc thêm một document để biết còn trang sau hay không; truy vấn luôn sắp xếp theo
+    ``sort_field`` (mặc định _id tăng dần) rồi _id, nên dùng được index {<trường lọc>: 1, <sort_field>: ±1, _id: ±1}
+    và không cần skip(). ``sort_field`` khác _id phải là datetime; ``projection`` phải giữ nó và _id.
+    """
+    size, query, sort = _page_query(query, request, default_size, sort_field, descending)
+    docs = await collection.find(query, projection).sort(sort).limit(size + 1).to_list(size + 1)
+    return _page(docs, size, sort_field)
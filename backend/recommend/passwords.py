@@ -0,0 +1,100 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy: view trả 503 thay vì giữ luồng request."""
+
+
+def hash_cost(hashed):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt chạy trên một pool luồng giới hạn trong mỗi process.
+
+    Chỉ ``max_workers`` phép băm chạy cùng lúc (bcrypt nhả GIL nên các luồng request
+    khác vẫn phục vụ catalog/phát nhạc), tối đa ``max_queue`` phép băm nữa được chờ.
+    Khi hàng đợi đầy quá ``timeout`` giây thì ném HasherBusy.
+    """
+
+    def __init__(self, rounds=12, max_workers=2, max_queue=32, timeout=5.0):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def _pool(self):
+        # Luồng của pool không sống sót qua fork của gunicorn, nên tạo lại theo pid
+        pid = os.getpid()
+        if self._executor_pid != pid:
+            with self._lock:
+                if self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='bcrypt')
+                    self._executor_pid = pid
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(self._hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        return self._run(self._check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def rehash_later(self, password, save):
+        """Băm lại với ``rounds`` hiện tại ở nền rồi gọi ``save(new_hash)``; bỏ qua nếu pool đang bận."""
+        if not self._slots.acquire(blocking=False):
+            return
+        try:
+            future = self._pool().submit(self._hash, password, self.rounds)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def done(future):
+            self._slots.release()
+            try:
+                save(future.result())
+            except Exception as e:
+                logger.error(f"Lỗi khi băm lại mật khẩu: {e}")
+        future.add_done_callback(done)
+
+    @staticmethod
+    def _hash(password, rounds):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+    @staticmethod
+    def _check(password, hashed):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+hasher = PasswordHasher(
+    settings.BCRYPT_ROUNDS,
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_QUEUE,
+    settings.PASSWORD_HASH_TIMEOUT
+)
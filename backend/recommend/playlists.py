@@ -0,0 +1,333 @@
+import re
+from collections import namedtuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from . import songrefs
+
+MAX_PLAYLISTS = 4
+MAX_BATCH_OPS = 100  # số thao tác tối đa trong một request playlist-ops
+
+# Một thao tác trên document myplaylist của một người dùng: một update_one có điều kiện.
+# ``filter`` chứa cả điều kiện bảo vệ (playlist còn tồn tại, chưa đủ 4 playlist, ...), nên thao tác
+# không khớp (matched_count == 0) nghĩa là điều kiện sai tại thời điểm ghi, không phải ghi nhầm phần tử.
+Mutation = namedtuple('Mutation', ['filter', 'update', 'array_filters', 'upsert'], defaults=[None, False])
+
+
+def new_id():
+    return str(ObjectId())
+
+
+def new_entry(song):
+    # Mỗi lần thêm có entryId riêng: cùng một bài có thể nằm trong playlist nhiều lần
+    return {'entryId': new_id(), **song}
+
+
+def song(data):
+    """Bài hát từ body request; None nếu thiếu title hoặc artist."""
+    if not isinstance(data, dict) or not data.get('title') or not data.get('artist'):
+        return None
+    return {
+        'title': data.get('title'),
+        'artist': data.get('artist'),
+        'file_path': data.get('file_path', ''),
+        'cover': data.get('cover', '/public/default_cover.png')
+    }
+
+
+def song_ids(playlists):
+    # songId của mọi playlist, để lấy bằng một lần SongCache.get_many
+    return songrefs.song_ids(
+        song for p in playlists if isinstance(p, dict) for song in p.get('songs', [])
+    )
+
+
+def public(playlists, songs):
+    """Dạng trả về cho client (get_my_playlist, playlist-ops), bỏ phần tử hỏng.
+
+    ``songs``: _id -> bài hát (SongCache.get_many(song_ids(playlists))) để thay tham chiếu songId.
+    """
+    return [
+        {'id': p['id'], 'title': p.get('title', f'Danh sách {i+1}'), 'songs': songrefs.hydrate(p.get('songs', []), songs)}
+        for i, p in enumerate(playlists) if isinstance(p, dict)
+    ]
+
+
+def with_ids(playlists):
+    """(playlists, changed): thêm ``id`` cho playlist và ``entryId`` cho bài hát còn thiếu (dữ liệu cũ)."""
+    changed = False
+    result = []
+    for playlist in playlists:
+        if not isinstance(playlist, dict):
+            result.append(playlist)
+            continue
+        songs = []
+        for song in playlist.get('songs', []):
+            if isinstance(song, dict) and 'entryId' not in song:
+                song = new_entry(song)
+                changed = True
+            songs.append(song)
+        if 'id' not in playlist:
+            changed = True
+        result.append({**playlist, 'id': playlist.get('id') or new_id(), 'songs': songs})
+    return result, changed
+
+
+async def aensure_ids(collection, user_id, retries=3):
+    """Document myplaylist của user với đủ id; gán id còn thiếu bằng một update có điều kiện.
+
+    ``collection``: collection myplaylist của motor (async_views.mongo()). Điều kiện là mảng
+    playlists chưa đổi kể từ lúc đọc; nếu có request khác sửa trước thì đọc lại.
+    """
+    for _ in range(retries):
+        doc = await collection.find_one({'userId': user_id})
+        if not doc or not isinstance(doc.get('playlists'), list):
+            return doc
+        playlists, changed = with_ids(doc['playlists'])
+        if not changed:
+            return doc
+        result = await collection.update_one(
+            {'_id': doc['_id'], 'playlists': doc['playlists']},
+            {'$set': {'playlists': playlists}}
+        )
+        if result.matched_count:
+            return {**doc, 'playlists': playlists}
+    return None
+
+
+def resolve(doc, playlist_index, song_index=None):
+    """(playlistId, entryId) tại vị trí cũ (playlistIndex/songIndex); None nếu vị trí không tồn tại.
+
+    Vị trí tính như danh sách client nhận từ get_my_playlist, tức là đã bỏ các phần tử hỏng.
+    """
+    playlists = [p for p in doc.get('playlists', []) if isinstance(p, dict)] if doc else []
+    if not isinstance(playlist_index, int) or not 0 <= playlist_index < len(playlists):
+        return None, None
+    playlist = playlists[playlist_index]
+    if song_index is None:
+        return playlist['id'], None
+    songs = playlist.get('songs', [])
+    if not isinstance(song_index, int) or not 0 <= song_index < len(songs):
+        return playlist['id'], None
+    song = songs[song_index]
+    return playlist['id'], song.get('entryId') if isinstance(song, dict) else None
+
+
+def title_pattern(title):
+    # So tiêu đề không phân biệt hoa thường và khoảng trắng hai đầu, như khi kiểm tra trùng tên trước đây
+    return re.compile(rf'^\s*{re.escape(title.strip())}\s*$', re.IGNORECASE)
+
+
+def document_id(user_id):
+    # _id cố định theo user: hai request cùng tạo document cho một user thì một bên bị index _id (luôn unique) từ chối
+    return ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+
+
+def create_document(user_id):
+    """Document myplaylist rỗng cho user chưa có; không đổi gì nếu đã có (kể cả document cũ với _id ngẫu nhiên)."""
+    return Mutation({'userId': user_id}, {'$setOnInsert': {'_id': document_id(user_id), 'playlists': []}}, upsert=True)
+
+
+def create(user_id, playlist_id, title=None):
+    """Thêm playlist nếu user còn dưới MAX_PLAYLISTS playlist; không upsert (xem acreate)."""
+    existing = {'$ifNull': ['$playlists', []]}
+    default_title = {'$concat': ['Danh sách ', {'$toString': {'$add': [{'$size': existing}, 1]}}]}
+    return Mutation(
+        {'userId': user_id, f'playlists.{MAX_PLAYLISTS - 1}': {'$exists': False}},
+        [{'$set': {'playlists': {'$concatArrays': [
+            existing,
+            [{'id': {'$literal': playlist_id}, 'title': {'$literal': title} if title else default_title, 'songs': []}]
+        ]}}}]
+    )
+
+
+def add_songs(user_id, playlist_id, songs):
+    return Mutation(
+        {'userId': user_id, 'playlists.id': playlist_id},
+        {'$push': {'playlists.$[p].songs': {'$each': songs}}},
+        [{'p.id': playlist_id}]
+    )
+
+
+def remove_entries(user_id, playlist_id, entry_ids):
+    return Mutation(
+        {'userId': user_id, 'playlists.id': playlist_id},
+        {'$pull': {'playlists.$[p].songs': {'entryId': {'$in': entry_ids}}}},
+        [{'p.id': playlist_id}]
+    )
+
+
+def rename(user_id, playlist_id, title):
+    # Không playlist nào khác của user được trùng tiêu đề mới
+    return Mutation(
+        {
+            'userId': user_id,
+            'playlists.id': playlist_id,
+            'playlists': {'$not': {'$elemMatch': {'id': {'$ne': playlist_id}, 'title': title_pattern(title)}}}
+        },
+        {'$set': {'playlists.$[p].title': title}},
+        [{'p.id': playlist_id}]
+    )
+
+
+def delete(user_id, playlist_id):
+    return Mutation({'userId': user_id, 'playlists.id': playlist_id}, {'$pull': {'playlists': {'id': playlist_id}}})
+
+
+async def aapply(collection, mutation):
+    return await collection.update_one(
+        mutation.filter, mutation.update, upsert=mutation.upsert, array_filters=mutation.array_filters
+    )
+
+
+async def acreate(collection, user_id, playlist_id, title=None):
+    """Thêm playlist cho user; matched_count == 0 nghĩa là user đã có MAX_PLAYLISTS playlist.
+
+    Không dựa vào index unique trên myplaylist.userId: playlist chỉ được thêm vào document đã có,
+    document được tạo riêng với _id cố định theo user (create_document), nên các request đồng thời
+    không thể tạo hai document cho cùng một user rồi mỗi document giữ tới MAX_PLAYLISTS playlist.
+    """
+    mutation = create(user_id, playlist_id, title)
+    result = await aapply(collection, mutation)
+    if result.matched_count or await collection.count_documents({'userId': user_id}, limit=1):
+        return result
+    try:
+        await aapply(collection, create_document(user_id))
+    except DuplicateKeyError:
+        pass  # request khác vừa tạo document cho user này
+    return await aapply(collection, mutation)
+
+
+# ---- Thao tác hàng loạt (POST /api/playlist-ops/<user_id>) ----
+# Cả lô được dịch thành một update pipeline trên document myplaylist: các thao tác chạy theo thứ tự,
+# trong một lần ghi nguyên tử và một round trip (find_one_and_update trả luôn trạng thái mới).
+# Chuỗi từ client luôn bọc $literal để không bị hiểu là đường dẫn trường ("$...").
+
+def _songs_of(var='$$p'):
+    return {'$ifNull': [f'{var}.songs', []]}
+
+
+def _on_playlist(playlist_id, changes):
+    """Stage $set áp ``changes`` (biểu thức theo $$p) lên đúng playlist có id này."""
+    return {'$set': {'playlists': {'$map': {
+        'input': '$playlists',
+        'as': 'p',
+        'in': {'$cond': [
+            {'$eq': ['$$p.id', {'$literal': playlist_id}]},
+            {'$mergeObjects': ['$$p', changes]},
+            '$$p'
+        ]}
+    }}}}
+
+
+def _entries_where(cond):
+    return {'$filter': {'input': _songs_of(), 'as': 's', 'cond': cond}}
+
+
+def _is_entry(entry_id):
+    return {'$eq': ['$$s.entryId', {'$literal': entry_id}]}
+
+
+def _string_list(value, name, index):
+    if not isinstance(value, list) or not value or not all(isinstance(v, str) and v for v in value):
+        raise ValueError(f'Thao tác {index}: {name} phải là danh sách id')
+    return value
+
+
+def _stage(op, index, ids_by_path):
+    kind, playlist_id = op.get('op'), op.get('playlistId')
+    if not isinstance(playlist_id, str) or not playlist_id:
+        raise ValueError(f'Thao tác {index}: thiếu playlistId')
+
+    if kind == 'add':
+        songs = [song(s) for s in op.get('songs') or []]
+        if not songs or None in songs:
+            raise ValueError(f'Thao tác {index}: songs phải là danh sách bài hát có title và artist')
+        entries = [new_entry(s) for s in songrefs.to_refs(songs, ids_by_path)]
+        return _on_playlist(playlist_id, {'songs': {'$concatArrays': [_songs_of(), {'$literal': entries}]}}), entries
+
+    if kind == 'remove':
+        entry_ids = _string_list(op.get('entryIds'), 'entryIds', index)
+        return _on_playlist(playlist_id, {'songs': _entries_where(
+            {'$not': [{'$in': ['$$s.entryId', {'$literal': entry_ids}]}]}
+        )}), []
+
+    if kind == 'move':
+        entry_id, position = op.get('entryId'), op.get('position')
+        if not isinstance(entry_id, str) or not isinstance(position, int) or isinstance(position, bool) or position < 0:
+            raise ValueError(f'Thao tác {index}: move cần entryId và position >= 0')
+        rest = '$$rest'
+        return _on_playlist(playlist_id, {'songs': {'$let': {
+            'vars': {'rest': _entries_where({'$not': [_is_entry(entry_id)]}), 'moved': _entries_where(_is_entry(entry_id))},
+            'in': {'$concatArrays': [
+                {'$slice': [rest, position]} if position else [],
+                '$$moved',
+                {'$slice': [rest, position, {'$max': [{'$size': rest}, 1]}]}
+            ]}
+        }}}), []
+
+    if kind == 'reorder':
+        # entryIds theo thứ tự mới; bài không được liệt kê giữ thứ tự cũ ở cuối
+        entry_ids = _string_list(op.get('entryIds'), 'entryIds', index)
+        if len(set(entry_ids)) != len(entry_ids):
+            # Id lặp lại sẽ nhân đôi bài hát trong playlist
+            raise ValueError(f'Thao tác {index}: entryIds bị trùng')
+        return _on_playlist(playlist_id, {'songs': {'$concatArrays': [
+            {'$reduce': {
+                'input': {'$literal': entry_ids},
+                'initialValue': [],
+                'in': {'$concatArrays': ['$$value', _entries_where({'$eq': ['$$s.entryId', '$$this']})]}
+            }},
+            _entries_where({'$not': [{'$in': ['$$s.entryId', {'$literal': entry_ids}]}]})
+        ]}}), []
+
+    if kind == 'rename':
+        title = op.get('title')
+        if not isinstance(title, str) or not title.strip():
+            raise ValueError(f'Thao tác {index}: thiếu title')
+        return _on_playlist(playlist_id, {'title': {'$literal': title}}), []
+
+    raise ValueError(f"Thao tác {index}: không hỗ trợ op '{kind}'")
+
+
+def batch(user_id, ops, ids_by_path):
+    """(Mutation, entries mới thêm) cho một lô thao tác có thứ tự.
+
+    ``ids_by_path``: đường dẫn -> _id (SongCache.ids_by_path) để bài thêm vào được lưu dạng tham chiếu.
+
+    Filter yêu cầu mọi playlist được nhắc tới còn tồn tại, bài được move có trong playlist của nó và tiêu đề
+    mới không trùng playlist khác, nên lô hoặc áp toàn bộ hoặc không áp gì. ValueError nếu lô không hợp lệ.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise ValueError('ops phải là danh sách thao tác')
+    if len(ops) > MAX_BATCH_OPS:
+        raise ValueError(f'Tối đa {MAX_BATCH_OPS} thao tác mỗi lần')
+
+    stages, entries = [], []
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise ValueError(f'Thao tác {index} không hợp lệ')
+        stage, added = _stage(op, index, ids_by_path)
+        stages.append(stage)
+        entries.extend(added)
+
+    playlist_ids = list(dict.fromkeys(op['playlistId'] for op in ops))
+    renames = {op['playlistId']: op['title'] for op in ops if op.get('op') == 'rename'}
+    titles = [title.strip().lower() for title in renames.values()]
+    if len(set(titles)) != len(titles):
+        raise ValueError('Tiêu đề danh sách đã tồn tại')
+
+    query = {'userId': user_id, 'playlists.id': {'$all': playlist_ids}}
+    # Bài được move phải có trong playlist của nó, nếu không cả lô bị từ chối như khi thiếu playlist
+    moved = [(op['playlistId'], op['entryId']) for op in ops if op.get('op') == 'move']
+    if moved:
+        query['$and'] = [
+            {'playlists': {'$elemMatch': {'id': playlist_id, 'songs.entryId': entry_id}}} for playlist_id, entry_id in moved
+        ]
+    if renames:
+        query['playlists'] = {'$not': {'$elemMatch': {
+            'id': {'$nin': list(renames)},
+            'title': {'$in': [title_pattern(title) for title in renames.values()]}
+        }}}
+    return Mutation(query, stages), entries
@@ -0,0 +1,342 @@
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from bson import ObjectId
+
+from . import songrefs
+from .media import album_entries
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {'title': 2.0, 'name': 2.0, 'artist': 1.0}
+TYPE_ORDER = {'song': 0, 'artist': 1, 'album': 2}
+EXACT_SCORE = 1.0
+FUZZY_SCORE = 0.4
+# Từ khóa ngắn hơn không được sửa lỗi chính tả (quá nhiều kết quả nhiễu)
+MIN_FUZZY_LENGTH = 4
+# Giới hạn số token mở rộng cho một tiền tố (ví dụ "a")
+MAX_PREFIX_EXPANSIONS = 64
+
+_TOKEN = re.compile(r'\w+')
+
+
+def fold(text):
+    """Bỏ dấu tiếng Việt và viết thường: "Lặng" -> "lang", "Đợi" -> "doi"."""
+    text = unicodedata.normalize('NFD', str(text or '')).replace('đ', 'd').replace('Đ', 'D')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return _TOKEN.findall(fold(text))
+
+
+def deletes(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def within_one_edit(a, b):
+    # Khoảng cách Damerau (OSA) <= 1: thêm, bớt, thay hoặc đảo hai ký tự liền kề
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    """Inverted index trong bộ nhớ: token (đã bỏ dấu) -> {key tài liệu: trọng số trường}.
+
+    Hỗ trợ khớp chính xác, tiền tố (qua danh sách token đã sắp xếp) và sai một ký tự
+    (qua từ điển xóa-một-ký-tự). Có thể thêm/xóa từng tài liệu mà không dựng lại index.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}
+        self._postings = {}
+        self._tokens = []
+        self._deletes = {}
+        # Tăng mỗi khi nội dung index đổi; Suggester dựng lại index gợi ý theo giá trị này
+        self.version = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def keys(self, doc_type=None):
+        return [key for key in self._docs if doc_type is None or key[0] == doc_type]
+
+    def documents(self):
+        with self._lock:
+            return [payload for payload, _ in self._docs.values()]
+
+    def upsert(self, key, payload, fields):
+        """key: (type, id); payload: dict trả về cho client; fields: {tên trường: văn bản}."""
+        terms = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0.0), weight)
+        with self._lock:
+            if self._docs.get(key) == (payload, terms):
+                return  # nạp lại định kỳ: tài liệu không đổi
+            self._remove(key)
+            self._docs[key] = (payload, terms)
+            self.version += 1
+            for token, weight in terms.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = {}
+                    bisect.insort(self._tokens, token)
+                    if len(token) >= MIN_FUZZY_LENGTH:
+                        for variant in deletes(token):
+                            self._deletes.setdefault(variant, set()).add(token)
+                posting[key] = weight
+
+    def remove(self, key):
+        with self._lock:
+            if self._remove(key):
+                self.version += 1
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return False
+        for token in doc[1]:
+            posting = self._postings[token]
+            posting.pop(key, None)
+            if posting:
+                continue
+            del self._postings[token]
+            del self._tokens[bisect.bisect_left(self._tokens, token)]
+            if len(token) >= MIN_FUZZY_LENGTH:
+                for variant in deletes(token):
+                    candidates = self._deletes.get(variant)
+                    candidates.discard(token)
+                    if not candidates:
+                        del self._deletes[variant]
+        return True
+
+    def search(self, query, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            matches = [self._match(term) for term in terms]
+            # Ưu tiên tài liệu khớp mọi từ khóa; nếu không có thì lấy tài liệu khớp ít nhất một từ
+            keys = set.intersection(*(set(m) for m in matches)) or set().union(*matches)
+            ranked = sorted(
+                keys,
+                key=lambda k: (
+                    -sum(m.get(k, 0.0) for m in matches),
+                    TYPE_ORDER.get(k[0], len(TYPE_ORDER)),
+                    self._docs[k][0].get('name', '')
+                )
+            )
+            return [self._docs[key][0] for key in ranked[:limit]]
+
+    def _match(self, term):
+        scores = {}
+
+        def add(token, score):
+            for key, weight in self._postings[token].items():
+                scores[key] = max(scores.get(key, 0.0), score * weight)
+
+        if term in self._postings:
+            add(term, EXACT_SCORE)
+
+        start = bisect.bisect_right(self._tokens, term)
+        for token in self._tokens[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            add(token, 0.6 + 0.3 * len(term) / len(token))
+
+        if len(term) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._deletes.get(term, ()))
+            for variant in deletes(term):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._deletes.get(variant, ()))
+            candidates.discard(term)
+            for token in candidates:
+                if within_one_edit(term, token):
+                    add(token, FUZZY_SCORE)
+        return scores
+
+
+class CatalogSearch:
+    """Index tìm kiếm cho bài hát, nghệ sĩ và album.
+
+    Bài hát đi theo SongCatalog (cập nhật từng bài qua listener); nghệ sĩ và album được
+    cập nhật ngay khi view ghi, và nạp lại ở nền khi ``catalog_version`` (cache.CatalogVersion,
+    được view ghi của worker khác tăng) đổi hoặc sau ``refresh_interval`` giây. Album tham chiếu
+    bài hát (songId) được dựng lại khi một trong các bài đó đổi trong catalog.
+    """
+
+    def __init__(self, song_catalog, artists_collection, albums_collection, refresh_interval=300, catalog_version=None):
+        self.song_catalog = song_catalog
+        self.artists_collection = artists_collection
+        self.albums_collection = albums_collection
+        self.refresh_interval = refresh_interval
+        self.catalog_version = catalog_version
+        self.index = SearchIndex()
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._loaded_version = None
+        self._refreshing = False
+        # _id album -> (document, songId của album) và songId -> {_id album}, để dựng lại album khi bài đổi
+        self._albums = {}
+        self._albums_by_song = {}
+        self._albums_lock = threading.Lock()
+
+    def search(self, query, limit=20):
+        self.ensure_loaded()
+        return self.index.search(query, limit)
+
+    def ensure_loaded(self):
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    start = time.monotonic()
+                    self.song_catalog.index()
+                    self.song_catalog.add_listener(self._on_songs_changed)
+                    self._on_songs_changed(self.song_catalog.songs(), [])
+                    self._load_artists_albums()
+                    logger.info(f"Đã dựng index tìm kiếm {len(self.index)} mục sau {time.monotonic() - start:.2f}s")
+        elif not self._refreshing and (time.monotonic() - self._loaded_at > self.refresh_interval or self._catalog_changed()):
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name='search-refresh', daemon=True).start()
+
+    def _catalog_changed(self):
+        if self.catalog_version is None:
+            return False
+        try:
+            return self.catalog_version.get() != self._loaded_version
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc phiên bản catalog cho index tìm kiếm: {e}")
+            return False
+
+    def _refresh(self):
+        try:
+            self._load_artists_albums()
+        except Exception as e:
+            logger.error(f"Lỗi khi nạp lại nghệ sĩ/album cho index tìm kiếm: {e}")
+        finally:
+            self._refreshing = False
+
+    def _load_artists_albums(self):
+        # Đọc phiên bản trước khi quét: thay đổi trong lúc quét được nạp ở lần sau
+        if self.catalog_version is not None:
+            self._loaded_version = self.catalog_version.get()
+        keys = set()
+        for doc in self.artists_collection.find({}, {'artist': 1, 'cover': 1, 'cover2': 1}):
+            keys.add(self.upsert_artist(doc))
+        album_ids = set()
+        for doc in self.albums_collection.find():
+            keys.update(self.upsert_album(doc))
+            album_ids.add(doc['_id'])
+        with self._albums_lock:
+            for album_id in set(self._albums) - album_ids:
+                self._untrack_album(album_id)
+        for key in self.index.keys():
+            if key[0] in ('artist', 'album') and key not in keys:
+                self.index.remove(key)
+        self._loaded_at = time.monotonic()
+
+    def _on_songs_changed(self, upserts, deletes):
+        for song in upserts:
+            song_id = str(song['_id'])
+            self.index.upsert(('song', song_id), {
+                '_id': song_id,
+                'type': 'song',
+                'name': f"{song.get('title', '')} - {song.get('artist', '')}",
+                'title': song.get('title', ''),
+                'artist': song.get('artist', 'Unknown Artist'),
+                'cover': song.get('cover') or '/public/default_cover.png',
+                'file_path': song.get('file_path', '')
+            }, {'title': song.get('title'), 'artist': song.get('artist')})
+        for song_id in deletes:
+            self.index.remove(('song', str(song_id)))
+
+        # Album lưu tham chiếu songId: payload (tiêu đề, ảnh, đường dẫn bài) được dựng lại theo bài mới
+        changed = {str(song['_id']) for song in upserts} | {str(song_id) for song_id in deletes}
+        with self._albums_lock:
+            album_ids = {album_id for song_id in changed for album_id in self._albums_by_song.get(song_id, ())}
+            docs = [self._albums[album_id][0] for album_id in album_ids]
+        for doc in docs:
+            self.upsert_album(doc)
+
+    def upsert_artist(self, doc):
+        key = ('artist', str(doc['_id']))
+        name = doc.get('artist', 'Unknown Artist')
+        self.index.upsert(key, {
+            '_id': key[1],
+            'type': 'artist',
+            'name': name,
+            'artist': name,
+            'cover': doc.get('cover', '/public/default_cover.png'),
+            'cover2': doc.get('cover2', '/public/default_cover.png')
+        }, {'name': name})
+        return key
+
+    def song_refs(self, songs):
+        # Tham chiếu songId của album lấy từ catalog trong bộ nhớ, không đọc MongoDB
+        found = {}
+        for song_id in songrefs.song_ids(songs):
+            song = self.song_catalog.get(song_id)
+            if song is not None:
+                found[song_id] = songrefs.public_song(song)
+        return found
+
+    def upsert_album(self, doc):
+        keys = []
+        for album in album_entries(doc):
+            songs = album.get('songs', [])
+            # Album dạng cũ có thể chứa nhiều album trong một document
+            key = ('album', f"{doc['_id']}:{album['title']}" if 'title' not in doc else str(doc['_id']))
+            self.index.upsert(key, {
+                '_id': str(doc['_id']),
+                # Giao diện hiển thị album trong kết quả tìm kiếm với type 'list'
+                'type': 'list',
+                'name': album['title'],
+                'title': album['title'],
+                'artist': album.get('artist', 'Unknown Artist'),
+                'cover': album.get('cover', '/public/default_cover.png'),
+                'songs': [
+                    {k: str(v) if isinstance(v, ObjectId) else v for k, v in song.items()}
+                    for song in songrefs.hydrate(songs, self.song_refs(songs))
+                ]
+            }, {'title': album['title'], 'artist': album.get('artist')})
+            keys.append(key)
+        self._track_album(doc)
+        return keys
+
+    def _track_album(self, doc):
+        song_ids = {str(song_id) for album in album_entries(doc) for song_id in songrefs.song_ids(album.get('songs', []))}
+        with self._albums_lock:
+            self._untrack_album(doc['_id'])
+            self._albums[doc['_id']] = (doc, song_ids)
+            for song_id in song_ids:
+                self._albums_by_song.setdefault(song_id, set()).add(doc['_id'])
+
+    def _untrack_album(self, album_id):
+        # Gọi khi đang giữ _albums_lock
+        _, song_ids = self._albums.pop(album_id, (None, ()))
+        for song_id in song_ids:
+            albums = self._albums_by_song.get(song_id)
+            albums.discard(album_id)
+            if not albums:
+                del self._albums_by_song[song_id]
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+
+from . import media
+
+# Playlist, lịch sử danh sách và album chỉ lưu {'songId': ObjectId} (cộng các khóa riêng của phần tử
+# như entryId, artistId); các trường hiển thị được lấy từ songs khi đọc. Bài không khớp được bài nào
+# trong songs (dữ liệu cũ, đường dẫn lạ) vẫn được lưu nguyên bản sao như trước.
+SONG_PROJECTION = {'title': 1, 'artist': 1, 'genre': 1, 'file_path': 1, 'cover': 1}
+# Khóa của phần tử tham chiếu không được trả cho client
+PRIVATE_KEYS = ('songId', 'artistId')
+
+
+def song_path(song):
+    if not isinstance(song, dict):
+        return ''
+    return media.media_path(song.get('file_path') or song.get('src') or '') or ''
+
+
+def path_query(paths):
+    # songs.file_path có thể lưu có hoặc không có "/" đầu (xem catalog.normalize_file_path)
+    variants = {variant for path in paths for variant in (path, path.lstrip('/'))}
+    return {'file_path': {'$in': list(variants)}}
+
+
+def public_song(doc):
+    """Các trường hiển thị của một bài trong songs, cùng dạng bài hát của album."""
+    file_path = media.media_path(doc.get('file_path') or '')
+    return {
+        'songId': str(doc['_id']),
+        'title': doc.get('title'),
+        'artist': doc.get('artist', 'Unknown Artist'),
+        'genre': doc.get('genre'),
+        'file_path': file_path,
+        'src': file_path,
+        'cover': media.media_path(doc.get('cover')) or media.DEFAULT_COVER
+    }
+
+
+def to_refs(songs, ids_by_path, keep=()):
+    """Thay bài hát khớp đường dẫn bằng tham chiếu; ``keep`` là các khóa riêng của phần tử được giữ lại."""
+    refs = []
+    for song in songs:
+        song_id = ids_by_path.get(song_path(song))
+        if song_id is None:
+            refs.append(song)
+        else:
+            refs.append({**{key: song[key] for key in keep if key in song}, 'songId': song_id})
+    return refs
+
+
+def song_ids(entries):
+    return list(dict.fromkeys(
+        entry['songId'] for entry in entries if isinstance(entry, dict) and entry.get('songId') is not None
+    ))
+
+
+def hydrate(entries, songs):
+    """Phần tử tham chiếu -> bài hát đầy đủ (``songs``: _id -> public_song); bài đã bị xóa khỏi songs thì bỏ qua."""
+    result = []
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get('songId') is None:
+            result.append(entry)
+            continue
+        song = songs.get(entry['songId'])
+        if song is not None:
+            result.append({**song, **{k: v for k, v in entry.items() if k not in PRIVATE_KEYS}})
+    return result
+
+
+class SongCache:
+    """LRU các bài hát (dạng public_song) theo _id trong mỗi process.
+
+    Phần thiếu được lấy bằng một truy vấn $in cho cả request. Mục cũ hơn ``ttl`` giây bị đọc lại;
+    khi catalog bài hát chạy trong process, invalidate() (listener của SongCatalog) xóa ngay bài đã đổi.
+    """
+
+    def __init__(self, collection, max_entries=5000, ttl=300):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _split(self, ids):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for song_id in ids:
+                entry = self._entries.get(song_id)
+                if entry is not None and now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(song_id)
+                    found[song_id] = entry[1]
+                else:
+                    missing.append(song_id)
+        return found, missing
+
+    def _store(self, docs):
+        songs = {doc['_id']: public_song(doc) for doc in docs}
+        now = time.monotonic()
+        with self._lock:
+            for song_id, song in songs.items():
+                self._entries[song_id] = (now, song)
+                self._entries.move_to_end(song_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return songs
+
+    def get_many(self, ids):
+        found, missing = self._split(ids)
+        if missing:
+            found.update(self._store(self.collection.find({'_id': {'$in': missing}}, SONG_PROJECTION)))
+        return found
+
+    async def aget_many(self, collection, ids):
+        # ``collection``: collection songs của motor (async_views.mongo())
+        found, missing = self._split(ids)
+        if missing:
+            docs = await collection.find({'_id': {'$in': missing}}, SONG_PROJECTION).to_list(None)
+            found.update(self._store(docs))
+        return found
+
+    def ids_by_path(self, songs):
+        """Đường dẫn -> _id của bài trong songs, một truy vấn cho cả danh sách."""
+        paths = list({path for path in map(song_path, songs) if path})
+        if not paths:
+            return {}
+        docs = list(self.collection.find(path_query(paths), SONG_PROJECTION))
+        self._store(docs)
+        return {media.media_path(doc['file_path']): doc['_id'] for doc in docs}
+
+    async def aids_by_path(self, collection, songs):
+        paths = list({path for path in map(song_path, songs) if path})
+        if not paths:
+            return {}
+        docs = await collection.find(path_query(paths), SONG_PROJECTION).to_list(None)
+        self._store(docs)
+        return {media.media_path(doc['file_path']): doc['_id'] for doc in docs}
+
+    def invalidate(self, upserts, deletes):
+        with self._lock:
+            for song in upserts:
+                self._entries.pop(song['_id'], None)
+            for song_id in deletes:
+                self._entries.pop(song_id, None)
@@ -0,0 +1,180 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from .features import top_k_indices
+from .search_index import fold, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Trọng số loại gợi ý khi độ phổ biến bằng nhau: bài hát trước, rồi nghệ sĩ, rồi album
+TYPE_BOOST = {'song': 0.2, 'artist': 0.1, 'list': 0.0}
+# Cộng thêm khi tiền tố khớp từ đầu tên (không phải một từ ở giữa hoặc tên nghệ sĩ ghép sau)
+START_BOOST = 1.0
+
+
+def play_count_key(file_path):
+    return (file_path or '').lstrip('/')
+
+
+def count_play(write_behind, collection_name, file_path, spill=True):
+    """Tăng lượt nghe của một bài (ghi nền, không thứ tự); gọi khi bài được thêm vào lịch sử nghe.
+
+    Trả về kết quả của WriteBehindQueue.update (False nếu hàng đợi đầy và ``spill`` là False).
+    """
+    key = play_count_key(file_path)
+    if not key:
+        return True
+    return write_behind.update(collection_name, {'_id': key}, {'$inc': {'count': 1}}, upsert=True, ordered=False, spill=spill)
+
+
+def play_counts(playcounts_collection):
+    """Số lượt nghe của mỗi file_path (không có "/" đầu), đọc từ collection playcounts."""
+    return {doc['_id']: doc['count'] for doc in playcounts_collection.find({}, {'count': 1})}
+
+
+def popularity(count):
+    # log để vài bài rất hot không lấn át toàn bộ danh sách
+    return math.log1p(count)
+
+
+class PrefixIndex:
+    """Mảng khóa đã sắp xếp cho gợi ý theo tiền tố.
+
+    Mỗi mục được đánh chỉ mục theo tên đầy đủ (đã bỏ dấu) và theo từng hậu tố bắt đầu
+    tại một từ, nên "tung" khớp "Sơn Tùng". Một truy vấn là hai lần bisect để lấy dải khóa
+    khớp tiền tố, rồi chọn top-N theo trọng số tính sẵn; kết quả được cache theo tiền tố (LRU).
+    """
+
+    def __init__(self, entries, cache_size=1024):
+        """entries: danh sách (payload, văn bản, trọng số); payload được trả nguyên cho client."""
+        keys = []
+        for i, (_, text, _) in enumerate(entries):
+            words = tokenize(text)
+            for start in range(len(words)):
+                keys.append((' '.join(words[start:]), i, START_BOOST if start == 0 else 0.0))
+        keys.sort()
+        self.size = len(entries)
+        self._keys = [key for key, _, _ in keys]
+        self._owners = np.array([owner for _, owner, _ in keys], dtype=np.intp)
+        self._boosts = np.array([boost for _, _, boost in keys], dtype=np.float64)
+        self._weights = np.array([weight for _, _, weight in entries], dtype=np.float64)
+        self._payloads = [payload for payload, _, _ in entries]
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def suggest(self, prefix, limit):
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return ()
+        return self.lookup(prefix, limit)
+
+    def _lookup(self, prefix, limit):
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + '\uffff', lo)
+        if lo == hi:
+            return ()
+        owners = self._owners[lo:hi]
+        scores = self._weights[owners] + self._boosts[lo:hi]
+        # Một mục có thể khớp ở nhiều khóa: giữ khóa điểm cao nhất của mỗi mục
+        order = np.argsort(-scores, kind='stable')
+        _, first = np.unique(owners[order], return_index=True)
+        candidates = order[first]
+        best = owners[candidates[top_k_indices(scores[candidates], limit)]]
+        # tuple để kết quả trong cache không bị sửa từ bên ngoài
+        return tuple(self._payloads[i] for i in best)
+
+
+class Suggester:
+    """Gợi ý tìm kiếm (typeahead) cho bài hát, nghệ sĩ và album.
+
+    Dựng PrefixIndex từ các mục của CatalogSearch cộng với lượt nghe trong collection playcounts
+    (tăng dần khi người dùng nghe, xem count_play). Index được dựng lại ở nền khi index tìm kiếm
+    đổi (bài hát, nghệ sĩ hoặc album); lượt nghe được đọc lại sau mỗi refresh_interval giây.
+    """
+
+    def __init__(self, catalog_search, playcounts_collection, cache_size=1024, refresh_interval=600):
+        self.catalog_search = catalog_search
+        self.playcounts_collection = playcounts_collection
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self._index = None
+        self._search_version = None
+        self._counts = {}
+        self._counted_at = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def suggest(self, prefix, limit=8):
+        return self.index().suggest(prefix, limit)
+
+    def index(self):
+        self.catalog_search.ensure_loaded()
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._rebuild()
+        elif self._stale() and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+        return self._index
+
+    def _stale(self):
+        return (
+            self.catalog_search.index.version != self._search_version
+            or time.monotonic() - self._counted_at > self.refresh_interval
+        )
+
+    def _rebuild_in_background(self):
+        try:
+            with self._lock:
+                self._rebuild()
+        except Exception as e:
+            logger.error(f"Lỗi khi dựng lại index gợi ý: {e}")
+        finally:
+            self._rebuilding = False
+
+    def _rebuild(self):
+        start = time.monotonic()
+        if self._counted_at is None or time.monotonic() - self._counted_at > self.refresh_interval:
+            try:
+                self._counts = play_counts(self.playcounts_collection)
+            except Exception as e:
+                logger.error(f"Lỗi khi tính lượt nghe cho gợi ý: {e}")
+            self._counted_at = time.monotonic()
+
+        self.catalog_search.ensure_loaded()
+        version = self.catalog_search.index.version
+        documents = self.catalog_search.index.documents()
+        song_weights = {}
+        for doc in documents:
+            if doc['type'] == 'song':
+                song_weights[doc['_id']] = self._counts.get(play_count_key(doc.get('file_path')), 0)
+        artist_weights = {}
+        for doc in documents:
+            if doc['type'] == 'song':
+                artist = fold(doc.get('artist'))
+                artist_weights[artist] = artist_weights.get(artist, 0) + song_weights[doc['_id']]
+
+        entries = []
+        for doc in documents:
+            if doc['type'] == 'song':
+                count = song_weights[doc['_id']]
+                payload = {'type': 'song', '_id': doc['_id'], 'name': doc['title'], 'artist': doc['artist']}
+            elif doc['type'] == 'artist':
+                count = artist_weights.get(fold(doc['name']), 0)
+                payload = {'type': 'artist', '_id': doc['_id'], 'name': doc['name']}
+            else:
+                count = sum(self._counts.get(play_count_key(song.get('file_path')), 0) for song in doc.get('songs', []))
+                payload = {'type': doc['type'], '_id': doc['_id'], 'name': doc['title'], 'artist': doc['artist']}
+            # Ghép tên nghệ sĩ vào sau tên bài/album để gõ tên nghệ sĩ cũng gợi ý được tác phẩm của họ
+            text = payload['name'] if doc['type'] == 'artist' else f"{payload['name']} {payload['artist']}"
+            entries.append((payload, text, popularity(count) + TYPE_BOOST.get(payload['type'], 0.0)))
+
+        self._index = PrefixIndex(entries, self.cache_size)
+        self._search_version = version
+        logger.info(f"Đã dựng index gợi ý {len(entries)} mục sau {time.monotonic() - start:.2f}s")
@@ -0,0 +1,47 @@
+import os
+import uuid
+from unittest import SkipTest
+
+from django.test import SimpleTestCase
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# mongod dùng cho test (vd. docker run -p 27017:27017 mongo --replSet rs0); không có thì các test này bị bỏ qua
+TEST_MONGODB_URI = os.environ.get('TEST_MONGODB_URI', 'mongodb://localhost:27017/?directConnection=true')
+
+
+class MongoTestCase(SimpleTestCase):
+    """Test chạy trên mongod thật. Mỗi test có database riêng, bị xóa khi test xong."""
+
+    @classmethod
+    def setUpClass(cls):
+        client = MongoClient(TEST_MONGODB_URI, serverSelectionTimeoutMS=2000)
+        try:
+            cls.server = client.admin.command('hello')
+        except PyMongoError as e:
+            client.close()
+            raise SkipTest(f"Không kết nối được mongod ở {TEST_MONGODB_URI}: {e}")
+        cls.mongo = client
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.mongo.close()
+
+    def setUp(self):
+        super().setUp()
+        self.db = self.mongo[f'feelusic_test_{uuid.uuid4().hex[:12]}']
+        self.addCleanup(self.mongo.drop_database, self.db.name)
+
+    def motor_db(self):
+        # Cùng database của test qua motor (async_views, apaginate); gọi bên trong event loop đang chạy
+        client = AsyncIOMotorClient(TEST_MONGODB_URI)
+        self.addCleanup(client.close)
+        return client[self.db.name]
+
+    def require_replica_set(self):
+        # Change stream và transaction cần replica set (một node cũng được)
+        if 'setName' not in self.server:
+            self.skipTest("mongod không chạy dạng replica set")
@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase, override_settings
+
+from recommend import urls
+
+USER_ID = '000000000000000000000001'
+METHODS = ['get', 'post', 'put', 'delete']
+
+
+@override_settings(AUTH_ALLOW_LEGACY_USER_ID=False)
+class UserRoutesTest(SimpleTestCase):
+    """Mọi route có ``user_id`` trên URL đều qua kiểm tra token: không có token thì 401."""
+
+    def test_user_routes_require_token(self):
+        routes = [
+            '/' + str(pattern.pattern).replace('<str:user_id>', USER_ID)
+            for pattern in urls.urlpatterns if 'user_id' in pattern.pattern.converters
+        ]
+        self.assertTrue(routes)
+        for url in routes:
+            with self.subTest(url):
+                # Method không được phép trả 405 trước khi xét token; các method còn lại phải là 401
+                codes = {
+                    method: self.client.generic(method.upper(), url, '{}', content_type='application/json').status_code
+                    for method in METHODS
+                }
+                self.assertIn(401, codes.values(), codes)
+                self.assertEqual({code for code in codes.values() if code != 405}, {401}, codes)
@@ -0,0 +1,91 @@
+import datetime
+import time
+
+from django.test import override_settings
+
+from recommend.catalog import CatalogRefresher, SongCatalog
+from recommend.tests.mongo import MongoTestCase
+
+EMOTIONS = ['happy', 'sad']
+
+
+def song(title, emotion='happy', **fields):
+    return {
+        'title': title, 'artist': 'Test', 'genre': 'pop', 'emotion': emotion, 'bpm': 100,
+        'file_path': f'/songs/{title}.mp3', 'cover': '', 'updatedAt': datetime.datetime.utcnow(), **fields,
+    }
+
+
+@override_settings(CATALOG_REFRESH_ENABLED=False, CATALOG_POLL_INTERVAL=0.1, CATALOG_DELETE_SCAN_EVERY=1)
+class CatalogRefresherTest(MongoTestCase):
+    """Thêm/sửa/xóa bài hát trong songs_data phải tới được SongCatalog và các listener."""
+
+    def setUp(self):
+        super().setUp()
+        self.songs = self.db.songs_data
+        self.songs.insert_one(song('seed'))
+        self.catalog = SongCatalog(self.songs, EMOTIONS)
+        self.changes = []
+        self.catalog.add_listener(lambda upserts, deletes: self.changes.append((upserts, deletes)))
+        self.catalog.index()
+
+    def wait_for(self, predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("Catalog không nhận được thay đổi")
+            time.sleep(0.05)
+
+    def notified(self, song_id):
+        return any(song_id in [s['_id'] for s in upserts] for upserts, _ in self.changes)
+
+    def removed(self, song_id):
+        return any(song_id in deletes for _, deletes in self.changes)
+
+    def assert_changes_reach_catalog(self, sync):
+        song_id = self.songs.insert_one(song('new', 'sad')).inserted_id
+        sync(lambda: self.catalog.get(song_id) is not None)
+        self.assertTrue(self.notified(song_id))
+        self.assertEqual(self.catalog.get(song_id)['emotion'], 'sad')
+
+        self.changes.clear()
+        self.songs.update_one({'_id': song_id}, {'$set': {'title': 'renamed', 'updatedAt': datetime.datetime.utcnow()}})
+        sync(lambda: self.catalog.get(song_id)['title'] == 'renamed')
+        self.assertTrue(self.notified(song_id))
+
+        self.changes.clear()
+        self.songs.delete_one({'_id': song_id})
+        sync(lambda: self.catalog.get(song_id) is None)
+        self.assertTrue(self.removed(song_id))
+
+    @override_settings(CATALOG_CHANGE_STREAM=True)
+    def test_change_stream(self):
+        self.require_replica_set()
+        refresher = CatalogRefresher(self.catalog)
+        refresher.start()
+        self.addCleanup(refresher.join, 5)
+        self.addCleanup(refresher.stop)
+        # Stream đã mở khi refresher đồng bộ lại toàn bộ (version 1 -> 2)
+        self.wait_for(lambda: self.catalog._version >= 2)
+        self.assert_changes_reach_catalog(self.wait_for)
+
+    def test_poll_fallback(self):
+        refresher = CatalogRefresher(self.catalog)
+        refresher._init_watermarks()
+
+        def poll(predicate):
+            refresher._poll()
+            self.assertTrue(predicate())
+
+        self.assert_changes_reach_catalog(poll)
+
+    def test_poll_sees_update_without_newer_id(self):
+        # Bài cũ (_id nhỏ hơn watermark) chỉ được phát hiện qua updatedAt
+        refresher = CatalogRefresher(self.catalog)
+        refresher._init_watermarks()
+        self.songs.insert_one(song('later'))
+        refresher._poll()
+        seed_id = self.songs.find_one({'title': 'seed'})['_id']
+        self.songs.update_one({'_id': seed_id}, {'$set': {'bpm': 140, 'updatedAt': datetime.datetime.utcnow()}})
+        refresher._poll()
+        self.assertEqual(self.catalog.get(seed_id)['bpm'], 140.0)
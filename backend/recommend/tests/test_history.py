@@ -0,0 +1,96 @@
+import itertools
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.test import override_settings
+
+from recommend import views, writebehind
+from recommend.tests.mongo import MongoTestCase
+
+USER_ID = '000000000000000000000001'
+
+
+def song(i, title=None):
+    return {
+        'title': title or f'Bài {i}', 'artist': 'Test', 'file_path': f'/audio/{i}.mp3',
+        'cover': '/covers/a.png', 'listenedAt': datetime.now()
+    }
+
+
+def run_concurrently(fn, items, workers=16):
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(fn, items))
+
+
+class HistoryWriteTest(MongoTestCase):
+    """Ghi lịch sử nghe đồng thời: không trùng, tối đa 10 bài, không mất bài nào."""
+
+    def setUp(self):
+        super().setUp()
+        self.history = self.db.historysongs
+        self.history.create_index('userId', unique=True)
+
+    def add(self, entry):
+        self.history.update_one({'userId': USER_ID}, views.history_song_update('user', entry), upsert=True)
+
+    def stored(self):
+        return self.history.find_one({'userId': USER_ID})['songs']
+
+    def assert_unique(self, songs):
+        keys = [(s['title'].strip().lower(), s['file_path']) for s in songs]
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def test_no_lost_updates(self):
+        # Ít hơn 10 bài khác nhau: mọi bài phải còn, dù các update chạy cùng lúc
+        for _ in range(5):
+            self.history.delete_many({})
+            run_concurrently(self.add, [song(i) for i in range(9)])
+            self.assertEqual(sorted(s['file_path'] for s in self.stored()), sorted(f'/audio/{i}.mp3' for i in range(9)))
+
+    def test_capped_at_ten(self):
+        run_concurrently(self.add, [song(i) for i in range(50)])
+        songs = self.stored()
+        self.assertEqual(len(songs), 10)
+        self.assert_unique(songs)
+
+    def test_duplicates_collapse(self):
+        # Cùng bài với tiêu đề khác hoa thường/khoảng trắng vẫn là một bài
+        titles = ['Bài {}', ' bài {} ', 'BÀI {}']
+        run_concurrently(self.add, [song(i % 3, titles[i % 3].format(i % 3)) for i in range(60)])
+        songs = self.stored()
+        self.assertEqual(sorted(s['file_path'] for s in songs), ['/audio/0.mp3', '/audio/1.mp3', '/audio/2.mp3'])
+
+    def test_order_independent(self):
+        # Update phát lại muộn từ file spill tới sau update mới hơn: kết quả như khi ghi đúng thứ tự
+        start = datetime(2024, 1, 1)
+        entries = [{**song(i % 12), 'listenedAt': start + timedelta(seconds=i)} for i in range(15)]
+        for entry in entries:
+            self.add(entry)
+        expected = self.stored()
+        self.history.delete_many({})
+        for entry in reversed(entries):
+            self.add(entry)
+        self.assertEqual(self.stored(), expected)
+        self.assertEqual([s['file_path'] for s in expected[:3]], ['/audio/2.mp3', '/audio/1.mp3', '/audio/0.mp3'])
+
+
+@override_settings(WRITE_BEHIND_ENABLED=True)
+class WriteBehindHistoryTest(HistoryWriteTest):
+    """Như trên nhưng qua hàng đợi ghi nền của hai worker, flush cùng lúc."""
+
+    def setUp(self):
+        super().setUp()
+        spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spill_dir, ignore_errors=True)
+        self.queues = [writebehind.WriteBehindQueue(self.db, spill_dir, batch_size=4, flush_interval=60) for _ in range(2)]
+        self.turns = itertools.count()
+
+    def add(self, entry):
+        queue = self.queues[next(self.turns) % len(self.queues)]
+        queue.update(self.history.name, {'userId': USER_ID}, views.history_song_update('user', entry), upsert=True)
+
+    def stored(self):
+        run_concurrently(lambda queue: queue.flush(), self.queues)
+        return super().stored()
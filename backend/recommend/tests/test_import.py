@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+# Thời gian import tối đa (giây) của recommend.views trong một process mới, gồm cả django.setup()
+IMPORT_BUDGET = float(os.environ.get('IMPORT_BUDGET_SECONDS', '3'))
+HEAVY_MODULES = ('tensorflow', 'keras', 'cv2', 'pandas', 'sklearn')
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+import recommend.views as views
+elapsed = time.perf_counter() - start
+from recommend import inference
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': [name for name in %r if name in sys.modules],
+    'engine': inference._engine is not None,
+    'catalog': views.song_catalog._index is not None,
+}))
+""" % (HEAVY_MODULES,)
+
+
+class ViewsImportTest(SimpleTestCase):
+    """Import recommend.views phải nhẹ: không TensorFlow/OpenCV/pandas/sklearn, không model, không đọc songs."""
+
+    def import_views(self):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'feelusic.settings',
+            'EMOTION_WARMUP': 'False',
+            'SEARCH_INDEX_WARMUP': 'False',
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', SCRIPT], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_no_heavy_modules_or_model(self):
+        report = self.import_views()
+        self.assertEqual(report['loaded'], [])
+        self.assertFalse(report['engine'], "model cảm xúc bị tải khi import")
+        self.assertFalse(report['catalog'], "catalog bài hát bị đọc khi import")
+
+    def test_import_time_budget(self):
+        # Lần đầu có thể chậm vì chưa có .pyc; lấy lần nhanh nhất trong hai lần
+        elapsed = min(self.import_views()['elapsed'] for _ in range(2))
+        self.assertLess(elapsed, IMPORT_BUDGET, f"import recommend.views mất {elapsed:.2f}s")
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+from pymongo import IndexModel
+
+from recommend.indexes import INDEXES, QUERY_SHAPES, ensure_login_events, plan_stages, query_planner, winning_stages
+from recommend.tests.mongo import MongoTestCase
+
+
+class ExplainShapeTest(SimpleTestCase):
+    PLAN = {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}
+
+    def test_find_explain(self):
+        self.assertEqual(plan_stages(query_planner({'queryPlanner': self.PLAN})['winningPlan']), ['FETCH', 'IXSCAN'])
+
+    def test_aggregate_explain(self):
+        # Dạng explain của collection time-series
+        explain = {'stages': [{'$cursor': {'queryPlanner': self.PLAN}}, {'$_internalUnpackBucket': {}}, {'$sort': {}}]}
+        self.assertEqual(plan_stages(query_planner(explain)['winningPlan']), ['FETCH', 'IXSCAN'])
+
+
+class QueryPlanTest(MongoTestCase):
+    """Với các index của manage.py ensure_indexes, không truy vấn nóng nào được COLLSCAN."""
+
+    def setUp(self):
+        super().setUp()
+        from recommend.views import UserProfile
+
+        ensure_login_events(self.db, settings.LOGIN_HISTORY_TTL_DAYS, settings.LOGIN_EVENTS_TIMESERIES)
+        for collection, models in INDEXES.items():
+            self.db[collection].create_indexes(models)
+        self.db[UserProfile._meta['collection']].create_indexes([
+            IndexModel(spec['fields'], unique=spec.get('unique', False)) for spec in UserProfile._meta['index_specs']
+        ])
+        # Collection chưa tồn tại thì explain() trả về EOF thay vì plan thật
+        existing = set(self.db.list_collection_names())
+        for collection in {shape[1] for shape in QUERY_SHAPES} - existing:
+            self.db.create_collection(collection)
+
+    def test_no_collscan(self):
+        for name, collection, query, sort in QUERY_SHAPES:
+            with self.subTest(name):
+                stages = winning_stages(self.db, collection, query, sort)
+                self.assertNotIn('COLLSCAN', stages, f"{name}: {' <- '.join(stages)}")
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from recommend.inference import InferenceBusy, InferenceEngine
+
+
+class FailingBackend:
+    name = 'failing'
+
+    def predict_batch(self, inputs):
+        raise RuntimeError('backend hỏng')
+
+
+class BlockingBackend:
+    name = 'blocking'
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def predict_batch(self, inputs):
+        self.release.wait()
+        return np.zeros((len(inputs), 7), dtype=np.float32)
+
+
+class InferenceEngineTest(SimpleTestCase):
+
+    def test_backend_error_reaches_every_request(self):
+        engine = InferenceEngine(FailingBackend(), max_batch_size=4, max_wait_ms=50)
+        errors = []
+
+        def predict():
+            try:
+                engine.predict(np.zeros((48, 48, 1)), timeout=5)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=predict) for _ in range(4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual([str(e) for e in errors], ['backend hỏng'] * 4)
+
+    def test_bad_input_fails_batch_without_timeout(self):
+        # np.stack lỗi vì hai ảnh khác shape: cả hai request nhận lỗi ngay
+        engine = InferenceEngine(FailingBackend(), max_batch_size=2, max_wait_ms=200)
+        errors = []
+
+        def predict(shape):
+            try:
+                engine.predict(np.zeros(shape), timeout=5)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=predict, args=(shape,)) for shape in ((48, 48, 1), (24, 24, 1))]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(len(errors), 2)
+        self.assertFalse(any(isinstance(e, InferenceBusy) for e in errors))
+
+    def test_timeout_covers_queue_and_result(self):
+        backend = BlockingBackend()
+        self.addCleanup(backend.release.set)
+        engine = InferenceEngine(backend, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+        face = np.zeros((48, 48, 1))
+
+        def predict_ignoring_busy():
+            try:
+                engine.predict(face, timeout=5)
+            except InferenceBusy:
+                pass
+
+        # Worker kẹt ở ảnh đầu, ảnh thứ hai chiếm chỗ duy nhất trong hàng đợi
+        for _ in range(2):
+            threading.Thread(target=predict_ignoring_busy, daemon=True).start()
+            time.sleep(0.1)
+        # Chỗ trong hàng đợi được trả sau 0.2s: thời gian chờ kết quả chỉ còn phần còn lại của timeout
+        threading.Timer(0.2, engine._queue.get_nowait).start()
+        start = time.monotonic()
+        with self.assertRaises(InferenceBusy):
+            engine.predict(face, timeout=0.3)
+        self.assertLess(time.monotonic() - start, 0.45)
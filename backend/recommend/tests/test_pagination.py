@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from django.test import RequestFactory, SimpleTestCase
+
+from recommend import pagination
+from recommend.tests.mongo import MongoTestCase
+
+
+def request(**params):
+    return RequestFactory().get('/', params)
+
+
+class CursorTest(SimpleTestCase):
+
+    def test_timestamp_cursor_round_trip(self):
+        timestamp, last_id = datetime(2024, 5, 1, 12, 30, 0, 123000), ObjectId()
+        cursor = pagination.encode_cursor(timestamp, last_id)
+        self.assertEqual(pagination.decode_cursor(cursor, datetime), (timestamp, last_id))
+
+    def test_timestamp_cursor_requires_id(self):
+        # Cursor cũ chỉ có timestamp không phân xử được các bản ghi cùng mốc thời gian
+        cursor = pagination.encode_cursor(datetime(2024, 5, 1))
+        with self.assertRaises(pagination.InvalidPage):
+            pagination.decode_cursor(cursor, datetime)
+
+    def test_invalid_cursor(self):
+        for cursor in ('%%%', pagination.encode_cursor('abc')):
+            with self.assertRaises(pagination.InvalidPage):
+                pagination.decode_cursor(cursor)
+
+
+class KeysetPageTest(MongoTestCase):
+    """Trang theo timestamp không bỏ sót hay lặp lại bản ghi cùng mốc thời gian ở ranh giới trang."""
+
+    def setUp(self):
+        super().setUp()
+        self.events = self.db.loginevents
+        start = datetime(2024, 5, 1)
+        # 7 mốc thời gian, mỗi mốc 4 bản ghi: ranh giới trang 5 bản luôn rơi giữa một nhóm trùng
+        self.events.insert_many([
+            {'userId': 'u', 'timestamp': start + timedelta(minutes=minute), 'n': minute * 4 + i}
+            for minute in range(7) for i in range(4)
+        ])
+        self.events.insert_one({'userId': 'other', 'timestamp': start, 'n': -1})
+
+    def pages(self, descending):
+        return asyncio.run(self.apages(descending))
+
+    async def apages(self, descending):
+        events = self.motor_db()[self.events.name]
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 5, **({'cursor': cursor} if cursor else {})}
+            docs, cursor = await pagination.apaginate(
+                events, {'userId': 'u'}, {'timestamp': 1, 'n': 1}, request(**params),
+                sort_field='timestamp', descending=descending
+            )
+            seen.extend(docs)
+            if cursor is None:
+                return seen
+
+    def test_descending(self):
+        docs = self.pages(descending=True)
+        self.assertEqual(sorted(doc['n'] for doc in docs), list(range(28)))
+        keys = [(doc['timestamp'], doc['_id']) for doc in docs]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_ascending(self):
+        docs = self.pages(descending=False)
+        self.assertEqual(sorted(doc['n'] for doc in docs), list(range(28)))
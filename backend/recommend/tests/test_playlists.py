@@ -0,0 +1,145 @@
+import asyncio
+
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from recommend import auth, playlists
+from recommend.tests.mongo import MongoTestCase
+
+USER_ID = '000000000000000000000001'
+
+
+class BatchTest(SimpleTestCase):
+
+    def test_reorder_rejects_duplicate_entry_ids(self):
+        with self.assertRaises(ValueError):
+            playlists.batch(USER_ID, [{'op': 'reorder', 'playlistId': 'p', 'entryIds': ['a', 'b', 'a']}], {})
+
+    def test_move_requires_entry_in_playlist(self):
+        mutation, _ = playlists.batch(USER_ID, [{'op': 'move', 'playlistId': 'p', 'entryId': 'e', 'position': 0}], {})
+        self.assertIn({'playlists': {'$elemMatch': {'id': 'p', 'songs.entryId': 'e'}}}, mutation.filter['$and'])
+
+
+@override_settings(AUTH_ALLOW_LEGACY_USER_ID=False)
+class PlaylistAuthTest(SimpleTestCase):
+    """View playlist chỉ nhận access token của chính user trong URL."""
+
+    VIEWS = [
+        ('get', 'get_my_playlist'),
+        ('post', 'create_new_playlist'),
+        ('post', 'add_to_playlist'),
+        ('delete', 'delete_playlist'),
+        ('put', 'edit_playlist'),
+        ('delete', 'remove_song_from_playlist'),
+        ('post', 'playlist_ops'),
+    ]
+
+    def request(self, method, name, **headers):
+        url = reverse(name, args=[USER_ID])
+        return self.client.generic(method.upper(), url, '{}', content_type='application/json', **headers)
+
+    def test_requires_token(self):
+        for method, name in self.VIEWS:
+            with self.subTest(name):
+                self.assertEqual(self.request(method, name).status_code, 401)
+
+    def test_rejects_other_users_token(self):
+        other = auth.TokenUser(str(ObjectId()), 'khác')
+        token = auth.issue_tokens(other)['accessToken']
+        for method, name in self.VIEWS:
+            with self.subTest(name):
+                self.assertEqual(self.request(method, name, HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 403)
+
+
+class PlaylistConcurrencyTest(MongoTestCase):
+    """Thao tác playlist đồng thời của một user: không mất thao tác, không vượt MAX_PLAYLISTS.
+
+    Không tạo index unique trên myplaylist.userId: acreate không được dựa vào nó.
+    """
+
+    N = 20
+
+    def run_async(self, coroutine_fn):
+        async def main():
+            return await coroutine_fn(self.motor_db()['myplaylist'])
+        return asyncio.run(main())
+
+    def stored(self):
+        docs = list(self.db.myplaylist.find({'userId': USER_ID}))
+        self.assertEqual(len(docs), 1, 'mỗi user chỉ có một document myplaylist')
+        return docs[0]['playlists']
+
+    def create_many(self, n):
+        async def create(collection):
+            return await asyncio.gather(*(
+                playlists.acreate(collection, USER_ID, playlists.new_id()) for _ in range(n)
+            ))
+        return self.run_async(create)
+
+    def test_parallel_creates_new_user(self):
+        results = self.create_many(self.N)
+        self.assertEqual(sum(1 for r in results if r.modified_count), playlists.MAX_PLAYLISTS)
+        stored = self.stored()
+        self.assertEqual(len(stored), playlists.MAX_PLAYLISTS)
+        self.assertEqual(len({p['id'] for p in stored}), playlists.MAX_PLAYLISTS)
+
+    def test_parallel_creates_existing_document(self):
+        # Document cũ có _id ngẫu nhiên: không được tạo thêm document thứ hai với _id cố định
+        self.db.myplaylist.insert_one({'_id': ObjectId(), 'userId': USER_ID, 'playlists': []})
+        self.create_many(self.N)
+        self.assertEqual(len(self.stored()), playlists.MAX_PLAYLISTS)
+
+    def test_parallel_adds(self):
+        self.create_many(playlists.MAX_PLAYLISTS)
+        playlist_ids = [p['id'] for p in self.stored()]
+        entries = [
+            (playlist_ids[i % len(playlist_ids)], playlists.new_entry({'title': f'Bài {i}', 'artist': 'Test', 'file_path': f'/audio/{i}.mp3'}))
+            for i in range(self.N * 5)
+        ]
+
+        async def add(collection):
+            return await asyncio.gather(*(
+                playlists.aapply(collection, playlists.add_songs(USER_ID, playlist_id, [entry]))
+                for playlist_id, entry in entries
+            ))
+        results = self.run_async(add)
+
+        self.assertTrue(all(r.modified_count == 1 for r in results))
+        stored = {p['id']: [s['entryId'] for s in p['songs']] for p in self.stored()}
+        for playlist_id in playlist_ids:
+            expected = [entry['entryId'] for target, entry in entries if target == playlist_id]
+            self.assertCountEqual(stored[playlist_id], expected)
+
+    def test_parallel_adds_and_removes(self):
+        self.create_many(1)
+        playlist_id = self.stored()[0]['id']
+        kept = [playlists.new_entry({'title': f'Giữ {i}', 'artist': 'Test'}) for i in range(self.N)]
+        removed = [playlists.new_entry({'title': f'Xóa {i}', 'artist': 'Test'}) for i in range(self.N)]
+        self.db.myplaylist.update_one(
+            {'userId': USER_ID, 'playlists.id': playlist_id},
+            {'$push': {'playlists.$.songs': {'$each': removed}}}
+        )
+
+        async def edit(collection):
+            await asyncio.gather(
+                *(playlists.aapply(collection, playlists.add_songs(USER_ID, playlist_id, [entry])) for entry in kept),
+                *(playlists.aapply(collection, playlists.remove_entries(USER_ID, playlist_id, [entry['entryId']])) for entry in removed)
+            )
+        self.run_async(edit)
+
+        self.assertCountEqual([s['entryId'] for s in self.stored()[0]['songs']], [entry['entryId'] for entry in kept])
+
+
+class BatchWriteTest(MongoTestCase):
+    """Lô playlist-ops hoặc áp toàn bộ hoặc không áp gì."""
+
+    def test_move_unknown_entry_rejects_batch(self):
+        entry = playlists.new_entry({'title': 'Bài 1', 'artist': 'Test'})
+        self.db.myplaylist.insert_one({'userId': USER_ID, 'playlists': [{'id': 'p', 'title': 'A', 'songs': [entry]}]})
+        mutation, _ = playlists.batch(USER_ID, [
+            {'op': 'rename', 'playlistId': 'p', 'title': 'B'},
+            {'op': 'move', 'playlistId': 'p', 'entryId': playlists.new_id(), 'position': 0}
+        ], {})
+        self.assertIsNone(self.db.myplaylist.find_one_and_update(mutation.filter, mutation.update))
+        self.assertEqual(self.db.myplaylist.find_one({'userId': USER_ID})['playlists'][0]['title'], 'A')
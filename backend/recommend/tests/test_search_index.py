@@ -0,0 +1,32 @@
+from django.test import override_settings
+
+from recommend.catalog import SongCatalog
+from recommend.search_index import CatalogSearch
+from recommend.tests.mongo import MongoTestCase
+from recommend.tests.test_catalog import EMOTIONS, song
+
+
+@override_settings(CATALOG_REFRESH_ENABLED=False)
+class AlbumSongRefsTest(MongoTestCase):
+    """Album trong index tìm kiếm lưu songId: sửa/xóa bài trong catalog phải tới được payload album."""
+
+    def setUp(self):
+        super().setUp()
+        self.song_id = self.db.songs.insert_one(song('cũ')).inserted_id
+        self.db.albums.insert_one({'title': 'Album Một', 'artist': 'Test', 'songs': [{'songId': self.song_id}]})
+        self.catalog = SongCatalog(self.db.songs, EMOTIONS)
+        self.search = CatalogSearch(self.catalog, self.db.artists, self.db.albums)
+        self.search.ensure_loaded()
+
+    def album_songs(self):
+        [album] = [doc for doc in self.search.search('album mot') if doc['type'] == 'list']
+        return album['songs']
+
+    def test_song_update_reaches_album(self):
+        self.assertEqual([s['title'] for s in self.album_songs()], ['cũ'])
+        self.catalog.apply_changes(upserts=[{**song('mới'), '_id': self.song_id}])
+        self.assertEqual([s['title'] for s in self.album_songs()], ['mới'])
+
+    def test_song_delete_reaches_album(self):
+        self.catalog.apply_changes(deletes=[self.song_id])
+        self.assertEqual(self.album_songs(), [])
@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from bson import json_util
+
+from recommend import writebehind
+from recommend.tests.mongo import MongoTestCase
+
+
+def dead_pid():
+    # pid của một process đã kết thúc
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class SpillReplayTest(MongoTestCase):
+    """File spill được phát lại đủ, kể cả file đang phát lại dở của process đã chết, và chỉ bị xóa sau khi ghi."""
+
+    def setUp(self):
+        super().setUp()
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir, ignore_errors=True)
+        self.queue = writebehind.WriteBehindQueue(self.db, self.spill_dir)
+
+    def write_spill(self, name, docs):
+        with open(os.path.join(self.spill_dir, name), 'w', encoding='utf-8') as f:
+            for doc in docs:
+                op = {'c': 'events', 'op': 'insert', 'doc': doc, 'ordered': False}
+                f.write(json_util.dumps(op, json_options=writebehind._JSON_OPTIONS) + '\n')
+
+    def test_replays_spill_and_orphaned_claim(self):
+        self.write_spill('writebehind-1.jsonl', [{'n': 1}, {'n': 2}])
+        self.write_spill(f'writebehind-2.jsonl.replaying-{dead_pid()}', [{'n': 3}])
+        self.queue.replay_spills()
+        self.assertEqual(sorted(doc['n'] for doc in self.db.events.find()), [1, 2, 3])
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_spill_writes_separate_finished_files(self):
+        for n in (1, 2):
+            self.assertTrue(self.queue._spill([{'c': 'events', 'op': 'insert', 'doc': {'n': n}, 'ordered': False}]))
+        names = os.listdir(self.spill_dir)
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(name.startswith(f'writebehind-{os.getpid()}-') and name.endswith('.jsonl') for name in names))
+        self.queue.replay_spills()
+        self.assertEqual(sorted(doc['n'] for doc in self.db.events.find()), [1, 2])
+
+    def test_skips_unfinished_spill(self):
+        # Worker khác đang ghi file này: chưa được đổi tên sang .jsonl
+        name = 'writebehind-5-0.jsonl.partial'
+        self.write_spill(name, [{'n': 6}])
+        self.queue.replay_spills()
+        self.assertEqual(self.db.events.count_documents({}), 0)
+        self.assertEqual(os.listdir(self.spill_dir), [name])
+
+    def test_leaves_claim_of_live_process(self):
+        # Worker khác (còn sống) đang phát lại file này
+        name = f'writebehind-3.jsonl.replaying-{os.getppid()}'
+        self.write_spill(name, [{'n': 4}])
+        self.queue.replay_spills()
+        self.assertEqual(self.db.events.count_documents({}), 0)
+        self.assertEqual(os.listdir(self.spill_dir), [name])
+
+    def test_keeps_file_when_ops_cannot_be_saved(self):
+        self.write_spill('writebehind-4.jsonl', [{'n': 5}])
+        self.queue._write = lambda ops: False
+        self.queue.replay_spills()
+        self.assertEqual(os.listdir(self.spill_dir), [f'writebehind-4.jsonl.replaying-{os.getpid()}'])
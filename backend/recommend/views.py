@@ -1,21 +1,20 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.response import Response
 from rest_framework import status
 from mongoengine import connect, Document, fields, get_db
 from mongoengine.queryset.visitor import Q
-import bcrypt
 import logging
-import tensorflow as tf
 import numpy as np
-import cv2
-import pandas as pd
 from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
 from bson import ObjectId
 import re
 import os
 from dotenv import load_dotenv
 import traceback
+from django.conf import settings
+from pymongo import UpdateOne
+from . import auth, cache, catalog, inference, media, passwords, search_index, songrefs, suggest, writebehind
+from .features import artist_names, genre_tags
 
 # Cấu hình logging
 logging.basicConfig(level=logging.DEBUG)
@@ -32,19 +31,12 @@ artists_collection = db['artists']
 albums_collection = db['albums']
 historysongs_collection = db['historysongs']
 historylists_collection = db['historylists']
-loginhistory_collection = db['loginhistory']
+loginevents_collection = db['loginevents']  # một document cho mỗi lần đăng nhập, xem indexes.ensure_login_events
 myplaylist_collection = db['myplaylist']
-
-# Load mô hình Keras
-try:
-    model = tf.keras.models.load_model('model/emotion_model.keras')
-    logger.debug("Mô hình được tải thành công!")
-    logger.debug(f"Input shape of model: {model.input_shape}")
-    logger.debug(f"Output shape of model: {model.output_shape}")
-except Exception as e:
-    logger.error(f"Lỗi tải mô hình: {e}")
-    model = None
-    raise
+list_collection = db['list']
+recommendations_collection = db['recommendations']  # playlist tính sẵn bởi manage.py precompute_recommendations
+meta_collection = db['meta']
+playcounts_collection = db['playcounts']  # lượt nghe theo file_path, tăng khi bài được thêm vào lịch sử nghe
 
 # Định nghĩa 7 lớp của mô hình
 model_emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
@@ -58,47 +50,83 @@ emotion_mapping = {
     'neutral': 'neutral'
 }
 final_emotions = ['happy', 'sad', 'neutral']
-IMG_SIZE = 48
 
-# Tải dữ liệu từ songs
-try:
-    songs_data = pd.DataFrame(list(songs_collection.find()), columns=[
-        'title', 'artist', 'genre', 'emotion', 'bpm', 'file_path', 'cover'
-    ]).fillna({'file_path': '', 'cover': ''})
-    songs_data = songs_data[songs_data['emotion'].str.lower().isin([e.lower() for e in final_emotions])]
-    logger.debug(f"Đã tải {len(songs_data)} bài hát từ songs_collection với 3 cảm xúc.")
-except Exception as e:
-    logger.error(f"Lỗi tải songs_data: {e}")
-    songs_data = pd.DataFrame()
+# Ghi nền cho lịch sử và analytics: response không chờ MongoDB
+write_behind = writebehind.WriteBehindQueue(
+    db, settings.WRITE_BEHIND_SPILL_DIR,
+    batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+    max_queue=settings.WRITE_BEHIND_MAX_QUEUE
+)
+
+# Phiên bản của albums/list/artists: view ghi tăng lên, view đọc cache response theo nó
+catalog_version = cache.CatalogVersion(meta_collection, ttl=settings.CATALOG_VERSION_TTL)
+
+# Album/list trả về cho client: các trường của album phẳng, bỏ ObjectId nội bộ
+ALBUM_PROJECTION = {
+    **{field: 1 for field in media.ALBUM_FIELDS if field != 'songs'},
+    **{f'songs.{field}': 1 for field in media.ALBUM_SONG_FIELDS},
+    'songs.songId': 1
+}
 
-def recommend_songs(emotion, top_k=30):
-    if songs_data.empty:
+# Catalog bài hát: tải ở lần dùng đầu tiên, xếp hạng sẵn theo từng cảm xúc
+song_catalog = catalog.SongCatalog(songs_collection, final_emotions)
+# Phiên bản songs: playlist tính sẵn chỉ được dùng khi tính từ đúng phiên bản này
+songs_version = catalog.SongsVersion(songs_collection, ttl=settings.CATALOG_VERSION_TTL)
+# Bài hát cho các tham chiếu songId (playlist, lịch sử danh sách, album); bài đổi trong catalog bị xóa khỏi cache
+song_cache = songrefs.SongCache(songs_collection, settings.SONG_CACHE_SIZE, settings.SONG_CACHE_TTL)
+song_catalog.add_listener(song_cache.invalidate)
+# Index tìm kiếm (bài hát, nghệ sĩ, album) trong bộ nhớ, cập nhật theo catalog
+catalog_search = search_index.CatalogSearch(
+    song_catalog, artists_collection, albums_collection, settings.SEARCH_INDEX_REFRESH_INTERVAL, catalog_version
+)
+# Gợi ý khi gõ (typeahead), xếp theo lượt nghe trong playcounts
+suggester = suggest.Suggester(
+    catalog_search, playcounts_collection, settings.SUGGEST_CACHE_SIZE, settings.SUGGEST_REFRESH_INTERVAL
+)
+
+def recommend_songs(emotion, top_k=30, seed_song_id=None):
+    if seed_song_id is not None and not isinstance(seed_song_id, ObjectId):
+        seed_song_id = ObjectId(seed_song_id) if ObjectId.is_valid(seed_song_id) else None
+    playlist = song_catalog.index().recommend(emotion, top_k, seed_song_id)
+    if not playlist:
         logger.warning("Không có bài hát trong songs_data, trả về playlist rỗng.")
-        return []
-    filtered_songs = songs_data[songs_data['emotion'].str.lower() == emotion.lower()]
-    if filtered_songs.empty:
-        filtered_songs = songs_data[songs_data['emotion'].str.lower().isin([e.lower() for e in final_emotions])]
-    features = filtered_songs[['bpm']].values
-    if len(features) > 1:
-        similarity = cosine_similarity(features)
-        indices = np.argsort(similarity.mean(axis=1))[-top_k:][::-1]
-    else:
-        indices = range(min(top_k, len(filtered_songs)))
-    playlist = filtered_songs.iloc[indices][['title', 'artist', 'genre', 'file_path', 'cover']].to_dict('records')
-    for song in playlist:
-        if song['file_path'] and not song['file_path'].startswith('/'):
-            song['file_path'] = f"/{song['file_path']}"
-        logger.debug(f"Adjusted song: {song}")
     return playlist
 
+def get_precomputed_playlist(emotion, user_id=None):
+    # Một lần đọc theo _id: ưu tiên playlist riêng của người dùng, sau đó playlist chung của cảm xúc
+    keys = [f'emotion:{emotion}']
+    if user_id and ObjectId.is_valid(user_id):
+        keys.insert(0, f'user:{user_id}:{emotion}')
+    # Playlist tính từ songs cũ (bài đã thêm/sửa/xóa sau lượt precompute) bị bỏ qua, gợi ý trực tiếp thay thế
+    query = {'_id': {'$in': keys}, 'catalogVersion': songs_version.get()}
+    docs = {doc['_id']: doc for doc in recommendations_collection.find(query, {'songs': 1})}
+    for key in keys:
+        if key in docs:
+            return docs[key]['songs']
+    return None
+
+def get_playlist(emotion, user_id=None, seed_song_id=None):
+    if not seed_song_id:
+        playlist = get_precomputed_playlist(emotion, user_id)
+        if playlist is not None:
+            return playlist
+        logger.debug(f"Chưa có playlist tính sẵn cho '{emotion}', gợi ý trực tiếp từ catalog")
+    return recommend_songs(emotion, seed_song_id=seed_song_id)
+
 class UserProfile(Document):
     username = fields.StringField(required=True, unique=True)
     email = fields.EmailField(unique=True)
     password = fields.StringField(required=True)
     phone = fields.StringField()
+    # Tăng lên để thu hồi mọi refresh token đã cấp (xem auth.revoke)
+    token_version = fields.IntField(default=0)
     meta = {'collection': 'recommend_userprofile'}
 
+user_scoped = auth.user_scoped(UserProfile)
+
 @api_view(['POST'])
+@authentication_classes([])
 def register(request):
     try:
         data = request.data
@@ -120,7 +148,7 @@ def register(request):
             logger.info(f"Email already exists: {email}")
             return Response({'message': 'Email đã tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
 
-        hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        hashed_pw = passwords.hasher.hash(password)
         new_user = UserProfile(
             username=username,
             email=email,
@@ -130,11 +158,15 @@ def register(request):
         new_user.save()
         logger.info(f"User registered successfully: {username}, id: {new_user.id}")
         return Response({'message': 'Đăng ký thành công'}, status=status.HTTP_201_CREATED)
+    except passwords.HasherBusy:
+        logger.warning("Hàng đợi băm mật khẩu đầy, từ chối đăng ký")
+        return Response({'message': 'Máy chủ đang bận, vui lòng thử lại'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         logger.error(f"Register error: {str(e)}\n{traceback.format_exc()}")
         return Response({'message': f"Lỗi server: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
+@authentication_classes([])  # token cũ/hết hạn trong header không được chặn đăng nhập
 def login_view(request):
     try:
         username = request.data.get('username')
@@ -150,44 +182,66 @@ def login_view(request):
             logger.info(f"User not found: {username}")
             return Response({'message': 'Người dùng không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
+        if not passwords.hasher.check(password, user.password):
             logger.info(f"Wrong password for user: {username}")
             return Response({'message': 'Mật khẩu sai'}, status=status.HTTP_400_BAD_REQUEST)
 
+        if passwords.hasher.needs_rehash(user.password):
+            # Chỉ ghi nếu mật khẩu chưa bị đổi trong lúc băm lại
+            old_hash = user.password
+            passwords.hasher.rehash_later(
+                password,
+                lambda new_hash: UserProfile.objects(id=user.id, password=old_hash).update(password=new_hash)
+            )
+
         user_id = str(user.id)
         device = request.headers.get('User-Agent', 'Unknown Device')
-        loginhistory_collection.update_one(
-            {'userId': user_id},
-            {
-                '$set': {'username': username},
-                '$push': {
-                    'logins': {
-                        'timestamp': datetime.now(),
-                        'device': device
-                    }
-                }
-            },
-            upsert=True
-        )
+        write_behind.insert(loginevents_collection.name, {
+            'userId': user_id,
+            'username': username,
+            'timestamp': datetime.now(),
+            'device': device
+        })
         logger.info(f"Login successful for user: {username}, user_id: {user_id}")
         return Response({
             'message': 'Đăng nhập thành công',
             'userId': user_id,
-            'username': username
+            'username': username,
+            **auth.issue_tokens(user)
         }, status=status.HTTP_200_OK)
+    except passwords.HasherBusy:
+        logger.warning("Hàng đợi băm mật khẩu đầy, từ chối đăng nhập")
+        return Response({'message': 'Máy chủ đang bận, vui lòng thử lại'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         logger.error(f"Login error: {str(e)}\n{traceback.format_exc()}")
         return Response({'message': f"Lỗi server: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@authentication_classes([])
+def refresh_token(request):
+    try:
+        token = request.data.get('refreshToken')
+        if not token:
+            return Response({'error': 'Thiếu refreshToken'}, status=status.HTTP_400_BAD_REQUEST)
+        tokens = auth.refresh_tokens(token, UserProfile)
+        return Response(tokens, status=status.HTTP_200_OK)
+    except auth.AuthenticationFailed as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    except Exception as e:
+        logger.error(f"Lỗi khi làm mới token: {str(e)}\n{traceback.format_exc()}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['POST'])
 def predict_emotion(request):
     try:
-        if model is None:
+        user_id = request.data.get('userId')
+        emotion_engine = inference.get_engine()
+        if emotion_engine is None:
             logger.warning("Mô hình không được tải, sử dụng emotion mặc định")
             return Response({
                 'emotion': 'neutral',
                 'confidence': 0.0,
-                'playlist': recommend_songs('neutral')
+                'playlist': get_playlist('neutral', user_id)
             }, status=status.HTTP_200_OK)
 
         if 'image' not in request.FILES:
@@ -195,63 +249,48 @@ def predict_emotion(request):
             return Response({'error': 'Không có ảnh được gửi'}, status=status.HTTP_400_BAD_REQUEST)
 
         image_file = request.FILES['image']
-        image_data = np.frombuffer(image_file.read(), np.uint8)
-        image = cv2.imdecode(image_data, cv2.IMREAD_GRAYSCALE)
+        from . import face  # import muộn: OpenCV chỉ được tải khi có request dự đoán
+        image = face.decode_image(image_file.read())
         logger.debug(f"Ảnh đầu vào shape: {image.shape if image is not None else 'None'}")
 
         if image is None:
             logger.error("Không đọc được ảnh")
             return Response({'error': 'Không đọc được ảnh'}, status=status.HTTP_400_BAD_REQUEST)
 
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(image, scaleFactor=1.1, minNeighbors=4)
-        logger.debug(f"Số khuôn mặt phát hiện: {len(faces)}")
-
-        if len(faces) == 0:
+        face_image = face.extract_face(image)
+        if face_image is None:
             logger.debug("Không phát hiện khuôn mặt, sử dụng emotion mặc định 'neutral'.")
             return Response({
                 'emotion': 'neutral',
                 'confidence': 0.0,
-                'playlist': recommend_songs('neutral')
+                'playlist': get_playlist('neutral', user_id)
             }, status=status.HTTP_200_OK)
+        logger.debug(f"Khuôn mặt sau xử lý shape: {face_image.shape}")
 
-        image = cv2.resize(image, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)
-        if image.shape != (IMG_SIZE, IMG_SIZE):
-            logger.error(f"Kích thước ảnh sau resize không đúng: {image.shape}")
-            return Response({'error': 'Kích thước ảnh sau resize không đúng'}, status=status.HTTP_400_BAD_REQUEST)
-
-        image = image / 255.0
-        image = np.expand_dims(image, axis=[0, -1])
-        logger.debug(f"Hình ảnh sau xử lý shape: {image.shape}")
-
-        prediction = model.predict(image, verbose=0)
+        prediction = emotion_engine.predict(face_image, timeout=settings.EMOTION_PREDICT_TIMEOUT)
         logger.debug(f"Dự đoán thô: {prediction}")
 
-        if prediction.size == 0 or len(prediction.shape) < 2:
+        if prediction.size == 0 or prediction.ndim != 1:
             logger.error(f"Dự đoán không hợp lệ, shape: {prediction.shape}")
             return Response({'error': 'Dự đoán không hợp lệ'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        emotion_idx = np.argmax(prediction[0])
+        emotion_idx = np.argmax(prediction)
         if emotion_idx >= len(model_emotions) or emotion_idx < 0:
             logger.error(f"Chỉ số cảm xúc không hợp lệ: {emotion_idx}")
             return Response({'error': 'Chỉ số cảm xúc không hợp lệ'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         model_emotion = model_emotions[emotion_idx]
         final_emotion = emotion_mapping[model_emotion]
-        confidence = float(prediction[0][emotion_idx])
+        confidence = float(prediction[emotion_idx])
         logger.debug(f"Mô hình emotion: {model_emotion}, Final emotion: {final_emotion}")
 
-        playlist = recommend_songs(final_emotion) if not songs_data.empty else []
-        try:
-            history_collection.insert_one({
-                'emotion': final_emotion,
-                'confidence': confidence,
-                'timestamp': datetime.now().isoformat()
-            })
-            logger.debug("Dữ liệu đã lưu vào MongoDB.")
-        except Exception as e:
-            logger.error(f"Lỗi lưu vào MongoDB: {e}")
-            return Response({'error': f'Lỗi lưu vào MongoDB: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        playlist = get_playlist(final_emotion, user_id, request.data.get('seedSongId'))
+        # Thống kê cảm xúc không ảnh hưởng tới response: ghi nền, không trả 500 khi MongoDB lỗi
+        write_behind.insert(history_collection.name, {
+            'emotion': final_emotion,
+            'confidence': confidence,
+            'timestamp': datetime.now().isoformat()
+        })
 
         return Response({
             'emotion': final_emotion,
@@ -259,6 +298,9 @@ def predict_emotion(request):
             'playlist': playlist,
             'note': 'Playlist rỗng nếu không có bài hát trong songs collection' if not playlist else ''
         }, status=status.HTTP_200_OK)
+    except inference.InferenceBusy:
+        logger.warning("Hàng đợi suy luận cảm xúc đầy hoặc quá thời hạn")
+        return Response({'error': 'Máy chủ đang bận, vui lòng thử lại'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         logger.error(f"Lỗi trong predict_emotion: {str(e)}\n{traceback.format_exc()}")
         return Response({
@@ -281,372 +323,66 @@ def test_mongo(request):
         logger.error(f"Lỗi trong test_mongo: {str(e)}\n{traceback.format_exc()}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-def get_albums(request):
-    try:
-        albums = list(albums_collection.find().limit(100))
-        processed_albums = []
-        for album in albums:
-            logger.debug(f"Raw album data: {album}")
-            album_id = str(album.get('_id', ''))
-            for key, value in album.items():
-                if isinstance(value, dict) and 'artist' in value and 'songs' in value:
-                    title = key
-                    artist = value.get('artist', 'Unknown Artist')
-                    cover = value.get('cover', '/public/default_cover.png')
-                    if isinstance(cover, str):
-                        if cover.startswith("public\\") or cover.startswith("public/"):
-                            cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-                        if not cover.lower().endswith(('.png', '.jpg', '.jpeg')):
-                            cover = '/public/default_cover.png'
-                    else:
-                        cover = '/public/default_cover.png'
-                    songs = value.get('songs', [])
-                    for song in songs:
-                        if 'cover' in song and song['cover'].startswith("public\\"):
-                            song['cover'] = '/' + song['cover'].replace('\\', '/').removeprefix('public/')
-                        if 'src' in song and song['src'].startswith("public\\"):
-                            song['file_path'] = '/' + song['src'].replace('\\', '/').removeprefix('public/')
-                    processed_albums.append({
-                        '_id': album_id,
-                        'title': title,
-                        'artist': artist,
-                        'cover': cover,
-                        'songs': songs
-                    })
-                    logger.debug(f"Processed album: {title}, artist: {artist}, songs: {len(songs)}")
-        logger.info(f"Đã lấy và chuẩn hóa {len(processed_albums)} album")
-        return Response({
-            'message': 'Lấy album thành công',
-            'count': len(processed_albums),
-            'data': processed_albums
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy album: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_list(request):
+def recent_history(field, entry, duplicate, size=10):
+    """Biểu thức pipeline: chèn entry vào mảng ``field`` (mới nhất trước theo listenedAt), bỏ bản cũ hơn
+    khớp ``duplicate`` ($$this), giữ ``size`` phần tử.
+
+    Vị trí tính theo listenedAt chứ không theo thứ tự ghi, và entry bị bỏ qua nếu đã có bản trùng mới hơn:
+    update bị phát lại muộn từ file spill của hàng đợi ghi nền cho cùng kết quả như khi ghi đúng thứ tự.
+    """
+    listened_at = {'$literal': entry['listenedAt']}
+    newer = {'$gt': ['$$this.listenedAt', listened_at]}
+    existing = {'$ifNull': [field, []]}
+    rest = {'$filter': {'input': existing, 'cond': {'$not': [{'$and': [duplicate, {'$not': [newer]}]}]}}}
+    return {'$slice': [
+        {'$cond': [
+            {'$anyElementTrue': [{'$map': {'input': existing, 'in': {'$and': [duplicate, newer]}}}]},
+            existing,
+            {'$concatArrays': [
+                {'$filter': {'input': rest, 'cond': newer}},
+                [{'$literal': entry}],
+                {'$filter': {'input': rest, 'cond': {'$not': [newer]}}}
+            ]}
+        ]},
+        size
+    ]}
+
+def history_song_update(username, song):
+    """Update pipeline của add_historysong, một lần update nguyên tử: bỏ bản trùng (tiêu đề không phân biệt
+    hoa thường + file_path), thêm bài mới lên đầu và giữ 10 bài; hai tab nghe cùng lúc không ghi đè lẫn nhau."""
+    return [{'$set': {
+        'username': username,
+        'songs': recent_history('$songs', song, {'$and': [
+            {'$eq': [{'$toLower': {'$trim': {'input': '$$this.title'}}}, {'$literal': song['title'].strip().lower()}]},
+            {'$eq': ['$$this.file_path', {'$literal': song['file_path']}]}
+        ]})
+    }}]
+
+def link_songs(artist_doc, song_ids=()):
+    """Ghi songs.artistIds và songs.genreTags ngay khi tạo/sửa nghệ sĩ hoặc album.
+
+    Bài được liên kết gồm ``song_ids`` (bài của album) và các bài trong catalog mang tên nghệ sĩ
+    (khớp như manage.py backfill_song_artist_ids), nên songs_by_artist/songs_by_genre chỉ cần index.
+    """
     try:
-        raw_documents = list(db['list'].find().limit(100))
-        list_ = []
-        for doc in raw_documents:
-            logger.debug(f"Raw document data: {doc}")
-            list_id = str(doc.get('_id', ''))
-            for key, value in doc.items():
-                if isinstance(value, dict) and 'artist' in value and 'songs' in value:
-                    title = key
-                    artist = value.get('artist', 'Unknown Artist')
-                    cover = value.get('cover', '/public/default_cover.png')
-                    if isinstance(cover, str):
-                        if cover.startswith("public\\") or cover.startswith("public/"):
-                            cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-                        if not cover.lower().endswith(('.png', '.jpg', '.jpeg')):
-                            cover = '/public/default_cover.png'
-                    else:
-                        cover = '/public/default_cover.png'
-                    songs = value.get('songs', [])
-                    for song in songs:
-                        if 'cover' in song and song['cover'].startswith("public\\"):
-                            song['cover'] = '/' + song['cover'].replace('\\', '/').removeprefix('public/')
-                        if 'src' in song and song['src'].startswith("public\\"):
-                            song['file_path'] = '/' + song['src'].replace('\\', '/').removeprefix('public/')
-                    list_.append({
-                        '_id': list_id,
-                        'title': title,
-                        'artist': artist,
-                        'cover': cover,
-                        'songs': songs
-                    })
-                    logger.debug(f"Processed list item: {title}, artist: {artist}, songs: {len(songs)}")
-        logger.info(f"Đã lấy và chuẩn hóa {len(list_)} danh sách phát")
-        return Response({
-            'message': 'Lấy danh sách phát thành công',
-            'count': len(list_),
-            'data': list_
-        }, status=status.HTTP_200_OK)
+        name = next(iter(artist_names(artist_doc.get('artist'))), None)
+        song_catalog.index()
+        ids = list(dict.fromkeys([*song_ids, *(
+            song['_id'] for song in song_catalog.songs() if name and name in artist_names(song.get('artist'))
+        )]))
+        requests = []
+        for doc in songs_collection.find({'_id': {'$in': ids}}, {'genre': 1, 'genreTags': 1}) if ids else []:
+            update = {'$addToSet': {'artistIds': artist_doc['_id']}}
+            tags = genre_tags(doc.get('genre'))
+            if doc.get('genreTags') != tags:
+                update['$set'] = {'genreTags': tags}
+            requests.append(UpdateOne({'_id': doc['_id']}, update))
+        if requests:
+            songs_collection.bulk_write(requests, ordered=False)
+        logger.debug(f"Liên kết {len(requests)} bài hát với nghệ sĩ {artist_doc.get('artist')}")
     except Exception as e:
-        logger.error(f"Lỗi khi lấy danh sách phát: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['POST'])
-def add_historysong(request, user_id):
-    try:
-        if not user_id or user_id in ['None', 'null', 'undefined']:
-            logger.warning(f"Invalid user_id: {user_id}")
-            return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
-
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        data = request.data
-        if not all(key in data for key in ['title', 'artist', 'file_path']):
-            logger.warning(f"Missing required fields: {data}")
-            return Response({'error': 'Missing required fields'}, status=status.HTTP_400_BAD_REQUEST)
-
-        username = user.username
-        normalized_title = data['title'].strip().lower()
-        file_path = data['file_path']
-        if file_path and not file_path.startswith('/'):
-            file_path = f"/{file_path}"
-
-        history = historysongs_collection.find_one({'userId': user_id})
-        songs = history.get('songs', []) if history else []
-
-        songs = [s for s in songs if not (
-            s['title'].strip().lower() == normalized_title and
-            s['file_path'] == file_path
-        )]
-
-        new_song = {
-            'title': data['title'],
-            'artist': data.get('artist', 'Unknown Artist'),
-            'file_path': file_path,
-            'cover': data.get('cover', '/public/default_cover.png'),
-            'listenedAt': datetime.now()
-        }
-        songs.insert(0, new_song)
-        songs = songs[:10]
-
-        historysongs_collection.replace_one(
-            {'userId': user_id},
-            {'userId': user_id, 'username': username, 'songs': songs},
-            upsert=True
-        )
-        logger.info(f"Thêm bài hát vào lịch sử thành công cho userId: {user_id}")
-        return Response({'message': 'Thêm bài hát vào lịch sử thành công'}, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi thêm bài hát vào lịch sử: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['POST'])
-def add_historylist(request, user_id):
-    try:
-        if not user_id or user_id in ['None', 'null', 'undefined']:
-            logger.warning(f"Invalid user_id: {user_id}")
-            return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
-
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        data = request.data
-        if not all(key in data for key in ['title', 'artist', 'songs']):
-            logger.warning(f"Missing required fields: {data}")
-            return Response({'error': 'Missing required fields'}, status=status.HTTP_400_BAD_REQUEST)
-
-        username = user.username
-        normalized_title = data['title'].strip().lower()
-        songs = data['songs']
-        song_srcs = [s['src'] for s in songs if 'src' in s]
-
-        history = historylists_collection.find_one({'userId': user_id})
-        if history and any(
-            l['title'].strip().lower() == normalized_title and
-            [s['src'] for s in l['songs']] == song_srcs
-            for l in history.get('lists', [])
-        ):
-            logger.info(f"Danh sách đã tồn tại cho userId: {user_id}")
-            return Response({'message': 'Danh sách đã tồn tại'}, status=status.HTTP_200_OK)
-
-        if not history:
-            history = {'userId': user_id, 'username': username, 'lists': []}
-
-        history['lists'].insert(0, {
-            'title': data['title'],
-            'artist': data['artist'],
-            'cover': data.get('cover', '/public/default_cover.png'),
-            'songs': songs,
-            'listenedAt': datetime.now()
-        })
-        history['lists'] = history['lists'][:10]
-
-        historylists_collection.replace_one({'userId': user_id}, history, upsert=True)
-        logger.info(f"Thêm danh sách vào lịch sử thành công cho userId: {user_id}")
-        return Response({'message': 'Thêm danh sách vào lịch sử thành công'}, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi thêm danh sách vào lịch sử: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_historysongs(request, user_id):
-    try:
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        history = historysongs_collection.find_one({'userId': user_id})
-        songs = history.get('songs', []) if history else []
-
-        processed_songs = []
-        for song in songs:
-            file_path = song.get('file_path', '')
-            if file_path.startswith("public\\") or file_path.startswith("public/"):
-                file_path = '/' + file_path.replace('\\', '/').removeprefix('public/')
-            cover = song.get('cover', '/public/default_cover.png')
-            if cover.startswith("public\\") or cover.startswith("public/"):
-                cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-            processed_songs.append({
-                'title': song['title'],
-                'artist': song.get('artist', 'Unknown Artist'),
-                'file_path': file_path,
-                'cover': cover,
-                'listenedAt': song.get('listenedAt', '').isoformat() if song.get('listenedAt') else ''
-            })
-
-        songs = sorted(processed_songs, key=lambda x: x.get('listenedAt', datetime.min), reverse=True)
-        logger.info(f"Lấy lịch sử bài hát thành công cho userId: {user_id}")
-        return Response({'message': 'Lấy lịch sử bài hát thành công', 'data': {'songs': songs}}, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy lịch sử bài hát: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_historylists(request, user_id):
-    try:
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        history = historylists_collection.find_one({'userId': user_id})
-        lists = history.get('lists', []) if history else []
-
-        processed_lists = []
-        for item in lists:
-            songs = item.get('songs', [])
-            for song in songs:
-                if 'src' in song and song['src'].startswith("public\\"):
-                    song['src'] = '/' + song['src'].replace('\\', '/').removeprefix('public/')
-                if 'cover' in song and song['cover'].startswith("public\\"):
-                    song['cover'] = '/' + song['cover'].replace('\\', '/').removeprefix('public/')
-            cover = item.get('cover', '/public/default_cover.png')
-            if cover.startswith("public\\") or cover.startswith("public/"):
-                cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-            processed_lists.append({
-                'title': item['title'],
-                'artist': item.get('artist', 'Unknown Artist'),
-                'cover': cover,
-                'songs': songs,
-                'listenedAt': item.get('listenedAt', '').isoformat() if item.get('listenedAt') else ''
-            })
-
-        lists = sorted(processed_lists, key=lambda x: x.get('listenedAt', datetime.min), reverse=True)
-        logger.info(f"Lấy lịch sử danh sách thành công cho userId: {user_id}")
-        return Response({'message': 'Lấy lịch sử danh sách thành công', 'data': {'lists': lists}}, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy lịch sử danh sách: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_login_history(request, user_id):
-    try:
-        if not user_id or user_id in ['None', 'null', 'undefined']:
-            logger.warning(f"Invalid user_id: {user_id}")
-            return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
-
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        history = loginhistory_collection.find_one({'userId': user_id})
-        logins = history.get('logins', []) if history else []
-        processed_logins = [
-            {
-                'timestamp': login.get('timestamp', '').isoformat() if login.get('timestamp') else '',
-                'device': login.get('device', 'Unknown Device')
-            } for login in logins
-        ]
-        processed_logins = sorted(processed_logins, key=lambda x: x.get('timestamp', datetime.min), reverse=True)
-        logger.info(f"Lấy lịch sử đăng nhập cho user {user_id}: {len(processed_logins)} bản ghi")
-        return Response({
-            'message': 'Lấy lịch sử đăng nhập thành công',
-            'data': processed_logins
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy lịch sử đăng nhập cho user {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_artists(request):
-    try:
-        artists = list(artists_collection.find().limit(100))
-        processed_artists = []
-        for artist in artists:
-            logger.debug(f"Raw artist data: {artist}")
-            artist_id = str(artist.get('_id', ''))
-            cover = artist.get('cover', '/public/default_cover.png')
-            cover2 = artist.get('cover2', '/public/default_cover.png')
-            if isinstance(cover, str):
-                if cover.startswith("public\\") or cover.startswith("public/"):
-                    cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-                if not cover.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    cover = '/public/default_cover.png'
-            if isinstance(cover2, str):
-                if cover2.startswith("public\\") or cover2.startswith("public/"):
-                    cover2 = '/' + cover2.replace('\\', '/').removeprefix('public/')
-                if not cover2.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    cover2 = '/public/default_cover.png'
-            processed_artists.append({
-                '_id': artist_id,
-                'artist': artist.get('artist', 'Unknown Artist'),
-                'cover': cover,
-                'cover2': cover2,
-                'albums': [str(album_id) for album_id in artist.get('albums', [])]
-            })
-            logger.debug(f"Processed artist: {artist.get('artist')}, albums: {len(artist.get('albums', []))}")
-        logger.info(f"Đã lấy và chuẩn hóa {len(processed_artists)} nghệ sĩ")
-        return Response({
-            'message': 'Lấy danh sách nghệ sĩ thành công',
-            'count': len(processed_artists),
-            'data': processed_artists
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy danh sách nghệ sĩ: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_artist_albums(request, artist_id):
-    try:
-        albums = list(albums_collection.find({'artistId': ObjectId(artist_id)}).limit(100))
-        processed_albums = []
-        for album in albums:
-            logger.debug(f"Raw album data: {album}")
-            album_id = str(album.get('_id', ''))
-            cover = album.get('cover', '/public/default_cover.png')
-            if isinstance(cover, str):
-                if cover.startswith("public\\") or cover.startswith("public/"):
-                    cover = '/' + cover.replace('\\', '/').removeprefix('public/')
-                if not cover.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    cover = '/public/default_cover.png'
-            songs = album.get('songs', [])
-            for song in songs:
-                if 'cover' in song and song['cover'].startswith("public\\"):
-                    song['cover'] = '/' + song['cover'].replace('\\', '/').removeprefix('public/')
-                if 'file_path' in song and song['file_path'].startswith("public\\"):
-                    song['file_path'] = '/' + song['file_path'].replace('\\', '/').removeprefix('public/')
-            processed_albums.append({
-                '_id': album_id,
-                'title': album.get('title', 'Unknown Title'),
-                'artist': album.get('artist', 'Unknown Artist'),
-                'cover': cover,
-                'songs': songs
-            })
-            logger.debug(f"Processed album: {album.get('title')}, songs: {len(songs)}")
-        logger.info(f"Đã lấy và chuẩn hóa {len(processed_albums)} album cho artist {artist_id}")
-        return Response({
-            'message': 'Lấy album của nghệ sĩ thành công',
-            'count': len(processed_albums),
-            'data': processed_albums
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy album của nghệ sĩ: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Không làm hỏng request ghi; manage.py backfill_song_artist_ids liên kết lại sau
+        logger.error(f"Lỗi khi liên kết bài hát với nghệ sĩ {artist_doc.get('artist')}: {e}")
 
 @api_view(['POST'])
 def create_update_artist(request):
@@ -660,8 +396,8 @@ def create_update_artist(request):
                 {
                     '$set': {
                         'artist': data.get('artist', 'Unknown Artist'),
-                        'cover': data.get('cover', '/public/default_cover.png'),
-                        'cover2': data.get('cover2', '/public/default_cover.png'),
+                        'cover': media.cover_path(data.get('cover')),
+                        'cover2': media.cover_path(data.get('cover2')),
                         'albums': [ObjectId(album_id) for album_id in data.get('albums', [])],
                         'updatedAt': datetime.now()
                     }
@@ -672,13 +408,16 @@ def create_update_artist(request):
             artist_doc = {
                 '_id': ObjectId(_id) if _id else ObjectId(),
                 'artist': data.get('artist', 'Unknown Artist'),
-                'cover': data.get('cover', '/public/default_cover.png'),
-                'cover2': data.get('cover2', '/public/default_cover.png'),
+                'cover': media.cover_path(data.get('cover')),
+                'cover2': media.cover_path(data.get('cover2')),
                 'albums': [ObjectId(album_id) for album_id in data.get('albums', [])],
                 'createdAt': datetime.now(),
                 'updatedAt': datetime.now()
             }
             artists_collection.insert_one(artist_doc)
+        link_songs(artist_doc)
+        cache.bump(catalog_version)
+        catalog_search.upsert_artist(artist_doc)
         artist_doc['_id'] = str(artist_doc['_id'])
         logger.info(f"Tạo/cập nhật nghệ sĩ thành công: {artist_doc['artist']}")
         return Response({'message': 'Tạo/cập nhật nghệ sĩ thành công', 'data': artist_doc}, status=status.HTTP_201_CREATED)
@@ -697,8 +436,8 @@ def create_album(request):
             artist_doc = {
                 '_id': ObjectId(),
                 'artist': artist_name,
-                'cover': data.get('cover', '/public/default_cover.png'),
-                'cover2': data.get('cover', '/public/default_cover.png'),
+                'cover': media.cover_path(data.get('cover')),
+                'cover2': media.cover_path(data.get('cover')),
                 'albums': [],
                 'createdAt': datetime.now(),
                 'updatedAt': datetime.now()
@@ -706,13 +445,16 @@ def create_album(request):
             artists_collection.insert_one(artist_doc)
         else:
             artist_doc = artists_collection.find_one({'artist': artist_name})
+        album = media.normalize_album({**data, 'artist': artist_name})
         album_doc = {
             '_id': ObjectId(_id) if _id else ObjectId(),
-            'title': data.get('title', 'Unknown Title'),
-            'artist': artist_name,
+            **album,
             'artistId': artist_doc['_id'],
-            'cover': data.get('cover', '/public/default_cover.png'),
-            'songs': [{**song, 'artistId': artist_doc['_id']} for song in data.get('songs', [])],
+            # Bài có trong songs được lưu dạng tham chiếu songId (songrefs.py)
+            'songs': [
+                {**song, 'artistId': artist_doc['_id']}
+                for song in songrefs.to_refs(album['songs'], song_cache.ids_by_path(album['songs']))
+            ],
             'createdAt': datetime.now(),
             'updatedAt': datetime.now()
         }
@@ -721,46 +463,23 @@ def create_album(request):
             {'_id': artist_doc['_id']},
             {'$push': {'albums': album_doc['_id']}, '$set': {'updatedAt': datetime.now()}}
         )
-        album_doc['_id'] = str(album_doc['_id'])
+        link_songs(artist_doc, songrefs.song_ids(album_doc['songs']))
+        cache.bump(catalog_version)
+        catalog_search.upsert_artist(artist_doc)
+        catalog_search.upsert_album(album_doc)
         logger.info(f"Tạo album thành công: {album_doc['title']}")
-        return Response({'message': 'Tạo album thành công', 'data': album_doc}, status=status.HTTP_201_CREATED)
+        return Response({
+            'message': 'Tạo album thành công',
+            'data': {'_id': str(album_doc['_id']), **album, 'artistId': str(artist_doc['_id'])}
+        }, status=status.HTTP_201_CREATED)
     except Exception as e:
         logger.error(f"Lỗi khi tạo album: {str(e)}\n{traceback.format_exc()}")
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-def get_user(request, user_id):
-    try:
-        if not user_id or user_id in ['None', 'null', 'undefined']:
-            logger.warning(f"Invalid user_id: {user_id}")
-            return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
-
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
-        return Response({
-            'username': user.username,
-            'email': user.email or '',
-            'phone': user.phone or ''
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy thông tin người dùng: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi khi lấy thông tin người dùng: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
 @api_view(['PUT'])
+@user_scoped
 def update_user(request, user_id):
     try:
-        if not user_id or user_id in ['None', 'null', 'undefined']:
-            logger.warning(f"Invalid user_id: {user_id}")
-            return Response({'error': 'Invalid user_id'}, status=status.HTTP_400_BAD_REQUEST)
-
-        user = UserProfile.objects(id=user_id).first()
-        if not user:
-            logger.warning(f"Người dùng không tồn tại: {user_id}")
-            return Response({'error': 'Người dùng không tồn tại'}, status=status.HTTP_404_NOT_FOUND)
-
         data = request.data
         update_data = {}
         email = data.get('email')
@@ -777,64 +496,37 @@ def update_user(request, user_id):
             update_data['email'] = email
 
         if password:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed_password = passwords.hasher.hash(password)
             update_data['password'] = hashed_password
 
         if not update_data:
             logger.warning("Không có thông tin để cập nhật")
             return Response({'error': 'Không có thông tin để cập nhật'}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = UserProfile.objects(id=user_id).update(**update_data)
-        if result == 0:
+        updated_user = UserProfile.objects(id=user_id).modify(new=True, **update_data)
+        if updated_user is None:
             logger.warning(f"Không thể cập nhật thông tin cho userId: {user_id}")
             return Response({'error': 'Không thể cập nhật thông tin'}, status=status.HTTP_400_BAD_REQUEST)
 
-        updated_user = UserProfile.objects(id=user_id).first()
         logger.info(f"Cập nhật thành công cho userId: {user_id}")
-        return Response({
+        response = {
             'message': 'Cập nhật thành công',
             'username': updated_user.username,
             'email': updated_user.email or '',
             'phone': updated_user.phone or ''
-        }, status=status.HTTP_200_OK)
+        }
+        if password:
+            # Đổi mật khẩu thu hồi mọi refresh token đã cấp; cặp token mới theo token_version mới
+            # để phiên hiện tại không bị đăng xuất
+            response.update(auth.issue_tokens(auth.revoke(UserProfile, user_id) or updated_user))
+        return Response(response, status=status.HTTP_200_OK)
+    except passwords.HasherBusy:
+        logger.warning("Hàng đợi băm mật khẩu đầy, từ chối đổi mật khẩu")
+        return Response({'error': 'Máy chủ đang bận, vui lòng thử lại'}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
     except Exception as e:
         logger.error(f"Lỗi khi cập nhật thông tin: {str(e)}\n{traceback.format_exc()}")
         return Response({'error': f'Lỗi khi cập nhật thông tin: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-def songs_by_artist(request):
-    try:
-        artist = request.GET.get('artist', '').strip()
-        if not artist:
-            logger.warning("Thiếu tham số artist trong yêu cầu")
-            return Response({'error': 'Thiếu tên nghệ sĩ'}, status=status.HTTP_400_BAD_REQUEST)
-
-        regex = re.compile(f'.*{re.escape(artist)}.*', re.IGNORECASE)
-        query = {
-            '$or': [
-                {'artist': regex},
-                {'artist': {'$in': [artist]}}
-            ]
-        }
-        songs = list(songs_collection.find(query).limit(20))
-        processed_songs = [
-            {
-                '_id': str(song['_id']),
-                'title': song.get('title', ''),
-                'artist': song.get('artist', ''),
-                'file_path': song.get('file_path', '/public/default_song.mp3'),
-                'cover': song.get('cover', '/public/default_cover.png'),
-            } for song in songs
-        ]
-        logger.info(f"Lấy bài hát cho nghệ sĩ '{artist}': {len(processed_songs)} bài")
-        return Response({
-            'message': 'Lấy bài hát theo nghệ sĩ thành công',
-            'data': processed_songs
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy bài hát theo nghệ sĩ '{artist}': {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
 @api_view(['GET'])
 def search(request):
     try:
@@ -843,39 +535,7 @@ def search(request):
             logger.warning("Thiếu truy vấn tìm kiếm")
             return Response({'error': 'Thiếu truy vấn tìm kiếm'}, status=status.HTTP_400_BAD_REQUEST)
 
-        songs = list(songs_collection.find({
-            '$or': [
-                {'title': {'$regex': query, '$options': 'i'}},
-                {'artist': {'$regex': query, '$options': 'i'}}
-            ]
-        }).limit(20))
-        processed_songs = [
-            {
-                '_id': str(song['_id']),
-                'type': 'song',
-                'name': f"{song['title']} - {song['artist']}",
-                'title': song.get('title', ''),
-                'artist': song.get('artist', 'Unknown Artist'),
-                'cover': song.get('cover', '/public/default_cover.png'),
-                'file_path': song.get('file_path', '')
-            } for song in songs
-        ]
-
-        artists = list(artists_collection.find({
-            'artist': {'$regex': query, '$options': 'i'}
-        }).limit(10))
-        processed_artists = [
-            {
-                '_id': str(artist['_id']),
-                'type': 'artist',
-                'name': artist.get('artist', 'Unknown Artist'),
-                'artist': artist.get('artist', 'Unknown Artist'),
-                'cover': artist.get('cover', '/public/default_cover.png'),
-                'cover2': artist.get('cover2', '/public/default_cover.png')
-            } for artist in artists
-        ]
-
-        combined_results = (processed_songs + processed_artists)[:20]
+        combined_results = catalog_search.search(query, limit=20)
         logger.info(f"Tìm kiếm với query '{query}': {len(combined_results)} kết quả")
         return Response({
             'message': 'Tìm kiếm thành công',
@@ -887,262 +547,18 @@ def search(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
-def songs_by_genre(request):
+def suggest_view(request):
     try:
-        genre_param = request.GET.get('genre', '').strip()
-        if not genre_param:
-            logger.warning("Thiếu tham số genre trong yêu cầu")
-            return Response({'error': 'Thiếu thể loại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        genre_list = [g.strip() for g in genre_param.split(',') if g.strip()]
-        if not genre_list:
-            logger.warning("Không có thể loại hợp lệ")
-            return Response({'error': 'Không có thể loại hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
-
-        regex_list = [re.compile(rf'\b{re.escape(genre)}\b', re.IGNORECASE) for genre in genre_list]
-        songs = list(songs_collection.find({'genre': {'$in': regex_list}}).limit(100))
-        processed_songs = [
-            {
-                '_id': str(song['_id']),
-                'title': song.get('title', ''),
-                'artist': song.get('artist', ''),
-                'genre': song.get('genre', ''),
-                'file_path': song.get('file_path', '/public/default_song.mp3'),
-                'cover': song.get('cover', '/public/default_cover.png'),
-            } for song in songs
-        ]
-        logger.info(f"Lấy bài hát theo thể loại {genre_list}: {len(processed_songs)} bài")
-        return Response({
-            'message': f'Lấy bài hát theo thể loại {genre_list} thành công',
-            'data': processed_songs
-        }, status=status.HTTP_200_OK)
-    except Exception as e:
-        logger.error(f"Lỗi khi lấy bài hát theo thể loại: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['GET'])
-def get_my_playlist(request, user_id):
-    try:
-        logger.debug(f"Fetching playlist for userId: {user_id}")
-        playlist = myplaylist_collection.find_one({'userId': user_id})
-        if not playlist:
-            logger.info(f"No playlist found for userId: {user_id}")
-            return Response(
-                {'message': 'Không tìm thấy danh sách cá nhân', 'data': {'playlists': []}},
-                status=status.HTTP_200_OK
-            )
-
-        playlists = playlist.get('playlists', [])
-        if not isinstance(playlists, list):
-            logger.error(f"Invalid playlists format for userId {user_id}: {playlists}")
-            myplaylist_collection.update_one(
-                {'userId': user_id},
-                {'$set': {'playlists': []}},
-                upsert=True
-            )
-            return Response(
-                {'message': 'Không tìm thấy danh sách cá nhân', 'data': {'playlists': []}},
-                status=status.HTTP_200_OK
-            )
-
-        result = {'playlists': []}
-        for i, p in enumerate(playlists):
-            if not isinstance(p, dict):
-                logger.error(f"Invalid playlist entry at index {i} for userId {user_id}: {p}")
-                continue
-            result['playlists'].append({
-                'title': p.get('title', f'Danh sách {i+1}'),
-                'songs': p.get('songs', [])
-            })
-
-        logger.debug(f"Processed playlists for userId {user_id}: {result}")
-        return Response(
-            {'message': 'Lấy danh sách cá nhân thành công', 'data': result},
-            status=status.HTTP_200_OK
-        )
-    except Exception as e:
-        logger.error(f"Error fetching playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response(
-            {'error': f'Lỗi server: {str(e)}'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
-
-@api_view(['POST'])
-def create_new_playlist(request, user_id):
-    try:
-        logger.debug(f"Creating new playlist for userId: {user_id}")
-        existing_doc = myplaylist_collection.find_one({'userId': user_id})
-        if not existing_doc:
-            myplaylist_collection.insert_one({'userId': user_id, 'playlists': []})
-
-        playlists = existing_doc.get('playlists', []) if existing_doc else []
-        if len(playlists) >= 4:
-            logger.warning(f"Maximum 4 playlists reached for userId: {user_id}")
-            return Response(
-                {'error': 'Bạn chỉ có thể tạo tối đa 4 danh sách phát'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        count = len(playlists)
-        title = request.data.get('title', f'Danh sách {count + 1}')
-
-        result = myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$push': {'playlists': {'title': title, 'songs': []}}},
-            upsert=True
-        )
-
-        if result.modified_count > 0 or result.upserted_id:
-            logger.info(f"Created new playlist for userId: {user_id}, title: {title}")
-            return Response({'message': 'Đã tạo danh sách mới'}, status=status.HTTP_200_OK)
-        logger.error(f"Failed to create playlist for userId: {user_id}")
-        return Response({'error': 'Không thể tạo danh sách mới'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except Exception as e:
-        logger.error(f"Error creating playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['POST'])
-def add_to_playlist(request, user_id):
-    try:
-        playlist_index = request.data.get('playlistIndex')
-        song = {
-            'title': request.data.get('title'),
-            'artist': request.data.get('artist'),
-            'file_path': request.data.get('file_path', ''),
-            'cover': request.data.get('cover', '/public/default_cover.png')
-        }
-
-        if not song['title'] or not song['artist'] or playlist_index is None:
-            logger.error(f"Missing required fields: {song}, playlist_index: {playlist_index}")
-            return Response({'error': 'Thiếu thông tin bắt buộc'}, status=status.HTTP_400_BAD_REQUEST)
-
-        existing_doc = myplaylist_collection.find_one({'userId': user_id})
-        if not existing_doc:
-            myplaylist_collection.insert_one({'userId': user_id, 'playlists': []})
-
-        playlists = existing_doc.get('playlists', []) if existing_doc else []
-        if playlist_index >= len(playlists):
-            logger.error(f"Invalid playlist_index {playlist_index} for userId {user_id}")
-            return Response({'error': 'Danh sách không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        result = myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$push': {f'playlists.{playlist_index}.songs': song}},
-            upsert=True
-        )
-
-        if result.modified_count > 0 or result.upserted_id:
-            logger.info(f"Added song to playlist {playlist_index} for userId: {user_id}")
-            return Response({'message': 'Đã thêm bài hát vào danh sách'}, status=status.HTTP_200_OK)
-        logger.error(f"Failed to add song to playlist for userId: {user_id}")
-        return Response({'error': 'Không thể thêm bài hát'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except Exception as e:
-        logger.error(f"Error adding song to playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['DELETE'])
-def delete_playlist(request, user_id):
-    try:
-        playlist_index = request.data.get('playlistIndex')
-        if playlist_index is None:
-            logger.error("Missing playlistIndex")
-            return Response({'error': 'Thiếu playlistIndex'}, status=status.HTTP_400_BAD_REQUEST)
-
-        existing_doc = myplaylist_collection.find_one({'userId': user_id})
-        if not existing_doc or not existing_doc.get('playlists', []) or playlist_index >= len(existing_doc['playlists']):
-            logger.warning(f"No playlist found at index {playlist_index} for userId: {user_id}")
-            return Response({'error': 'Danh sách không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        result = myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$unset': {f'playlists.{playlist_index}': 1}}
-        )
-        myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$pull': {'playlists': None}}
-        )
-
-        if result.modified_count > 0:
-            logger.info(f"Deleted playlist at index {playlist_index} for userId: {user_id}")
-            return Response({'message': 'Đã xóa danh sách'}, status=status.HTTP_200_OK)
-        logger.warning(f"No changes made for playlistIndex {playlist_index} for userId: {user_id}")
-        return Response({'error': 'Không thể xóa danh sách'}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logger.error(f"Error deleting playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-@api_view(['PUT'])
-def edit_playlist(request, user_id):
-    try:
-        playlist_index = request.data.get('playlistIndex')
-        new_title = request.data.get('newTitle', '')
-        if playlist_index is None or not new_title:
-            logger.error(f"Missing playlistIndex or newTitle: {request.data}")
-            return Response({'error': 'Thiếu playlistIndex hoặc newTitle'}, status=status.HTTP_400_BAD_REQUEST)
-
-        existing_doc = myplaylist_collection.find_one({'userId': user_id})
-        if not existing_doc or not existing_doc.get('playlists', []) or playlist_index >= len(existing_doc['playlists']):
-            logger.warning(f"No playlist found at index {playlist_index} for userId: {user_id}")
-            return Response({'error': 'Danh sách không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Kiểm tra xem tiêu đề mới có hợp lệ không (không trùng với các playlist khác)
-        playlists = existing_doc.get('playlists', [])
-        normalized_new_title = new_title.strip().lower()
-        for i, playlist in enumerate(playlists):
-            if i != playlist_index and playlist.get('title', '').strip().lower() == normalized_new_title:
-                logger.warning(f"Playlist title '{new_title}' already exists for userId: {user_id}")
-                return Response({'error': 'Tiêu đề danh sách đã tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        result = myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$set': {f'playlists.{playlist_index}.title': new_title}}
-        )
-
-        if result.modified_count > 0:
-            logger.info(f"Renamed playlist at index {playlist_index} to {new_title} for userId: {user_id}")
-            return Response({'message': 'Đã sửa tên danh sách'}, status=status.HTTP_200_OK)
-        logger.warning(f"No changes made for playlistIndex {playlist_index} for userId: {user_id}")
-        return Response({'error': 'Không thể sửa tên danh sách'}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        logger.error(f"Error renaming playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-@api_view(['DELETE'])
-def remove_song_from_playlist(request, user_id):
-    try:
-        playlist_index = request.data.get('playlistIndex')
-        song_index = request.data.get('songIndex')
-
-        if playlist_index is None or song_index is None:
-            logger.error("Missing playlistIndex or songIndex")
-            return Response({'error': 'Thiếu playlistIndex hoặc songIndex'}, status=status.HTTP_400_BAD_REQUEST)
-
-        existing_doc = myplaylist_collection.find_one({'userId': user_id})
-        if not existing_doc or not existing_doc.get('playlists', []) or playlist_index >= len(existing_doc['playlists']):
-            logger.warning(f"No playlist found at index {playlist_index} for userId: {user_id}")
-            return Response({'error': 'Danh sách không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        songs = existing_doc['playlists'][playlist_index].get('songs', [])
-        if song_index >= len(songs):
-            logger.warning(f"No song found at index {song_index} in playlist {playlist_index} for userId: {user_id}")
-            return Response({'error': 'Bài hát không tồn tại'}, status=status.HTTP_400_BAD_REQUEST)
-
-        result = myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$unset': {f'playlists.{playlist_index}.songs.{song_index}': 1}}
-        )
-        myplaylist_collection.update_one(
-            {'userId': user_id},
-            {'$pull': {f'playlists.{playlist_index}.songs': None}}
-        )
-
-        if result.modified_count > 0:
-            logger.info(f"Removed song at playlistIndex {playlist_index}, songIndex {song_index} for userId: {user_id}")
-            return Response({'message': 'Đã xóa bài hát thành công'}, status=status.HTTP_200_OK)
-        logger.warning(f"No changes made for playlistIndex {playlist_index}, songIndex {song_index} for userId: {user_id}")
-        return Response({'error': 'Không thể xóa bài hát'}, status=status.HTTP_400_BAD_REQUEST)
+        query = request.GET.get('query', '')
+        try:
+            limit = min(max(int(request.GET.get('limit', settings.SUGGEST_LIMIT)), 1), 20)
+        except ValueError:
+            return Response({'error': 'limit không hợp lệ'}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = suggester.suggest(query, limit)
+        return Response({'count': len(suggestions), 'data': list(suggestions)}, status=status.HTTP_200_OK)
     except Exception as e:
-        logger.error(f"Error removing song from playlist for userId {user_id}: {str(e)}\n{traceback.format_exc()}")
-        return Response({'error': f'Lỗi server: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.error(f"Lỗi khi gợi ý tìm kiếm: {str(e)}\n{traceback.format_exc()}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 def json_serial(obj):
     if isinstance(obj, ObjectId):
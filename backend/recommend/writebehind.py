@@ -0,0 +1,229 @@
+import atexit
+import glob
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from bson import json_util
+from django.conf import settings
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+def to_request(op):
+    if op['op'] == 'insert':
+        return InsertOne(op['doc'])
+    return UpdateOne(op['filter'], op['update'], upsert=op['upsert'])
+
+
+class WriteBehindQueue:
+    """Hàng đợi ghi nền cho các thao tác không cần chờ (analytics, lịch sử).
+
+    View gọi insert()/update() rồi trả response ngay; luồng nền gom thao tác theo
+    collection và ghi bằng insert_many/bulk_write khi đủ ``batch_size`` hoặc sau
+    ``flush_interval`` giây. Khi MongoDB không ghi được, batch được ghi ra file spill
+    (JSON mở rộng của BSON) trong ``spill_dir`` và được phát lại khi kết nối trở lại.
+
+    Thao tác ``ordered`` (lịch sử theo từng người dùng) được ghi theo đúng thứ tự gửi trong một batch;
+    các thao tác còn lại ghi không thứ tự để MongoDB xử lý song song. Thao tác đã spill được phát lại sau
+    các thao tác gửi sau nó, nên update phải cho cùng kết quả bất kể thứ tự (lịch sử xếp theo listenedAt,
+    xem views.recent_history).
+    """
+
+    def __init__(self, db, spill_dir, batch_size=500, flush_interval=0.5, max_queue=10000, replay_interval=30):
+        self.db = db
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.replay_interval = replay_interval
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._last_replay = 0.0
+        atexit.register(self.drain)
+
+    def insert(self, collection, doc, spill=True):
+        return self._submit({'c': collection, 'op': 'insert', 'doc': doc, 'ordered': False}, spill)
+
+    def update(self, collection, filter, update, upsert=False, ordered=True, spill=True):
+        return self._submit(
+            {'c': collection, 'op': 'update', 'filter': filter, 'update': update, 'upsert': upsert, 'ordered': ordered},
+            spill
+        )
+
+    def _submit(self, op, spill=True):
+        """Trả về False (không làm gì) nếu hàng đợi đầy và ``spill`` là False: view async gọi lại
+        trong thread pool để việc ghi file spill không chặn event loop."""
+        if not settings.WRITE_BEHIND_ENABLED:
+            self._write([op])
+            return True
+        self._ensure_worker()
+        with self._condition:
+            full = len(self._pending) >= self.max_queue
+            if not full:
+                self._pending.append(op)
+                if len(self._pending) >= self.batch_size:
+                    self._condition.notify()
+                return True
+        if not spill:
+            return False
+        # Không chặn request khi MongoDB chậm: ghi thẳng ra file spill
+        self._spill([op])
+        return True
+
+    def _ensure_worker(self):
+        # Luồng nền không sống sót qua fork của gunicorn, nên khởi động theo pid
+        pid = os.getpid()
+        if self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._condition:
+            if self._worker_pid != pid or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker_pid = pid
+                self._worker.start()
+
+    def _run(self):
+        # File spill còn lại từ lần chạy trước (kể cả file đang phát lại dở khi process chết) được ghi ngay
+        try:
+            self.replay_spills()
+        except Exception as e:
+            logger.error(f"Lỗi khi phát lại file spill: {e}")
+        self._last_replay = time.monotonic()
+        while True:
+            with self._condition:
+                if len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            try:
+                self.flush()
+                if time.monotonic() - self._last_replay > self.replay_interval:
+                    self._last_replay = time.monotonic()
+                    self.replay_spills()
+            except Exception as e:
+                logger.error(f"Lỗi trong luồng ghi nền: {e}")
+
+    def flush(self):
+        """Ghi mọi thao tác đang chờ; trả về số thao tác đã xử lý."""
+        processed = 0
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return processed
+                self._write(batch)
+                processed += len(batch)
+
+    def drain(self):
+        # Gọi khi worker tắt (atexit): ghi nốt hàng đợi, phần không ghi được nằm lại trong file spill
+        try:
+            processed = self.flush()
+            if processed:
+                logger.info(f"Đã ghi {processed} thao tác còn lại trước khi tắt worker")
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi nốt hàng đợi: {e}")
+
+    def _write(self, ops):
+        # False nếu có thao tác không ghi được vào MongoDB và cũng không lưu được ra file spill
+        handled = True
+        groups = {}
+        for op in ops:
+            groups.setdefault((op['c'], op['ordered']), []).append(op)
+        for (name, ordered), group in groups.items():
+            collection = self.db[name]
+            try:
+                if not ordered and all(op['op'] == 'insert' for op in group):
+                    collection.insert_many([op['doc'] for op in group], ordered=False)
+                else:
+                    collection.bulk_write([to_request(op) for op in group], ordered=ordered)
+            except BulkWriteError as e:
+                # Lỗi dữ liệu (không phải lỗi kết nối): thử lại cũng không được, chỉ ghi log
+                errors = e.details.get('writeErrors', [])
+                logger.error(f"{len(errors)} thao tác ghi nền vào {name} bị từ chối: {errors[:3]}")
+                if ordered and errors:
+                    # bulk_write có thứ tự dừng ở lỗi đầu tiên, các thao tác sau chưa được ghi
+                    handled = self._write(group[errors[0]['index'] + 1:]) and handled
+            except PyMongoError as e:
+                logger.error(f"Không ghi được {len(group)} thao tác vào {name}, lưu ra file spill: {e}")
+                handled = self._spill(group) and handled
+        return handled
+
+    def _spill(self, ops):
+        # Mỗi lần spill là một file riêng, ghi xong (.partial) mới đổi tên sang .jsonl:
+        # replay_spills chỉ nhận file đã hoàn chỉnh và không ai còn ghi vào
+        partial = None
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f'writebehind-{os.getpid()}-{uuid.uuid4().hex}.jsonl')
+            partial = f'{path}.partial'
+            with open(partial, 'w', encoding='utf-8') as f:
+                for op in ops:
+                    f.write(json_util.dumps(op, json_options=_JSON_OPTIONS) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(partial, path)
+            return True
+        except OSError as e:
+            logger.error(f"Không ghi được file spill, mất {len(ops)} thao tác: {e}")
+            if partial is not None:
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+            return False
+
+    def replay_spills(self):
+        """Phát lại các file spill của mọi worker.
+
+        Chỉ file đã ghi xong (``.jsonl``, không phải ``.partial``) được nhận. File được đổi tên sang
+        ``.replaying-<pid>`` trước khi đọc để hai worker không phát lại cùng một file,
+        và chỉ bị xóa sau khi mọi thao tác đã được xử lý (ghi xong, bị từ chối, hoặc spill lại vào file mới).
+        File ``.replaying-*`` của process đã chết giữa chừng được nhận lại, nên thao tác có thể được ghi
+        lại lần nữa (ít nhất một lần) nhưng không bị mất.
+        """
+        pattern = os.path.join(self.spill_dir, 'writebehind-*.jsonl')
+        paths = glob.glob(pattern) + [path for path in glob.glob(f'{pattern}.replaying-*') if self._orphaned(path)]
+        for path in paths:
+            original = path.split('.replaying-')[0]
+            claimed = f'{original}.replaying-{os.getpid()}'
+            try:
+                if path != claimed:
+                    os.rename(path, claimed)
+                with open(claimed, encoding='utf-8') as f:
+                    ops = [json_util.loads(line, json_options=_JSON_OPTIONS) for line in f if line.strip()]
+            except OSError:
+                continue  # worker khác đã nhận file này
+            logger.info(f"Phát lại {len(ops)} thao tác từ {path}")
+            handled = True
+            for start in range(0, len(ops), self.batch_size):
+                handled = self._write(ops[start:start + self.batch_size]) and handled
+            if handled:
+                os.remove(claimed)
+            else:
+                logger.error(f"Giữ lại {claimed} để phát lại lần sau")
+
+    @staticmethod
+    def _orphaned(path):
+        # Chỉ replay_spills (luồng worker) đọc file của chính process, và xóa trước khi trả về:
+        # file mang pid hiện tại còn sót là của process cũ trùng pid (vd. container khởi động lại)
+        pid = path.rsplit('.replaying-', 1)[1]
+        if not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass  # process còn sống nhưng của user khác
+        return False
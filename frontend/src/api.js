@@ -1,7 +1,10 @@
 import axios from "axios";
+import { installAuthInterceptors } from "./auth";
 
 const api = axios.create({
   baseURL: import.meta.env.VITE_API_URL || "http://localhost:8080/api",
 });
 
+installAuthInterceptors(api);
+
 export default api;
@@ -0,0 +1,57 @@
+import axios from 'axios';
+
+const apiUrl = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8001';
+
+export const saveTokens = ({ accessToken, refreshToken }) => {
+  if (accessToken) localStorage.setItem('accessToken', accessToken);
+  if (refreshToken) localStorage.setItem('refreshToken', refreshToken);
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem('accessToken');
+  localStorage.removeItem('refreshToken');
+};
+
+let refreshing = null;
+
+const refreshAccessToken = async () => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) throw new Error('No refresh token');
+  const response = await axios.post(`${apiUrl}/api/token/refresh`, { refreshToken }, { skipAuth: true });
+  saveTokens(response.data);
+  return response.data.accessToken;
+};
+
+// Gắn access token vào mọi request của client (mặc định axios toàn cục); khi gặp 401 thì refresh một lần rồi gửi lại.
+// Mọi lời gọi API phải đi qua axios hoặc instance đã cài interceptor, không dùng fetch() trực tiếp.
+export const installAuthInterceptors = (client = axios) => {
+  client.interceptors.request.use((config) => {
+    const token = localStorage.getItem('accessToken');
+    if (token && !config.skipAuth) {
+      config.headers = { ...config.headers, Authorization: `Bearer ${token}` };
+    }
+    return config;
+  });
+
+  client.interceptors.response.use(
+    (response) => response,
+    async (error) => {
+      const config = error.config;
+      if (error.response?.status !== 401 || !config || config.skipAuth || config._retried) {
+        return Promise.reject(error);
+      }
+      try {
+        refreshing = refreshing || refreshAccessToken();
+        const token = await refreshing;
+        config._retried = true;
+        config.headers = { ...config.headers, Authorization: `Bearer ${token}` };
+        return client(config);
+      } catch (refreshError) {
+        clearTokens();
+        return Promise.reject(error);
+      } finally {
+        refreshing = null;
+      }
+    }
+  );
+};
@@ -1,7 +1,9 @@
 import React, { useState, useRef, useEffect } from 'react';
+import axios from 'axios';
 import ReactDOM from 'react-dom';
 import { useNavigate } from 'react-router-dom';
 import { translations, currentLanguage, changeLanguage } from '../translations';
+import { clearTokens } from '../auth';
 import '~/style.css';
 
 const Header = ({
@@ -81,12 +83,9 @@ const Header = ({
     const performSearch = async () => {
       try {
         console.debug(`Debug Header: Gửi yêu cầu tìm kiếm với query "${query}"`);
-        const response = await fetch(
-          `http://localhost:8001/api/search?query=${encodeURIComponent(query)}`,
-          { headers: { 'Content-Type': 'application/json' } }
+        const { data } = await axios.get(
+          `http://localhost:8001/api/search?query=${encodeURIComponent(query)}`
         );
-        if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        const data = await response.json();
         if (data.error) throw new Error(data.error);
         const results = data.data || [];
         setLocalSearchResults(results);
@@ -156,6 +155,7 @@ const Header = ({
     console.debug('Debug Header: Đăng xuất');
     localStorage.removeItem('userId');
     localStorage.removeItem('username');
+    clearTokens();
     setIsLoggedIn(false);
     setUsername('');
     setShowDropdown(false);
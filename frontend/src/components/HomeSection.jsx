@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import axios from 'axios';
 import { translations, currentLanguage } from '../translations';
 
 const HomeSection = ({
@@ -108,12 +109,8 @@ const HomeSection = ({
     }
     setIsLoading(true);
     console.log('HomeSection: Lấy bài hát cho nghệ sĩ:', selectedArtist.artist);
-    fetch(`http://localhost:8001/api/songs-by-artist?artist=${encodeURIComponent(selectedArtist.artist)}`)
-      .then((res) => {
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        return res.json();
-      })
-      .then((data) => {
+    axios.get(`http://localhost:8001/api/songs-by-artist?artist=${encodeURIComponent(selectedArtist.artist)}${selectedArtist._id ? `&artistId=${selectedArtist._id}` : ''}`)
+      .then(({ data }) => {
         console.log('HomeSection: Nhận bài hát nghệ sĩ:', data.data);
         setSongsByArtist(data.data || []);
         setError(null);
@@ -136,12 +133,8 @@ const HomeSection = ({
     }
     setIsLoading(true);
     console.log('HomeSection: Lấy bài hát cho thể loại:', selectedGenre);
-    fetch(`http://localhost:8001/api/songs-by-genre?genre=${encodeURIComponent(selectedGenre)}`)
-      .then((res) => {
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        return res.json();
-      })
-      .then((data) => {
+    axios.get(`http://localhost:8001/api/songs-by-genre?genre=${encodeURIComponent(selectedGenre)}`)
+      .then(({ data }) => {
         console.log('HomeSection: Nhận bài hát thể loại:', data.data);
         setSongsByGenre(data.data || []);
         setError(null);
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { translations, currentLanguage } from '../translations';
+import { saveTokens } from '../auth';
 
 function Login({ setIsLoggedIn, setUsername }) {
   const [localUsername, setLocalUsername] = useState('');
@@ -37,6 +38,7 @@ function Login({ setIsLoggedIn, setUsername }) {
       }
       localStorage.setItem('userId', userId);
       localStorage.setItem('username', responseUsername);
+      saveTokens(response.data);
       if (typeof setIsLoggedIn === 'function') {
         setIsLoggedIn(true);
       } else {
@@ -176,6 +176,7 @@ const MusicPlayer = ({
     console.debug('Debug: Thêm bài hát vào playlist - playlistIndex:', playlistIndex, 'song:', currentSong.title);
     try {
       await axios.post(`http://127.0.0.1:8001/api/add-to-playlist/${userId}`, {
+        playlistId: myPlaylists[playlistIndex]?.id,
         playlistIndex,
         title: currentSong.title,
         artist: currentSong.artist,
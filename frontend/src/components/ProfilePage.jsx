@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import { translations, currentLanguage } from '../translations';
+import { clearTokens, saveTokens } from '../auth';
 import '~/style.css';
 
 const ProfilePage = ({ isLoggedIn = false, setIsLoggedIn = () => {}, setUsername = () => {} }) => {
@@ -85,7 +86,8 @@ const ProfilePage = ({ isLoggedIn = false, setIsLoggedIn = () => {}, setUsername
     }
     const userId = localStorage.getItem('userId');
     try {
-      await axios.put(`http://127.0.0.1:8001/api/update_user/${userId}`, { password: newPassword });
+      const response = await axios.put(`http://127.0.0.1:8001/api/update_user/${userId}`, { password: newPassword });
+      saveTokens(response.data);
       setNewPassword('');
       alert(translations[language].password_changed);
       setFormError('');
@@ -114,6 +116,7 @@ const ProfilePage = ({ isLoggedIn = false, setIsLoggedIn = () => {}, setUsername
   const handleLogout = () => {
     localStorage.removeItem('userId');
     localStorage.removeItem('username');
+    clearTokens();
     setIsLoggedIn(false);
     setUsername('');
     navigate('/login');
@@ -136,6 +136,7 @@ const SidebarLeft = ({
     const userId = localStorage.getItem('userId');
     try {
       const response = await axios.put(`http://127.0.0.1:8001/api/edit-playlist/${userId}`, {
+        playlistId: myPlaylists[index]?.id,
         playlistIndex: index,
         newTitle,
       });
@@ -163,7 +164,7 @@ const SidebarLeft = ({
     const userId = localStorage.getItem('userId');
     try {
       await axios.delete(`http://127.0.0.1:8001/api/delete-playlist/${userId}`, {
-        data: { playlistIndex: index },
+        data: { playlistId: myPlaylists[index]?.id, playlistIndex: index },
       });
       setMyPlaylists((prev) => prev.filter((_, i) => i !== index));
       alert(translations[language].playlist_deleted);
@@ -185,7 +186,12 @@ const SidebarLeft = ({
     const userId = localStorage.getItem('userId');
     try {
       await axios.delete(`http://127.0.0.1:8001/api/remove-song-from-playlist/${userId}`, {
-        data: { playlistIndex, songIndex },
+        data: {
+          playlistId: myPlaylists[playlistIndex]?.id,
+          entryId: myPlaylists[playlistIndex]?.songs[songIndex]?.entryId,
+          playlistIndex,
+          songIndex,
+        },
       });
       setMyPlaylists((prev) =>
         prev.map((pl, i) =>
@@ -585,7 +591,7 @@ const SidebarLeft = ({
                         <ul style={{ padding: '10px 0', listStyle: 'none', width: '100%', opacity: '1 !important' }}>
                           {playlist.songs.map((song, songIndex) => (
                             <li
-                              key={songIndex}
+                              key={song.entryId || songIndex}
                               style={{
                                 display: 'flex',
                                 justifyContent: 'space-between',
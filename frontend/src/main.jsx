@@ -7,6 +7,9 @@ import Signup from './components/Signup.jsx';
 import Helper from './components/Helper.jsx';
 import AboutUs from './components/AboutUs.jsx';
 import ProfilePage from './components/ProfilePage.jsx';
+import { installAuthInterceptors } from './auth';
+
+installAuthInterceptors();
 
 ReactDOM.createRoot(document.getElementById('root')).render(
   <React.StrictMode>